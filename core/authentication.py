@@ -0,0 +1,114 @@
+# JWT authentication that reads what the store needs about the user from the claims of the access token, instead of the database.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+# Claims added to the tokens by "core.serializers.TokenObtainPairSerializer", besides the user id. Refreshed access tokens copy them from the
+# refresh token, so they're as old as the login: a user made staff gets the claim at their next login.
+CUSTOMER_ID_CLAIM = "customer_id"
+IS_STAFF_CLAIM = "is_staff"
+
+
+# With "STORE_JWT_CLAIMS" off, the claims are ignored, and the customer id is read from the database (or its cache) like before.
+def claims_enabled():
+    return getattr(settings, "STORE_JWT_CLAIMS", True)
+
+
+class CustomerJWTAuthentication(JWTAuthentication):
+    # Puts the customer id of the token on the user, where "CustomerManager.get_id_for()" finds it. Tokens from before the claim was added don't
+    # have it, and fall back to the database.
+    def get_user(self, validated_token):
+        user = super().get_user(validated_token)
+        if claims_enabled() and validated_token.get(CUSTOMER_ID_CLAIM) is not None:
+            user.customer_id = validated_token[CUSTOMER_ID_CLAIM]
+        return user
+
+
+# The full users of "ClaimsUser", cached for "STORE_JWT_USER_CACHE_TTL" seconds, and dropped when a user is saved or deleted
+# (core/signals/handlers.py), e.g. when their password is changed.
+def user_cache_key(user_id):
+    return f"core:user:{user_id}"
+
+
+def get_cached_user(user_id):
+    key = user_cache_key(user_id)
+    user = cache.get(key)
+    if user is None:
+        user = get_user_model().objects.filter(**{api_settings.USER_ID_FIELD: user_id}).first()
+        if user is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        cache.set(key, user, getattr(settings, "STORE_JWT_USER_CACHE_TTL", 60))
+    if not user.is_active:
+        raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+    return user
+
+
+def forget_user(user_id):
+    cache.delete(user_cache_key(user_id))
+
+
+class ClaimsUser:
+    """The user of a request, made from the claims of its access token without reading the database. Its id, staff flag and customer id come
+    from the token. Anything else, like "username" or "has_perm()", is read from the full "User", which is loaded on first use from the cache or
+    the database.
+    """
+
+    is_authenticated = True
+    is_anonymous = False
+    # The attributes of the wrapper itself. Others are set on the full user, so that e.g. a serializer updating the user and then calling "save()"
+    # saves its changes.
+    own_attributes = frozenset(["token", "user", "id", "pk", "customer_id"])
+
+    def __init__(self, token):
+        self.token = token
+        self.id = self.pk = token[api_settings.USER_ID_CLAIM]
+        if token.get(CUSTOMER_ID_CLAIM) is not None:
+            self.customer_id = token[CUSTOMER_ID_CLAIM]
+
+    def __str__(self):
+        return f"ClaimsUser {self.id}"
+
+    def __eq__(self, other):
+        return self.id == getattr(other, "id", None)
+
+    def __hash__(self):
+        return hash(self.id)
+
+    # Tokens from before the claim was added read it from the user.
+    @cached_property
+    def is_staff(self):
+        if IS_STAFF_CLAIM in self.token:
+            return self.token[IS_STAFF_CLAIM]
+        return self.user.is_staff
+
+    @cached_property
+    def user(self):
+        return get_cached_user(self.id)
+
+    # Only called for attributes that aren't set above.
+    def __getattr__(self, name):
+        if name.startswith("__") or name in ("token", "user"):
+            raise AttributeError(name)
+        return getattr(self.user, name)
+
+    def __setattr__(self, name, value):
+        if name in self.own_attributes:
+            super().__setattr__(name, value)
+        else:
+            setattr(self.user, name, value)
+
+
+class StatelessJWTAuthentication(CustomerJWTAuthentication):
+    # With "STORE_JWT_STATELESS" on, requests are authenticated from the token alone. Users stay authenticated until their token expires, even once
+    # they're made inactive or lose their staff flag, so it's off by default.
+    def get_user(self, validated_token):
+        if not (getattr(settings, "STORE_JWT_STATELESS", False) and claims_enabled()):
+            return super().get_user(validated_token)
+        if api_settings.USER_ID_CLAIM not in validated_token:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+        return ClaimsUser(validated_token)
@@ -1,5 +1,9 @@
 # For customizing serializers, fields, in creation of new users.
 from djoser.serializers import UserSerializer as BaseUserSerializer, UserCreateSerializer as BaseUserCreateSerializer
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer as BaseTokenObtainPairSerializer
+
+from store.models import Customer
+from .authentication import CUSTOMER_ID_CLAIM, IS_STAFF_CLAIM
 
 
 class UserCreateSerializer(BaseUserCreateSerializer):
@@ -14,3 +18,16 @@ class UserSerializer(BaseUserSerializer):
     # Custom fields, fname lname, to be returned when user is authenticated via JWT (at /auth/users/me/).
     class Meta(BaseUserSerializer.Meta):
         fields = ["id", "username", "email", "first_name", "last_name"]
+
+
+# Adds the customer id and the staff flag of the user to the tokens (core/authentication.py), so requests don't read them from the database.
+class TokenObtainPairSerializer(BaseTokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        token[IS_STAFF_CLAIM] = user.is_staff
+        customer_id = Customer.objects.filter(user_id=user.id).values_list("id", flat=True).first()
+        # E.g. users created before customers were created for them by a signal.
+        if customer_id is not None:
+            token[CUSTOMER_ID_CLAIM] = customer_id
+        return token
@@ -1,5 +1,9 @@
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver  # Receiver decorator.
 
+from core.authentication import forget_user
+
 # Receiving the signal from "store" app.
 from store.signals import order_created
 
@@ -8,3 +12,9 @@ from store.signals import order_created
 @receiver(order_created)  # Receiving this signal.
 def on_order_created(sender, **kwargs):
     print(kwargs["order"])
+
+
+# The cached user of stateless requests (core/authentication.py) is dropped when the user changes, e.g. their password or their staff flag.
+@receiver([post_save, post_delete], sender=settings.AUTH_USER_MODEL)
+def forget_cached_user(sender, instance, **kwargs):
+    forget_user(instance.pk)
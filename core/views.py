@@ -1,3 +1,11 @@
 from django.shortcuts import render
+from rest_framework_simplejwt.views import TokenObtainPairView as BaseTokenObtainPairView
+
+from .serializers import TokenObtainPairSerializer
 
 # Create your views here.
+
+
+# "/auth/jwt/create/", with the claims of "TokenObtainPairSerializer". Routed before the URLs of djoser, which would use the serializer of simplejwt.
+class TokenObtainPairView(BaseTokenObtainPairView):
+    serializer_class = TokenObtainPairSerializer
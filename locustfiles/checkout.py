@@ -0,0 +1,39 @@
+from locust import HttpUser, task, between  # Used for testing performance.
+
+# For reading the credentials of the test user, and for picking random products.
+import os
+from random import randint, sample
+
+
+'''
+Commands for running locust:
+"locust -f locustfiles/checkout.py" for specifying the locust file, add path.
+Access locus via: http://localhost:8089/
+Add host for locus interface: http://localhost:8000
+
+The users log in with an existing account, set with the "LOCUST_USERNAME" and "LOCUST_PASSWORD" environment variables. Compare the requests per
+second of "/store/orders" before and after a change to the checkout, with the same number of users and the same database.
+'''
+
+
+class CheckoutUser(HttpUser):
+    """Fills a cart and checks it out, over and over. Only the checkout is timed under "/store/orders", so its throughput can be compared.
+    """
+    # Short waits, so the checkout is the bottleneck rather than the users.
+    wait_time = between(1, 3)
+
+    def on_start(self):
+        response = self.client.post('/auth/jwt/create/', json={
+            'username': os.environ.get('LOCUST_USERNAME', 'admin'),
+            'password': os.environ.get('LOCUST_PASSWORD', 'admin')}, name='/auth/jwt/create')
+        # The "JWT" prefix is set with "AUTH_HEADER_TYPES" in the settings.
+        self.client.headers['Authorization'] = f'JWT {response.json()["access"]}'
+
+    @task
+    def checkout(self):
+        cart_id = self.client.post('/store/carts/', name='/store/carts').json()['id']
+        # Between 1 and 10 distinct products, added in one request.
+        items = [{'product_id': product_id, 'quantity': randint(1, 5)} for product_id in sample(range(1, 1001), randint(1, 10))]
+        self.client.post(f'/store/carts/{cart_id}/items/batch/', json={'items': items}, name='/store/carts/items/batch')
+
+        self.client.post('/store/orders/', json={'cart_id': cart_id}, name='/store/orders')
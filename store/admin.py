@@ -1,9 +1,12 @@
 from django.contrib import admin, messages
 from django.db.models.aggregates import Count
 from django.db.models.query import QuerySet
+from django.utils import timezone
 from django.utils.html import format_html, urlencode
 from django.urls import reverse
 from . import models
+from .caching import bump_product_versions
+from .snapshot import publish_change
 
 
 class InventoryFilter(admin.SimpleListFilter):
@@ -61,7 +64,11 @@ class ProductAdmin(admin.ModelAdmin):
 
     @admin.action(description='Clear inventory')
     def clear_inventory(self, request, queryset):
-        updated_count = queryset.update(inventory=0)
+        # "last_update" is set too, since "update()" skips "auto_now" fields, and it's what the "Last-Modified" header and the catalog snapshot go by.
+        updated_count = queryset.update(inventory=0, last_update=timezone.now())
+        # "update()" doesn't send signals, so the cached responses of these products are invalidated here.
+        bump_product_versions(queryset)
+        publish_change()
         self.message_user(
             request,
             f'{updated_count} products were successfully updated.',
@@ -91,11 +98,6 @@ class CollectionAdmin(admin.ModelAdmin):
             }))
         return format_html('<a href="{}">{} Products</a>', url, collection.products_count)
 
-    def get_queryset(self, request):
-        return super().get_queryset(request).annotate(
-            products_count=Count('products')
-        )
-
 
 @admin.register(models.Customer)
 class CustomerAdmin(admin.ModelAdmin):
@@ -0,0 +1,54 @@
+# Archival of old orders. Completed orders placed before a cutoff are moved with their items from "Order" and "OrderItem" to "ArchivedOrder" and
+# "ArchivedOrderItem" by the "archive_orders" task (store/tasks.py), a batch per transaction, so the order tables that checkouts and order lists
+# read stay small.
+#
+# Orders are copied and deleted with SQL, without the signals of "Order" and "OrderItem": an archived order still counts in the summary of its
+# customer and in the sales rollups, which read the archive as well when they're computed again.
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import ArchivedOrder, ArchivedOrderItem, Order, OrderItem
+from .sql import quote
+
+
+def copy_rows(source, target, columns, key, ids, extra=None):
+    # "extra" are "{column: value}" pairs written to every row, which aren't in the source table.
+    extra = extra or {}
+    placeholders = ", ".join(["%s"] * len(ids))
+    selected = ", ".join([quote(column) for column in columns] + ["%s"] * len(extra))
+    written = ", ".join(quote(column) for column in [*columns, *extra])
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {quote(target._meta.db_table)} ({written}) SELECT {selected} "
+                       f"FROM {quote(source._meta.db_table)} WHERE {quote(key)} IN ({placeholders})", [*extra.values(), *ids])
+
+
+def delete_rows(model, key, ids):
+    placeholders = ", ".join(["%s"] * len(ids))
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {quote(model._meta.db_table)} WHERE {quote(key)} IN ({placeholders})", ids)
+        return cursor.rowcount
+
+
+# Moves the completed orders placed before "placed_before" to the archive, "batch_size" orders per transaction, oldest first. Orders locked by
+# another transaction, e.g. one changing their payment status, are skipped. Returns the number of orders and items archived.
+def archive_orders(placed_before, batch_size):
+    orders = items = 0
+    last = None
+    while True:
+        with transaction.atomic():
+            queryset = Order.objects.filter(payment_status=Order.PAYMENT_STATUS_COMPLETE, placed_at__lt=placed_before)
+            if last is not None:
+                # Keyset over "(placed_at, id)", so the orders skipped by a batch aren't read again by the next ones.
+                queryset = queryset.filter(Q(placed_at__gt=last[0]) | Q(placed_at=last[0], id__gt=last[1]))
+            batch = list(queryset.order_by("placed_at", "id").select_for_update(skip_locked=True)
+                         .values_list("placed_at", "id")[:batch_size])
+            if not batch:
+                return orders, items
+            ids = [order_id for _, order_id in batch]
+            copy_rows(Order, ArchivedOrder, ["id", "placed_at", "payment_status", "customer_id"], "id", ids,
+                      extra={"archived_at": connection.ops.adapt_datetimefield_value(timezone.now())})
+            copy_rows(OrderItem, ArchivedOrderItem, ["id", "order_id", "product_id", "quantity", "unit_price"], "order_id", ids)
+            items += delete_rows(OrderItem, "order_id", ids)
+            orders += delete_rows(Order, "id", ids)
+        last = batch[-1]
@@ -0,0 +1,120 @@
+# Response cache for the catalog endpoints (products and collections).
+# Cache keys include a version number for each "scope" the response depends on: the whole catalog, a collection or a product. Signal handlers bump the
+# versions whenever a product, product image or collection changes, so new requests use new keys and never see a stale response. Old entries are
+# simply never read again, and expire after the timeout.
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.db import transaction
+from rest_framework.response import Response
+
+CATALOG_SCOPE = "catalog"
+
+
+# Ids from URLs and query parameters are strings, where "01" is the same row as "1", whose scope the signal handlers bump.
+def normalize_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return value
+
+
+def collection_scope(collection_id):
+    return f"collection:{normalize_id(collection_id)}"
+
+
+def product_scope(product_id):
+    return f"product:{normalize_id(product_id)}"
+
+
+def _version_key(scope):
+    return f"store:version:{scope}"
+
+
+def get_versions(scopes):
+    keys = [_version_key(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    for key in missing:
+        # Starting from the current time rather than from 1, so a version that was evicted from the cache can't restart at a number that was already used.
+        cache.add(key, time.time_ns(), timeout=None)
+    if missing:
+        versions.update(cache.get_many(missing))
+    return [versions.get(key, 0) for key in keys]
+
+
+def _bump(keys):
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:  # The version isn't in the cache yet.
+            cache.add(key, time.time_ns(), timeout=None)
+
+
+def bump_versions(*scopes):
+    keys = {_version_key(scope) for scope in scopes}
+    # Bumped right away, and once more when the transaction commits. A concurrent request may read the old rows and cache them under the new version
+    # before the commit, and the second bump makes sure that entry is never served.
+    _bump(keys)
+    transaction.on_commit(lambda: _bump(keys))
+
+
+# Bumps the versions a set of products belong to. Used for bulk changes that don't send signals, like "QuerySet.update()".
+def bump_product_versions(products):
+    scopes = {CATALOG_SCOPE}
+    for product_id, collection_id in products.values_list("id", "collection_id"):
+        scopes.add(product_scope(product_id))
+        scopes.add(collection_scope(collection_id))
+    bump_versions(*scopes)
+
+
+# Turns query parameters into a stable string, so "?b=2&a=1" and "?a=1&b=2" share a cache entry. Empty values are dropped, like the filters do.
+def normalize_query_params(query_params, exclude=()):
+    items = []
+    for key, values in sorted(query_params.lists()):
+        values = sorted(value for value in values if value != "")
+        if key not in exclude and values:
+            items.append((key, values))
+    return urlencode(items, doseq=True)
+
+
+# Mixin for viewsets that caches the data of "list" and "retrieve" responses. The viewset defines which scopes each response depends on in
+# "get_cache_scopes()".
+class CachedResponseMixin:
+    def get_cache_scopes(self):
+        raise NotImplementedError(
+            "Viewsets using CachedResponseMixin must define get_cache_scopes().")
+
+    def get_response_cache_key(self, request):
+        versions = get_versions(self.get_cache_scopes())
+        lookup = self.kwargs.get(self.lookup_url_kwarg or self.lookup_field, "")
+        # The host and scheme are part of the key, since the pagination links and image URLs in the response are absolute.
+        parts = [self.basename, self.action, str(lookup), request.scheme, request.get_host(),
+                 *(str(version) for version in versions), normalize_query_params(request.query_params)]
+        digest = hashlib.md5("|".join(parts).encode()).hexdigest()
+        return f"store:response:{digest}"
+
+    def cached_response(self, view_method, request, *args, **kwargs):
+        if not getattr(settings, "STORE_RESPONSE_CACHE_ENABLED", True):
+            return view_method(request, *args, **kwargs)
+
+        key = self.get_response_cache_key(request)
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+
+        response = view_method(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, getattr(
+                settings, "STORE_RESPONSE_CACHE_TIMEOUT", DEFAULT_TIMEOUT))
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
@@ -0,0 +1,370 @@
+# Cart storage. Carts live in the database by default, where every anonymous visitor gets a "Cart" row and every add-to-cart writes a "CartItem".
+# With "STORE_CART_BACKEND = 'store.carts.RedisCartBackend'" they're kept in Redis hashes instead (through the "django_redis" cache), and the database
+# only gets them at checkout, or from the "persist_carts" task (store/tasks.py), which writes the carts changed since its previous run.
+#
+# The "/store/carts/" and nested "items/" endpoints return the same data with either backend. In Redis an item is known by its product, so the "id" of
+# an item is the id of its product there.
+import logging
+from datetime import datetime
+from functools import lru_cache
+from uuid import UUID, uuid4
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.http import Http404
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import Cart, CartItem, Product
+from .serializers import MAX_CART_ITEM_QUANTITY, CartItemSerializer, UpdateCartItemSerializer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CART_BACKEND = "store.carts.DatabaseCartBackend"
+
+
+def get_cart_backend():
+    return load_cart_backend(getattr(settings, "STORE_CART_BACKEND", DEFAULT_CART_BACKEND))
+
+
+# One backend instance per path, so the setting can still be changed (e.g. by tests).
+@lru_cache(maxsize=None)
+def load_cart_backend(path):
+    return import_string(path)()
+
+
+def parse_cart_id(cart_id):
+    try:
+        return UUID(str(cart_id))
+    except ValueError:
+        return None
+
+
+class DatabaseCartBackend:
+    # The views keep using the "Cart" and "CartItem" models, so there's nothing to persist or discard.
+    uses_database = True
+
+    # Adds "{product_id: quantity}" to the cart. Returns the added items, or None if there's no such cart. Nothing is added unless every product
+    # exists, and then only the items of the products that do exist are returned.
+    def add_items(self, cart_id, quantities):
+        cart_id = parse_cart_id(cart_id)
+        if cart_id is None:
+            return None
+        if len(quantities) == 1:
+            # A single statement, which adds nothing when the product doesn't exist.
+            items = CartItem.objects.add_items(cart_id, quantities)
+        else:
+            with transaction.atomic():
+                items = CartItem.objects.add_items(cart_id, quantities)
+                if len(items) < len(quantities):
+                    transaction.set_rollback(True)
+        # Only an empty result needs a query to tell a missing cart from missing products.
+        if not items and not Cart.objects.filter(pk=cart_id).exists():
+            return None
+        return items
+
+    def persist(self, cart_id, checkout=False):
+        pass
+
+    def persist_changed(self, batch_size):
+        return 0
+
+    def start_checkout(self, cart_id):
+        pass
+
+    def cancel_checkout(self, cart_id):
+        pass
+
+    def discard(self, cart_id):
+        pass
+
+
+class RedisCartBackend:
+    """Keeps every cart in one Redis hash: "created_at", and a "<product id>: <quantity>" field per item.
+    The hash expires "STORE_CART_TTL" seconds after the last change. Changed carts are added to a set, which "persist_changed()" empties into the database.
+    A cart that isn't in Redis, but is in the database (e.g. saved before the backend was switched), is loaded into Redis when it's first read.
+    A cart being checked out is marked in Redis, so "persist_changed()" doesn't write it back to the database after the checkout deleted it.
+    """
+    uses_database = False
+    key_prefix = "store:cart"
+    # How long the mark of a checked out cart is kept, in seconds. Longer than a "persist_changed()" run can take.
+    checkout_ttl = 60 * 60
+
+    @property
+    def client(self):
+        from django_redis import get_redis_connection
+        return get_redis_connection("default")
+
+    @property
+    def ttl(self):
+        return getattr(settings, "STORE_CART_TTL", 30 * 24 * 60 * 60)
+
+    def key(self, cart_id):
+        return f"{self.key_prefix}:{cart_id}"
+
+    @property
+    def changed_key(self):
+        return f"{self.key_prefix}:changed"
+
+    def checkout_key(self, cart_id):
+        return f"{self.key(cart_id)}:checkout"
+
+    # "(created_at, {product_id: quantity})" of a cart in Redis, or None.
+    def read(self, cart_id):
+        data = self.client.hgetall(self.key(cart_id))
+        if b"created_at" not in data:
+            return None
+        created_at = datetime.fromisoformat(data.pop(b"created_at").decode())
+        return created_at, {int(product_id): int(quantity) for product_id, quantity in data.items()}
+
+    def write(self, cart_id, created_at, items):
+        key = self.key(cart_id)
+        pipeline = self.client.pipeline()
+        pipeline.delete(key)
+        pipeline.hset(key, mapping={"created_at": created_at.isoformat(), **items})
+        pipeline.expire(key, self.ttl)
+        pipeline.execute()
+
+    # Reads a cart from Redis, or else from the database.
+    def load(self, cart_id):
+        cart_id = parse_cart_id(cart_id)
+        if cart_id is None:
+            return None
+        cart = self.read(cart_id)
+        if cart is None:
+            created_at = Cart.objects.filter(pk=cart_id).values_list("created_at", flat=True).first()
+            if created_at is None:
+                return None
+            cart = created_at, dict(CartItem.objects.filter(cart_id=cart_id).values_list("product_id", "quantity"))
+            self.write(cart_id, *cart)
+        return cart
+
+    # Runs the commands of a change to a cart, then renews its expiry and marks it as changed.
+    def change(self, cart_id, *commands):
+        key = self.key(cart_id)
+        pipeline = self.client.pipeline()
+        for name, *args in commands:
+            getattr(pipeline, name)(key, *args)
+        pipeline.expire(key, self.ttl)
+        pipeline.sadd(self.changed_key, str(cart_id))
+        return pipeline.execute()
+
+    def create_cart(self):
+        cart_id = uuid4()
+        self.write(cart_id, timezone.now(), {})
+        # Not marked as changed: an empty cart is only written to the database once something is added to it.
+        return cart_id
+
+    def delete_cart(self, cart_id):
+        cart_id = parse_cart_id(cart_id)
+        if cart_id is None:
+            return False
+        deleted = self.client.delete(self.key(cart_id))
+        self.client.srem(self.changed_key, str(cart_id))
+        # The cart may also have been written to the database already.
+        deleted_rows, _ = Cart.objects.filter(pk=cart_id).delete()
+        return bool(deleted or deleted_rows)
+
+    # Items of the cart as unsaved "CartItem" objects with their products, ordered by product. Items of deleted products are left out.
+    def get_items(self, cart_id, items):
+        products = Product.objects.only("id", "title", "unit_price").in_bulk(list(items))
+        return [CartItem(id=product_id, cart_id=cart_id, product=products[product_id], quantity=quantity)
+                for product_id, quantity in sorted(items.items()) if product_id in products]
+
+    def get_cart(self, cart_id):
+        cart = self.load(cart_id)
+        if cart is None:
+            return None
+        items = self.get_items(cart_id, cart[1])
+        return {
+            "id": str(parse_cart_id(cart_id)),
+            "items": CartItemSerializer(items, many=True).data,
+            # Same as "CartSerializer.get_total_price()".
+            "total_price": sum([item.quantity * item.product.unit_price for item in items]),
+        }
+
+    # Same as "DatabaseCartBackend.add_items()". The items are known by their products here. Redis has no limit on the quantities, so when an item
+    # would go over what the database can keep, the quantities are taken back out, and the items come back with the totals they would have had.
+    def add_items(self, cart_id, quantities):
+        cart_id = parse_cart_id(cart_id)
+        if cart_id is None or self.load(cart_id) is None:
+            return None
+        product_ids = sorted(Product.objects.filter(id__in=list(quantities)).values_list("id", flat=True))
+        if len(product_ids) < len(quantities):
+            return [CartItem(id=product_id, cart_id=cart_id, product_id=product_id, quantity=quantities[product_id]) for product_id in product_ids]
+        totals = self.change(cart_id, *(("hincrby", product_id, quantities[product_id]) for product_id in product_ids))
+        if any(total > MAX_CART_ITEM_QUANTITY for total in totals[:len(product_ids)]):
+            # Items that weren't in the cart before are removed again.
+            self.change(cart_id, *(("hincrby", product_id, -quantities[product_id]) if total > quantities[product_id] else ("hdel", product_id)
+                                   for product_id, total in zip(product_ids, totals)))
+        return [CartItem(id=product_id, cart_id=cart_id, product_id=product_id, quantity=total)
+                for product_id, total in zip(product_ids, totals)]
+
+    # Sets the quantity of an item. Returns False if there's no such item.
+    def update_item(self, cart_id, product_id, quantity):
+        cart = self.load(cart_id)
+        if cart is None or product_id not in cart[1]:
+            return False
+        self.change(parse_cart_id(cart_id), ("hset", product_id, quantity))
+        return True
+
+    def remove_item(self, cart_id, product_id):
+        cart = self.load(cart_id)
+        if cart is None or product_id not in cart[1]:
+            return False
+        self.change(parse_cart_id(cart_id), ("hdel", product_id))
+        return True
+
+    # Writes the cart from Redis to the database: the "Cart" row and exactly its items. Carts that aren't in Redis are left as they are, and so are
+    # carts being checked out, unless it's the checkout itself ("checkout=True") writing the cart.
+    def persist(self, cart_id, checkout=False):
+        cart_id = parse_cart_id(cart_id)
+        if cart_id is None:
+            return
+        cart = self.read(cart_id)
+        if cart is None:
+            return
+        created_at, items = cart
+        with transaction.atomic():
+            # The row is locked (or inserted) before looking for the mark. The checkout marks the cart before it writes or deletes the row, so either
+            # the mark is seen here, or the checkout waits for this transaction and deletes the cart afterwards.
+            created = Cart.objects.select_for_update().get_or_create(pk=cart_id)[1]
+            if not checkout and self.client.exists(self.checkout_key(cart_id)):
+                transaction.set_rollback(True)
+                return
+            if created:
+                # "created_at" is set to now on insert, since it's "auto_now_add".
+                Cart.objects.filter(pk=cart_id).update(created_at=created_at)
+            CartItem.objects.filter(cart_id=cart_id).delete()
+            product_ids = Product.objects.filter(id__in=list(items)).values_list("id", flat=True)
+            CartItem.objects.bulk_create([CartItem(cart_id=cart_id, product_id=product_id, quantity=items[product_id])
+                                          for product_id in sorted(product_ids)])
+
+    # Persists the carts changed since the previous call, "batch_size" at a time. Returns how many were persisted.
+    def persist_changed(self, batch_size):
+        persisted = 0
+        while True:
+            cart_ids = self.client.spop(self.changed_key, batch_size)
+            if not cart_ids:
+                return persisted
+            for cart_id in cart_ids:
+                try:
+                    self.persist(cart_id.decode())
+                    persisted += 1
+                except Exception:
+                    # Tried again at the next run.
+                    logger.exception("Could not persist cart %s", cart_id)
+                    self.client.sadd(self.changed_key, cart_id)
+
+    # Marks a cart as being checked out, before the checkout writes it to the database and deletes it there.
+    def start_checkout(self, cart_id):
+        cart_id = parse_cart_id(cart_id)
+        if cart_id is not None:
+            self.client.set(self.checkout_key(cart_id), 1, ex=self.checkout_ttl)
+
+    # For a checkout that failed, e.g. of an empty cart, so the cart is persisted again.
+    def cancel_checkout(self, cart_id):
+        cart_id = parse_cart_id(cart_id)
+        if cart_id is not None:
+            self.client.delete(self.checkout_key(cart_id))
+
+    # Removes a cart that was checked out. The database has its own copy deleted by the checkout. The mark of the checkout is kept until it expires,
+    # for a "persist_changed()" run which read the cart before it was removed.
+    def discard(self, cart_id):
+        cart_id = parse_cart_id(cart_id)
+        self.client.delete(self.key(cart_id))
+        self.client.srem(self.changed_key, str(cart_id))
+
+
+# Deletes the carts created before "created_before" from the database, with their items. Carts are read in keyset batches of "batch_size", oldest
+# first, and each batch is deleted in its own short transaction. Returns the number of carts and cart items deleted.
+def purge_carts(created_before, batch_size):
+    carts = items = 0
+    last = None
+    while True:
+        queryset = Cart.objects.filter(created_at__lt=created_before)
+        if last is not None:
+            queryset = queryset.filter(Q(created_at__gt=last[0]) | Q(created_at=last[0], id__gt=last[1]))
+        batch = list(queryset.order_by("created_at", "id").values_list("created_at", "id")[:batch_size])
+        if not batch:
+            return carts, items
+        with transaction.atomic():
+            _, deleted = Cart.objects.filter(pk__in=[cart_id for _, cart_id in batch]).delete()
+        carts += deleted.get(Cart._meta.label, 0)
+        items += deleted.get(CartItem._meta.label, 0)
+        last = batch[-1]
+
+
+# The views fall back to the models ("super()") when the backend keeps carts in the database.
+class CartStorageMixin:
+    def create(self, request, *args, **kwargs):
+        backend = get_cart_backend()
+        if backend.uses_database:
+            return super().create(request, *args, **kwargs)
+        cart = backend.get_cart(backend.create_cart())
+        return Response(cart, status=status.HTTP_201_CREATED)
+
+    def retrieve(self, request, *args, **kwargs):
+        backend = get_cart_backend()
+        if backend.uses_database:
+            return super().retrieve(request, *args, **kwargs)
+        cart = backend.get_cart(kwargs["pk"])
+        if cart is None:
+            raise Http404
+        return Response(cart)
+
+    def destroy(self, request, *args, **kwargs):
+        backend = get_cart_backend()
+        if backend.uses_database:
+            return super().destroy(request, *args, **kwargs)
+        if not backend.delete_cart(kwargs["pk"]):
+            raise Http404
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+# Items are added by "AddCartItemSerializer" with either backend, which gets the backend in its context.
+class CartItemStorageMixin:
+    def get_cart_item(self, backend):
+        cart = backend.get_cart(self.kwargs["cart_pk"])
+        pk = str(self.kwargs["pk"])
+        for item in (cart["items"] if cart else []):
+            if str(item["id"]) == pk:
+                return item
+        raise Http404
+
+    def list(self, request, *args, **kwargs):
+        backend = get_cart_backend()
+        if backend.uses_database:
+            return super().list(request, *args, **kwargs)
+        cart = backend.get_cart(kwargs["cart_pk"])
+        return Response(cart["items"] if cart else [])
+
+    def retrieve(self, request, *args, **kwargs):
+        backend = get_cart_backend()
+        if backend.uses_database:
+            return super().retrieve(request, *args, **kwargs)
+        return Response(self.get_cart_item(backend))
+
+    def partial_update(self, request, *args, **kwargs):
+        backend = get_cart_backend()
+        if backend.uses_database:
+            return super().partial_update(request, *args, **kwargs)
+        item = self.get_cart_item(backend)
+        serializer = UpdateCartItemSerializer(data=request.data, partial=True)
+        serializer.is_valid(raise_exception=True)
+        quantity = serializer.validated_data.get("quantity", item["quantity"])
+        if not backend.update_item(kwargs["cart_pk"], item["id"], quantity):
+            raise Http404
+        return Response({"quantity": quantity})
+
+    def destroy(self, request, *args, **kwargs):
+        backend = get_cart_backend()
+        if backend.uses_database:
+            return super().destroy(request, *args, **kwargs)
+        item = self.get_cart_item(backend)
+        if not backend.remove_item(kwargs["cart_pk"], item["id"]):
+            raise Http404
+        return Response(status=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,57 @@
+# Conditional GET support ("ETag", "Last-Modified", "If-None-Match" and "If-Modified-Since") for the catalog endpoints.
+# The validators are computed with a single aggregate query, like "MAX(last_update)" and "COUNT(*)" of the filtered products, so a client with a fresh copy
+# gets a "304 Not Modified" before any serializer work happens.
+import hashlib
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from .caching import normalize_query_params
+
+
+# Mixin for viewsets. The viewset returns "(last_modified, version)" from "get_conditional_validators()", where version is anything else that changes
+# the response, like the number of rows. Returning None skips conditional handling for that request.
+#
+# "Last-Modified" is only sent when the version is empty, i.e. for a single row. A deleted row doesn't change "MAX(last_update)", so a list that lost
+# a row would still look unmodified to "If-Modified-Since". Those responses only have the "ETag", which includes the version.
+class ConditionalGetMixin:
+    def get_conditional_validators(self):
+        raise NotImplementedError(
+            "Viewsets using ConditionalGetMixin must define get_conditional_validators().")
+
+    def get_etag(self, request, last_modified, version):
+        lookup = self.kwargs.get(self.lookup_url_kwarg or self.lookup_field, "")
+        # Everything else the body depends on: the query parameters, the renderer (JSON or browsable API), and the host for absolute URLs.
+        parts = [self.basename, self.action, str(lookup), normalize_query_params(request.query_params),
+                 request.accepted_renderer.format, request.scheme, request.get_host(),
+                 last_modified.isoformat() if last_modified else "", str(version)]
+        # A weak ETag, since the body is only guaranteed to be equivalent, not byte for byte identical.
+        return f'W/"{hashlib.md5("|".join(parts).encode()).hexdigest()}"'
+
+    def conditional_response(self, view_method, request, *args, **kwargs):
+        validators = self.get_conditional_validators()
+        if validators is None:
+            return view_method(request, *args, **kwargs)
+
+        last_modified, version = validators
+        etag = self.get_etag(request, last_modified, version)
+        timestamp = int(last_modified.timestamp()) if last_modified and version == "" else None
+
+        # Returns a "304 Not Modified" response if the client's copy is still fresh.
+        response = get_conditional_response(
+            request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = view_method(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+
+        response["ETag"] = etag
+        if timestamp is not None:
+            response["Last-Modified"] = http_date(timestamp)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(super().retrieve, request, *args, **kwargs)
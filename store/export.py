@@ -0,0 +1,71 @@
+# Streaming export of the catalog, used by the "products/export/" endpoint and the "export_products" command. Products are read in batches ordered by
+# id ("WHERE id > <last id of the previous batch> ORDER BY id LIMIT <batch size>"), with one query for the images of each batch, so memory use stays
+# flat however large the catalog is, and no database cursor is held open while a slow client reads the response.
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import ProductImage
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+EXPORT_FIELDS = ["id", "title", "slug", "description", "unit_price", "inventory",
+                 "last_update", "collection_id", "collection", "images"]
+
+EXPORT_BATCH_SIZE = 1000
+
+
+# Yields every product of the queryset as a dictionary, with the title of its collection and the URLs of its images. "image_url" turns the stored
+# name of an image into a URL.
+def export_products(queryset, image_url, batch_size=EXPORT_BATCH_SIZE):
+    queryset = queryset.prefetch_related(None).order_by("id").values(
+        "id", "title", "slug", "description", "unit_price", "inventory", "last_update", "collection_id", "collection__title")
+    last_id = None
+    while True:
+        batch = queryset if last_id is None else queryset.filter(id__gt=last_id)
+        batch = list(batch[:batch_size])
+        if not batch:
+            return
+
+        images = {}
+        for product_id, name in ProductImage.objects.filter(product_id__in=[row["id"] for row in batch]).order_by("id").values_list("product_id", "image"):
+            images.setdefault(product_id, []).append(image_url(name))
+
+        for row in batch:
+            row["collection"] = row.pop("collection__title")
+            row["images"] = images.get(row["id"], [])
+            yield row
+        last_id = batch[-1]["id"]
+
+
+def to_ndjson(rows):
+    for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder) + "\n"
+
+
+# Used as the file of "csv.writer", which then returns each line instead of writing it somewhere.
+class Echo:
+    def write(self, value):
+        return value
+
+
+def to_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    encoder = DjangoJSONEncoder()
+    for row in rows:
+        # Image URLs are separated by spaces. Dates are written like in the JSON output.
+        values = dict(row, images=" ".join(row["images"]),
+                      last_update=encoder.default(row["last_update"]))
+        yield writer.writerow([values[field] for field in EXPORT_FIELDS])
+
+
+# Returns the lines of the export in the given format.
+def render_export(rows, export_format):
+    if export_format == "csv":
+        return to_csv(rows)
+    return to_ndjson(rows)
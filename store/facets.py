@@ -0,0 +1,114 @@
+# Facet counts for the product list, sent with "?facets=true": the number of matching products in each collection, and in each "unit_price" bucket.
+# Both come from one grouped query over the filtered products ("GROUP BY collection, price bucket"), which is then summed up per collection and per
+# bucket. The result is cached per filter state, so paging through or reordering the same list doesn't run the query again.
+import hashlib
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.db.models import Case, Count, IntegerField, Value, When
+from rest_framework.exceptions import ValidationError
+
+from .caching import get_versions, normalize_query_params
+
+DEFAULT_PRICE_BUCKETS = [10, 25, 50, 100]
+# Keeps the "CASE" expression of the query small.
+MAX_PRICE_BUCKETS = 20
+# Query parameters which don't change the matching products, so they don't change the facets either.
+NON_FILTER_PARAMS = ("facets", "page", "cursor",
+                     "ordering", "fields", "omit", "format")
+
+
+def facets_requested(request):
+    return request.query_params.get("facets", "").lower() in ("1", "true", "yes")
+
+
+# The bucket boundaries, from "?price_buckets=10,50,100", or the "STORE_FACET_PRICE_BUCKETS" setting.
+def get_price_buckets(request):
+    value = request.query_params.get("price_buckets")
+    if not value:
+        return [Decimal(str(boundary)) for boundary in getattr(settings, "STORE_FACET_PRICE_BUCKETS", DEFAULT_PRICE_BUCKETS)]
+    boundaries = set()
+    for boundary in value.split(","):
+        if not boundary.strip():
+            continue
+        try:
+            boundary = Decimal(boundary.strip())
+        except InvalidOperation:
+            boundary = None
+        # "NaN" and "Infinity" parse, but aren't prices (and "sNaN" can't even be compared).
+        if boundary is None or not boundary.is_finite():
+            raise ValidationError(
+                {"price_buckets": "Must be a comma separated list of prices."})
+        boundaries.add(boundary)
+    boundaries = sorted(boundaries)
+    if len(boundaries) > MAX_PRICE_BUCKETS:
+        raise ValidationError(
+            {"price_buckets": f"At most {MAX_PRICE_BUCKETS} prices are allowed."})
+    return boundaries
+
+
+# Counts the products of a queryset per collection and per price bucket. Boundaries split the prices into "below the first boundary", "between two
+# boundaries" (lower one included) and "from the last boundary".
+def product_facets(queryset, boundaries):
+    bucket = Case(
+        *(When(unit_price__lt=boundary, then=Value(index))
+          for index, boundary in enumerate(boundaries)),
+        default=Value(len(boundaries)), output_field=IntegerField())
+    rows = (queryset.prefetch_related(None).order_by()
+            .annotate(price_bucket=bucket)
+            .values("collection_id", "collection__title", "price_bucket")
+            .annotate(count=Count("id")))
+
+    collections = {}
+    bucket_counts = [0] * (len(boundaries) + 1)
+    for row in rows:
+        collection = collections.setdefault(row["collection_id"], {
+            "id": row["collection_id"], "title": row["collection__title"], "count": 0})
+        collection["count"] += row["count"]
+        bucket_counts[row["price_bucket"]] += row["count"]
+
+    edges = [None, *boundaries, None]
+    return {
+        "collections": sorted(collections.values(), key=lambda collection: (-collection["count"], collection["id"])),
+        "price": [{"min": None if edges[index] is None else str(edges[index]),
+                   "max": None if edges[index + 1] is None else str(edges[index + 1]),
+                   "count": count}
+                  for index, count in enumerate(bucket_counts)],
+    }
+
+
+# Mixin for the product viewset, which adds a "facets" section to paginated list responses when "?facets=true" is sent. The facets are cached
+# under the versions of "get_cache_scopes()", like the responses of CachedResponseMixin.
+class FacetsMixin:
+    def get_facets_cache_key(self, request, boundaries):
+        versions = get_versions(self.get_cache_scopes())
+        parts = [self.basename, *(str(version) for version in versions),
+                 normalize_query_params(
+                     request.query_params, exclude=NON_FILTER_PARAMS + ("price_buckets",)),
+                 ",".join(str(boundary) for boundary in boundaries)]
+        return f"store:facets:{hashlib.md5('|'.join(parts).encode()).hexdigest()}"
+
+    def get_facets(self, request):
+        boundaries = get_price_buckets(request)
+        enabled = getattr(settings, "STORE_RESPONSE_CACHE_ENABLED", True)
+        key = self.get_facets_cache_key(request, boundaries) if enabled else None
+        facets = cache.get(key) if enabled else None
+        if facets is None:
+            facets = product_facets(self.filter_queryset(
+                self.get_queryset()), boundaries)
+            if enabled:
+                cache.set(key, facets, getattr(
+                    settings, "STORE_RESPONSE_CACHE_TIMEOUT", DEFAULT_TIMEOUT))
+        return facets
+
+    def list(self, request, *args, **kwargs):
+        if not facets_requested(request):
+            return super().list(request, *args, **kwargs)
+        # Checked first, so invalid buckets are a 400 whatever the list returns.
+        get_price_buckets(request)
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == 200 and isinstance(response.data, dict):
+            response.data["facets"] = self.get_facets(request)
+        return response
@@ -0,0 +1,202 @@
+# Fast, read-only serialization for the busiest read endpoints. Rows are read with "values()" and turned into the exact same output as the
+# serializers in "serializers.py", but without creating model instances or going through the field machinery of DRF for every row and field.
+# The "to_representation()" methods of the serializer fields are looked up once ("precompiled") and called directly, so values are formatted
+# the same way (decimals, dates, etc.). Turned on with the "STORE_FAST_SERIALIZERS" setting.
+from decimal import Decimal
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.http import Http404
+from rest_framework.response import Response
+
+from .models import CartItem, OrderItem, ProductImage
+from .serializers import CartItemSerializer, OrderItemSerializer, OrderSerializer, ProductImageSerializer, ProductSerializer, SimpleProductSerializer
+
+
+def fast_serializers_enabled():
+    return getattr(settings, "STORE_FAST_SERIALIZERS", False)
+
+
+# Returns "(name, to_representation)" pairs for plain fields of a serializer. Cached, so the serializer fields are only built once.
+@lru_cache(maxsize=None)
+def compile_fields(serializer_class, names):
+    fields = serializer_class().fields
+    return tuple((name, fields[name].to_representation) for name in names)
+
+
+# Same as "Serializer.to_representation()" for plain fields: None stays None, anything else goes through the field. The "prefix" is for
+# values of related rows, like "product__title".
+def represent(compiled_fields, row, prefix=""):
+    data = {}
+    for name, to_representation in compiled_fields:
+        value = row[prefix + name]
+        data[name] = None if value is None else to_representation(value)
+    return data
+
+
+class FastProductSerializer:
+    plain_fields = ("id", "title", "description",
+                    "slug", "inventory", "unit_price")
+    # Always read from the database, since the keyset pagination orders by them.
+    ordering_columns = ["id", "title", "unit_price", "last_update"]
+
+    def __init__(self, request=None):
+        self.request = request
+        # The fields asked for with "?fields=" and "?omit=".
+        self.selected = ProductSerializer.get_fields_for(request)
+        self.fields = compile_fields(ProductSerializer, tuple(
+            name for name in self.plain_fields if name in self.selected))
+        self.image_fields = compile_fields(ProductImageSerializer, ("id",))
+        self.image_storage = ProductImage._meta.get_field("image").storage
+
+    def rows(self, queryset):
+        columns = dict.fromkeys(
+            self.ordering_columns + ProductSerializer.get_columns(self.selected))
+        # The search rank is kept, since the keyset pagination orders search results by it.
+        annotations = [name for name in ("search_rank",)
+                       if name in queryset.query.annotations]
+        return queryset.prefetch_related(None).values(*columns, *annotations)
+
+    # Same as the "image" field (ImageField) of ProductImageSerializer.
+    def image_url(self, name):
+        if not name:
+            return None
+        url = self.image_storage.url(name)
+        if self.request is not None:
+            return self.request.build_absolute_uri(url)
+        return url
+
+    # "images" maps product ids to "(id, name)" pairs of their images. When not given, they're read with one query for every product, like
+    # "prefetch_related('images')".
+    def serialize(self, rows, images=None):
+        rows = list(rows)
+        if "images" not in self.selected:
+            images = {}
+        elif images is None:
+            images = {}
+            for image_id, product_id, name in ProductImage.objects.filter(
+                    product_id__in=[row["id"] for row in rows]).values_list("id", "product_id", "image"):
+                images.setdefault(product_id, []).append((image_id, name))
+
+        results = []
+        for row in rows:
+            data = represent(self.fields, row)
+            # Same as "ProductSerializer.calculate_tax()", applied to the unit price read from the database.
+            data["price_with_tax"] = row["unit_price"] * Decimal(1.1)
+            data["collection"] = row.get("collection")
+            data["images"] = [dict(represent(self.image_fields, {"id": image_id}), image=self.image_url(name))
+                              for image_id, name in images.get(row["id"], ())]
+            # In the order of the serializer fields.
+            results.append({name: data[name] for name in self.selected})
+        return results
+
+
+class FastCartSerializer:
+    def __init__(self, request=None):
+        self.request = request
+        self.item_fields = compile_fields(
+            CartItemSerializer, ("id", "quantity"))
+        self.product_fields = compile_fields(
+            SimpleProductSerializer, ("id", "title", "unit_price"))
+
+    # The queryset must come from "Cart.objects.with_total_price()".
+    def rows(self, queryset):
+        return queryset.prefetch_related(None).values("id", "total_price")
+
+    def serialize(self, rows):
+        rows = list(rows)
+        items = {}
+        for item in CartItem.objects.with_total_price().filter(cart_id__in=[row["id"] for row in rows]).values(
+                "id", "cart_id", "quantity", "total_price", "product__id", "product__title", "product__unit_price"):
+            data = represent(self.item_fields, item)
+            items.setdefault(item["cart_id"], []).append({
+                "id": data["id"],
+                "product": represent(self.product_fields, item, "product__"),
+                "quantity": data["quantity"],
+                # Same as "CartItemSerializer.get_total_price()".
+                "total_price": item["total_price"],
+            })
+
+        return [{
+            "id": str(row["id"]),
+            "items": items.get(row["id"], []),
+            # Same as "CartSerializer.get_total_price()".
+            "total_price": row["total_price"],
+        } for row in rows]
+
+
+class FastOrderSerializer:
+    def __init__(self, request=None):
+        self.request = request
+        self.selected = OrderSerializer.get_fields_for(request)
+        self.fields = compile_fields(
+            OrderSerializer, ("id", "placed_at", "payment_status"))
+        self.item_fields = compile_fields(
+            OrderItemSerializer, ("id", "unit_price", "quantity"))
+        self.product_fields = compile_fields(
+            SimpleProductSerializer, ("id", "title", "unit_price"))
+
+    def rows(self, queryset):
+        return queryset.prefetch_related(None).values("id", "customer", "placed_at", "payment_status")
+
+    def serialize(self, rows):
+        rows = list(rows)
+        items = {}
+        order_ids = [row["id"] for row in rows] if "items" in self.selected else []
+        for item in OrderItem.objects.filter(order_id__in=order_ids).values(
+                "id", "order_id", "unit_price", "quantity", "product__id", "product__title", "product__unit_price"):
+            data = represent(self.item_fields, item)
+            items.setdefault(item["order_id"], []).append({
+                "id": data["id"],
+                "product": represent(self.product_fields, item, "product__"),
+                "unit_price": data["unit_price"],
+                "quantity": data["quantity"],
+            })
+
+        results = []
+        for row in rows:
+            data = represent(self.fields, row)
+            data["customer"] = row["customer"]
+            data["items"] = items.get(row["id"], [])
+            # In the order of the serializer fields.
+            results.append({name: data[name] for name in self.selected})
+        return results
+
+
+# Mixin for viewsets, which serves the actions listed in "fast_actions" with "fast_serializer_class" when fast serializers are turned on. Filtering,
+# pagination and permissions work as before.
+class FastSerializationMixin:
+    fast_serializer_class = None
+    fast_actions = ("list",)
+
+    def use_fast_serializer(self):
+        return fast_serializers_enabled() and self.action in self.fast_actions
+
+    def list(self, request, *args, **kwargs):
+        if not self.use_fast_serializer():
+            return super().list(request, *args, **kwargs)
+
+        serializer = self.fast_serializer_class(request)
+        rows = serializer.rows(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(serializer.serialize(page))
+        return Response(serializer.serialize(rows))
+
+    def retrieve(self, request, *args, **kwargs):
+        if not self.use_fast_serializer():
+            return super().retrieve(request, *args, **kwargs)
+
+        serializer = self.fast_serializer_class(request)
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = self.filter_queryset(self.get_queryset())
+        # Invalid ids, like a malformed UUID, are a 404 like in "get_object()".
+        try:
+            rows = list(serializer.rows(queryset.filter(
+                **{self.lookup_field: self.kwargs[lookup_url_kwarg]})))
+        except (TypeError, ValueError, ValidationError):
+            rows = []
+        if not rows:
+            raise Http404
+        return Response(serializer.serialize(rows)[0])
@@ -0,0 +1,80 @@
+# "Idempotency-Key" handling for view methods that change data, like the checkout, so a client retrying a request after a timeout gets the response
+# of the first attempt instead of running it again.
+#
+# The first request with a key runs the view, and its response is kept in the cache for "STORE_IDEMPOTENCY_TTL" seconds. Requests repeating the
+# key get that response back, with an "Idempotent-Replayed" header. While the first request runs, it holds a lock in the cache ("cache.add()" is
+# atomic with Redis), and repeats wait for its response for up to "STORE_IDEMPOTENCY_LOCK_TIMEOUT" seconds instead of running the view at the
+# same time. Keys are scoped to the user, the method and the path, and a key repeated with a different body is refused.
+import functools
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+# How often a repeated request checks whether the first one is done, in seconds.
+POLL_INTERVAL = 0.05
+
+
+def get_cache_key(request, key):
+    user = request.user.pk if request.user and request.user.is_authenticated else "anonymous"
+    digest = hashlib.sha256("|".join([str(user), request.method, request.path, key]).encode()).hexdigest()
+    return f"store:idempotency:{digest}"
+
+
+# A hash of the parsed body, so the same data sent as JSON with its keys in another order is the same request.
+def get_fingerprint(request):
+    return hashlib.sha256(json.dumps(request.data, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def replay(stored, fingerprint):
+    if stored["fingerprint"] != fingerprint:
+        return Response({"detail": f"The {HEADER} was already used with a different request."},
+                        status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+    return Response(stored["data"], status=stored["status"], headers={REPLAYED_HEADER: "true"})
+
+
+# Decorates a view method of a viewset. Requests without the header run the view as usual.
+def idempotent(view_method):
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return view_method(self, request, *args, **kwargs)
+        if len(key) > 255:
+            return Response({"detail": f"The {HEADER} must be at most 255 characters long."}, status=status.HTTP_400_BAD_REQUEST)
+
+        cache_key = get_cache_key(request, key)
+        lock_key = f"{cache_key}:lock"
+        fingerprint = get_fingerprint(request)
+        lock_timeout = getattr(settings, "STORE_IDEMPOTENCY_LOCK_TIMEOUT", 30)
+        deadline = time.monotonic() + lock_timeout
+        while True:
+            stored = cache.get(cache_key)
+            if stored is not None:
+                return replay(stored, fingerprint)
+            if cache.add(lock_key, fingerprint, timeout=lock_timeout):
+                break
+            if time.monotonic() >= deadline:
+                return Response({"detail": f"A request with this {HEADER} is still in progress."}, status=status.HTTP_409_CONFLICT)
+            time.sleep(POLL_INTERVAL)
+
+        try:
+            try:
+                response = view_method(self, request, *args, **kwargs)
+            except Exception as error:
+                # Errors like a validation error are responses too, which are kept and replayed. Others are raised again by "handle_exception()".
+                response = self.handle_exception(error)
+            # Server errors aren't kept, so the request can be tried again.
+            if response.status_code < 500:
+                cache.set(cache_key, {"fingerprint": fingerprint, "status": response.status_code, "data": response.data},
+                          getattr(settings, "STORE_IDEMPOTENCY_TTL", 24 * 60 * 60))
+            return response
+        finally:
+            cache.delete(lock_key)
+    return wrapper
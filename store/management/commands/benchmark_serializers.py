@@ -0,0 +1,117 @@
+from time import perf_counter
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Prefetch
+from django.test import RequestFactory
+from rest_framework.request import Request
+
+from store.fast_serializers import FastCartSerializer, FastOrderSerializer, FastProductSerializer
+from store.models import Cart, CartItem, Collection, Customer, Order, OrderItem, Product, ProductImage
+from store.serializers import CartSerializer, OrderSerializer, ProductSerializer
+
+
+class Command(BaseCommand):
+    """Compares the serializers with the fast serializers (store/fast_serializers.py) for product lists, carts and order lists, and the cart totals
+    summed in Python with the ones computed by the database.
+    Sample data is created inside a transaction which is rolled back at the end, so the database is left untouched.
+    """
+
+    help = 'Benchmarks the serializers against the fast serializers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[10, 100, 1000],
+                            help='Number of products, cart items and orders to serialize.')
+        parser.add_argument('--cart-items', type=int, default=500,
+                            help='Number of items of the cart whose totals are compared.')
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Runs per measurement. The fastest run is reported.')
+
+    def handle(self, *args, **options):
+        sizes = options['rows']
+        self.repeat = options['repeat']
+        # A host that's allowed while developing, for the absolute image URLs.
+        # A DRF request, since the serializers read "?fields=" from its "query_params".
+        self.request = Request(RequestFactory().get('/store/products/', HTTP_HOST='localhost'))
+
+        cart_items = Prefetch('items', queryset=CartItem.objects.with_total_price().select_related('product'))
+
+        with transaction.atomic():
+            carts = self.populate(max(sizes + [options['cart_items']]), sizes + [options['cart_items']])
+            for size in sizes:
+                products = Product.objects.order_by('id')[:size]
+                self.compare(
+                    'products', size,
+                    lambda: ProductSerializer(products.prefetch_related('images'), many=True,
+                                              context={'request': self.request}).data,
+                    lambda: FastProductSerializer(self.request).serialize(
+                        FastProductSerializer().rows(products)))
+
+                carts_query = Cart.objects.with_total_price().filter(pk=carts[size].pk)
+                self.compare(
+                    'cart items', size,
+                    lambda: CartSerializer(carts_query.prefetch_related(cart_items).get()).data,
+                    lambda: FastCartSerializer(self.request).serialize(
+                        FastCartSerializer().rows(carts_query)))
+
+                orders = Order.objects.order_by('id')[:size]
+                self.compare(
+                    'orders', size,
+                    lambda: OrderSerializer(orders.prefetch_related('items__product'), many=True).data,
+                    lambda: FastOrderSerializer(self.request).serialize(
+                        FastOrderSerializer().rows(orders)))
+
+            # Totals of a large cart, summed in Python over the items, and computed by the database (see "CartViewSet.queryset").
+            cart_id = carts[options['cart_items']].pk
+            self.compare(
+                'cart total', options['cart_items'],
+                lambda: CartSerializer(Cart.objects.prefetch_related('items__product').get(pk=cart_id)).data,
+                lambda: CartSerializer(Cart.objects.with_total_price().prefetch_related(cart_items).get(pk=cart_id)).data,
+                labels=('python', 'sql'))
+
+            # Nothing created by the benchmark is kept.
+            transaction.set_rollback(True)
+
+    # Creates "count" products with an image each, a cart for each size with that many items, and "count" orders with 2 items each.
+    def populate(self, count, sizes):
+        collection = Collection.objects.create(title='Benchmark')
+        products = Product.objects.bulk_create([
+            Product(title=f'Product {i}', slug=f'product-{i}', description='Benchmark product',
+                    unit_price='19.99', inventory=10, collection=collection)
+            for i in range(count)])
+        # Not every database returns the ids from "bulk_create()", so the products are read back.
+        products = list(Product.objects.filter(
+            collection=collection).order_by('id'))
+        ProductImage.objects.bulk_create([
+            ProductImage(product=product, image=f'store/images/{product.slug}.jpg') for product in products])
+
+        carts = {}
+        for size in sizes:
+            carts[size] = Cart.objects.create()
+            CartItem.objects.bulk_create([
+                CartItem(cart=carts[size], product=product, quantity=2) for product in products[:size]])
+
+        user = get_user_model().objects.create_user(
+            username='benchmark-user', email='benchmark@example.com', password='benchmark')
+        customer = Customer.objects.get(user=user)
+        Order.objects.bulk_create([Order(customer=customer)
+                                  for _ in range(count)])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=products[i % count], quantity=1, unit_price=products[i % count].unit_price)
+            for order in Order.objects.filter(customer=customer) for i in range(2)])
+        return carts
+
+    def measure(self, serialize):
+        timings = []
+        for _ in range(self.repeat):
+            start = perf_counter()
+            serialize()
+            timings.append(perf_counter() - start)
+        return min(timings) * 1000
+
+    def compare(self, name, size, serialize, fast_serialize, labels=('serializers', 'fast')):
+        slow = self.measure(serialize)
+        fast = self.measure(fast_serialize)
+        self.stdout.write(
+            f'{name:>10} {size:>6} rows: {labels[0]} {slow:8.2f} ms, {labels[1]} {fast:8.2f} ms ({slow / fast:.1f}x)')
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from store.export import EXPORT_BATCH_SIZE, EXPORT_FORMATS, export_products, render_export
+from store.models import Product, ProductImage
+
+
+class Command(BaseCommand):
+    """Writes every product, with the title of its collection and the URLs of its images, as NDJSON or CSV. Same output as the "products/export/"
+    endpoint. Products are read in batches, so memory use doesn't grow with the size of the catalog.
+    """
+
+    help = 'Exports the catalog as NDJSON or CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=list(EXPORT_FORMATS), default='ndjson',
+                            help='Format of the export.')
+        parser.add_argument('--output', help='File to write to. Standard output by default.')
+        parser.add_argument('--batch-size', type=int, default=EXPORT_BATCH_SIZE,
+                            help='Products read per query.')
+        parser.add_argument('--base-url', default='',
+                            help='Prepended to image URLs, like "https://example.com", to make them absolute.')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1.')
+        storage = ProductImage._meta.get_field('image').storage
+        base_url = options['base_url'].rstrip('/')
+        rows = export_products(Product.objects.all(), image_url=lambda name: base_url + storage.url(name),
+                               batch_size=options['batch_size'])
+        lines = render_export(rows, options['format'])
+
+        if not options['output']:
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+        # "newline=''" keeps the line endings written by the csv module.
+        with open(options['output'], 'w', newline='', encoding='utf-8') as file:
+            file.writelines(lines)
@@ -0,0 +1,256 @@
+import csv
+import json
+import sys
+import zlib
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from rest_framework import serializers
+
+from store.caching import CATALOG_SCOPE, bump_versions, collection_scope, product_scope
+from store.models import Collection, Product
+from store.search import index_products
+from store.snapshot import publish_change
+from store.serializers import ProductImportSerializer
+
+# The columns written for products that already exist. "last_update" is set by the command, since "auto_now" fields are only set by "save()".
+UPDATE_FIELDS = ['title', 'description', 'unit_price',
+                 'inventory', 'collection', 'last_update']
+
+
+class Command(BaseCommand):
+    """Imports products from a CSV file (with a header row) or an NDJSON file (one JSON object per line).
+    Each row has "title", "slug", "description", "unit_price", "inventory" and "collection", which is the title of the collection. Products are
+    matched by slug: existing ones are updated, new ones are created, and so are collections that don't exist yet.
+    The file is streamed, and rows are validated and written in batches, so memory use doesn't grow with the size of the file.
+    With "--workers", batches are written by several threads. Rows are spread over the workers by slug, so the same slug is always written by the
+    same worker, in the order of the file.
+    """
+
+    help = 'Imports products from a CSV or NDJSON file, creating or updating them by slug'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or NDJSON file, or "-" for standard input.')
+        parser.add_argument('--format', choices=['csv', 'ndjson'],
+                            help='Format of the file. Guessed from the file extension by default.')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Rows validated and written per batch.')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Number of threads writing batches to the database.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or self.guess_format(path)
+        self.batch_size = options['batch_size']
+        self.workers = options['workers']
+        if self.batch_size < 1 or self.workers < 1:
+            raise CommandError('--batch-size and --workers must be at least 1.')
+        if self.workers > 1 and connection.vendor == 'sqlite':
+            # SQLite allows a single writer at a time, so parallel batches would only wait on each other's locks.
+            self.stderr.write('SQLite allows a single writer, importing with 1 worker.')
+            self.workers = 1
+        self.verbosity = options['verbosity']
+
+        # The serializer fields are built once, and reused for every row.
+        self.serializer = ProductImportSerializer()
+        # Collection ids by title. Grows with the number of collections, not with the number of rows.
+        self.collections = {}
+        self.created = self.updated = self.invalid = 0
+        self.start = perf_counter()
+
+        with self.open(path) as file:
+            self.import_rows(self.read(file, file_format))
+
+        imported = self.created + self.updated
+        elapsed = max(perf_counter() - self.start, 1e-9)
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {imported} products ({self.created} created, {self.updated} updated, {self.invalid} invalid rows skipped) '
+            f'in {elapsed:.1f} s ({imported / elapsed:.0f} rows/sec)'))
+
+    def guess_format(self, path):
+        if path.endswith('.csv'):
+            return 'csv'
+        if path.endswith(('.ndjson', '.jsonl')):
+            return 'ndjson'
+        raise CommandError(f'Cannot guess the format of "{path}", use --format.')
+
+    def open(self, path):
+        if path == '-':
+            return nullcontext(sys.stdin)
+        try:
+            # "newline=''" is needed by the csv module for values with line breaks.
+            return open(path, newline='', encoding='utf-8')
+        except OSError as error:
+            raise CommandError(error)
+
+    # Yields "(line number, row)" pairs, one row at a time.
+    def read(self, file, file_format):
+        if file_format == 'csv':
+            reader = csv.DictReader(file)
+            for row in reader:
+                yield reader.line_num, row
+            return
+
+        for line_number, line in enumerate(file, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield line_number, json.loads(line)
+            except ValueError as error:
+                self.report_invalid(line_number, f'Invalid JSON: {error}')
+
+    def import_rows(self, rows):
+        # One buffer per worker. Rows go to a buffer by slug, and a full buffer is written as a batch.
+        buffers = [[] for _ in range(self.workers)]
+        executor = ThreadPoolExecutor(
+            max_workers=self.workers) if self.workers > 1 else None
+        # The batch each worker is writing. At most one batch per worker is in flight, which keeps memory use constant, and keeps the rows of a slug in order.
+        self.pending = [None] * self.workers
+        try:
+            for line_number, row in rows:
+                slug = row.get('slug') if isinstance(row, dict) else None
+                worker = zlib.crc32(str(slug).encode()) % self.workers
+                buffers[worker].append((line_number, row))
+                if len(buffers[worker]) >= self.batch_size:
+                    self.dispatch(executor, worker, buffers[worker])
+                    buffers[worker] = []
+            for worker, buffer in enumerate(buffers):
+                if buffer:
+                    self.dispatch(executor, worker, buffer)
+            for future in self.pending:
+                if future is not None:
+                    self.collect(future.result())
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+    def dispatch(self, executor, worker, batch):
+        products = self.prepare(batch)
+        if not products:
+            return
+        if executor is None:
+            self.collect(self.write(products))
+            return
+        # Waits for the previous batch of this worker before sending the next one.
+        if self.pending[worker] is not None:
+            self.collect(self.pending[worker].result())
+        self.pending[worker] = executor.submit(self.write_in_thread, products)
+
+    # Validates a batch of rows, and turns collection titles into ids. Returns the valid rows, with the last row winning when a slug is repeated.
+    def prepare(self, batch):
+        products = {}
+        for line_number, row in batch:
+            try:
+                data = self.serializer.run_validation(row)
+            except serializers.ValidationError as error:
+                self.report_invalid(line_number, error.detail)
+                continue
+            products[data['slug']] = data
+
+        titles = {data['collection'] for data in products.values()}
+        self.resolve_collections(titles - self.collections.keys())
+        for data in products.values():
+            data['collection_id'] = self.collections[data.pop('collection')]
+        return list(products.values())
+
+    # Looks up the ids of collections by title, and creates the ones that don't exist. Done by the main thread, so a collection is only created once.
+    def resolve_collections(self, titles):
+        if not titles:
+            return
+        with transaction.atomic():
+            # When titles are repeated, the oldest collection is used.
+            for collection_id, title in Collection.objects.filter(title__in=titles).order_by('-id').values_list('id', 'title'):
+                self.collections[title] = collection_id
+            missing = titles - self.collections.keys()
+            if missing:
+                Collection.objects.bulk_create(
+                    [Collection(title=title) for title in missing])
+                # Not every database returns the ids from "bulk_create()", so the collections are read back.
+                for collection_id, title in Collection.objects.filter(title__in=missing).order_by('-id').values_list('id', 'title'):
+                    self.collections[title] = collection_id
+                bump_versions(CATALOG_SCOPE)
+                publish_change()
+
+    # Creates and updates a batch of products in one transaction, then updates the search index and the response cache versions for them, since
+    # "bulk_create()" and "bulk_update()" don't send signals. Returns the number of products created and updated.
+    def write(self, products):
+        slugs = [data['slug'] for data in products]
+        now = timezone.now()
+        with transaction.atomic():
+            # When slugs are repeated in the database, the oldest product is updated.
+            existing = {product.slug: product for product in Product.objects.filter(
+                slug__in=slugs).order_by('-id')}
+            scopes = {CATALOG_SCOPE}
+            # Products added to (or removed from) each collection, for "Collection.products_count".
+            counts = Counter()
+            to_create = []
+            to_update = []
+            for data in products:
+                product = existing.get(data['slug'])
+                if product is None:
+                    to_create.append(Product(**data))
+                    counts[data['collection_id']] += 1
+                    continue
+                # The collection the product is moved out of, if any.
+                scopes.add(collection_scope(product.collection_id))
+                counts[product.collection_id] -= 1
+                counts[data['collection_id']] += 1
+                for field, value in data.items():
+                    setattr(product, field, value)
+                product.last_update = now
+                to_update.append(product)
+
+            Product.objects.bulk_create(to_create)
+            self.update(to_update)
+            Collection.objects.add_products_count(counts)
+
+            product_ids = []
+            for product_id, collection_id in Product.objects.filter(slug__in=slugs).values_list('id', 'collection_id'):
+                product_ids.append(product_id)
+                scopes.add(product_scope(product_id))
+                scopes.add(collection_scope(collection_id))
+            index_products(product_ids)
+            bump_versions(*scopes)
+            publish_change()
+        return len(to_create), len(to_update)
+
+    # Same as "bulk_update()", which builds a "CASE WHEN" expression with a branch for every row and field, and gets slow to compile for large batches.
+    # Here, a single parameterized UPDATE statement is sent with "executemany()", one set of values per product.
+    def update(self, products):
+        if not products:
+            return
+        fields = [Product._meta.get_field(name) for name in UPDATE_FIELDS]
+        quote_name = connection.ops.quote_name
+        columns = ', '.join(f'{quote_name(field.column)} = %s' for field in fields)
+        sql = f'UPDATE {quote_name(Product._meta.db_table)} SET {columns} WHERE {quote_name(Product._meta.pk.column)} = %s'
+        params = [[field.get_db_prep_save(getattr(product, field.attname), connection) for field in fields] + [product.pk]
+                  for product in products]
+        with connection.cursor() as cursor:
+            cursor.executemany(sql, params)
+
+    def write_in_thread(self, products):
+        try:
+            return self.write(products)
+        finally:
+            # Every thread opens its own database connection, which is closed rather than left open once the import is done.
+            connection.close()
+
+    def collect(self, result):
+        created, updated = result
+        self.created += created
+        self.updated += updated
+        if self.verbosity >= 2:
+            imported = self.created + self.updated
+            elapsed = max(perf_counter() - self.start, 1e-9)
+            self.stdout.write(
+                f'{imported} products imported ({imported / elapsed:.0f} rows/sec)')
+
+    def report_invalid(self, line_number, errors):
+        self.invalid += 1
+        if self.verbosity >= 1:
+            self.stderr.write(f'Line {line_number}: {errors}')
@@ -0,0 +1,72 @@
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from store.models import Customer, CustomerSummary
+
+
+class Command(BaseCommand):
+    """Computes the order history summary of every customer ("CustomerSummary") again from their orders, and replaces the stored one.
+    Used to fill the summaries of existing customers once, and to fix them if they ever drift, e.g. after order items were edited in the admin or
+    orders were changed with "QuerySet.update()", which doesn't send signals.
+    Customers are handled in chunks, each in its own transaction. With "--workers", chunks are rebuilt by several threads. Orders placed or paid
+    while the chunk of their customer is rebuilt may be missed by it, so run it when the store is quiet, or run it again.
+    """
+
+    help = 'Rebuilds the order history summaries of customers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Customers rebuilt per transaction.')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Number of threads rebuilding chunks.')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        workers = options['workers']
+        if chunk_size < 1 or workers < 1:
+            raise CommandError('--chunk-size and --workers must be at least 1.')
+        if workers > 1 and connection.vendor == 'sqlite':
+            # SQLite allows a single writer at a time, so parallel chunks would only wait on each other's locks.
+            self.stderr.write('SQLite allows a single writer, rebuilding with 1 worker.')
+            workers = 1
+
+        rebuilt = 0
+        if workers == 1:
+            for ids in self.chunks(chunk_size):
+                rebuilt += self.rebuild(ids)
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                # At most one chunk per worker is in flight, so the ids of every customer aren't read into memory at once.
+                pending = set()
+                for ids in self.chunks(chunk_size):
+                    if len(pending) >= workers:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        rebuilt += sum(future.result() for future in done)
+                    pending.add(executor.submit(self.rebuild_in_thread, ids))
+                rebuilt += sum(future.result() for future in pending)
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt the summaries of {rebuilt} customers.'))
+
+    # Yields the ids of the customers, "chunk_size" at a time, in order.
+    def chunks(self, chunk_size):
+        last_id = 0
+        while True:
+            ids = list(Customer.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:chunk_size])
+            if not ids:
+                return
+            yield ids
+            last_id = ids[-1]
+
+    def rebuild(self, ids):
+        with transaction.atomic():
+            CustomerSummary.objects.rebuild(ids)
+        return len(ids)
+
+    def rebuild_in_thread(self, ids):
+        try:
+            return self.rebuild(ids)
+        finally:
+            # Every thread opens its own database connection, which is closed rather than left open once the rebuild is done.
+            connection.close()
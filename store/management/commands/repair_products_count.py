@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from store.caching import CATALOG_SCOPE, bump_versions, collection_scope
+from store.models import Collection
+
+
+class Command(BaseCommand):
+    """Counts the products of every collection again, and fixes "Collection.products_count" where it's wrong.
+    Collections are handled in batches, each in its own transaction. The collections of a batch are locked before counting, so products added or
+    removed at the same time either wait for the batch, or are counted by it.
+    """
+
+    help = 'Recomputes the stored number of products of each collection'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Collections counted per transaction.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be at least 1.')
+
+        checked = repaired = 0
+        last_id = 0
+        while True:
+            with transaction.atomic():
+                ids = list(Collection.objects.filter(id__gt=last_id).order_by('id').select_for_update()
+                           .values_list('id', flat=True)[:batch_size])
+                if not ids:
+                    break
+                fixed = Collection.objects.refresh_products_count(
+                    Collection.objects.filter(id__in=ids))
+                if fixed:
+                    bump_versions(CATALOG_SCOPE, *(collection_scope(collection_id) for collection_id in ids))
+            checked += len(ids)
+            repaired += fixed
+            last_id = ids[-1]
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Checked {checked} collections, fixed {repaired}.'))
@@ -0,0 +1,57 @@
+from django.db import migrations
+
+# The full-text search index of products for each database vendor, as it was created by this migration (store/search.py may change since). The
+# statements are kept here, so the migration always creates the same schema.
+INSTALL_SQL = {
+    "postgresql": [
+        """
+        CREATE TABLE store_product_search (
+            product_id bigint PRIMARY KEY REFERENCES store_product (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED,
+            document tsvector NOT NULL
+        )""",
+        "CREATE INDEX store_product_search_document ON store_product_search USING GIN (document)",
+        # Fills it with the existing products. Title matches are ranked higher (A) than description matches (B).
+        """
+        INSERT INTO store_product_search (product_id, document)
+        SELECT store_product.id,
+               setweight(to_tsvector('english', coalesce(store_product.title, '')), 'A') ||
+               setweight(to_tsvector('english', coalesce(store_product.description, '')), 'B')
+        FROM store_product""",
+    ],
+    "sqlite": [
+        # The "rowid" of each row is the id of the product.
+        "CREATE VIRTUAL TABLE store_product_search USING fts5(title, description, tokenize = 'porter unicode61')",
+        """
+        INSERT INTO store_product_search (rowid, title, description)
+        SELECT id, title, coalesce(description, '') FROM store_product""",
+    ],
+    "mysql": [
+        "ALTER TABLE store_product ADD FULLTEXT INDEX store_product_search (title, description)",
+    ],
+}
+
+UNINSTALL_SQL = {
+    "postgresql": ["DROP TABLE IF EXISTS store_product_search"],
+    "sqlite": ["DROP TABLE IF EXISTS store_product_search"],
+    "mysql": ["ALTER TABLE store_product DROP INDEX store_product_search"],
+}
+
+
+def run_vendor_sql(statements):
+    # Any other database has no search index, and falls back to the default SearchFilter behaviour.
+    def run(apps, schema_editor):
+        with schema_editor.connection.cursor() as cursor:
+            for sql in statements.get(schema_editor.connection.vendor, []):
+                cursor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0014_productimage'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_vendor_sql(INSTALL_SQL), run_vendor_sql(UNINSTALL_SQL)),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.0.2 on 2026-10-17 01:40
+
+from django.db import migrations, models
+import store.validators
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0015_product_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='collection',
+            name='last_update',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AlterField(
+            model_name='productimage',
+            name='image',
+            field=models.ImageField(upload_to='store/images', validators=[store.validators.validate_file_size]),
+        ),
+    ]
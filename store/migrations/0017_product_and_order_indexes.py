@@ -0,0 +1,33 @@
+# Generated by Django 4.0.2 on 2026-10-17 01:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0016_collection_last_update'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['customer', 'placed_at'], name='store_order_custome_700a25_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['collection', 'unit_price'], name='store_produ_collect_5f8db0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['title', 'id'], name='store_produ_title_829862_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['unit_price', 'title', 'id'], name='store_produ_unit_pr_269561_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['last_update', 'title', 'id'], name='store_produ_last_up_ccbe18_idx'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.0.2 on 2026-10-17 02:01
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+BATCH_SIZE = 1000
+
+
+# Fills in "products_count" for the existing collections, a batch of collections at a time.
+def count_products(apps, schema_editor):
+    Collection = apps.get_model('store', 'Collection')
+    Product = apps.get_model('store', 'Product')
+    counts = Coalesce(Subquery(
+        Product.objects.filter(collection_id=OuterRef('pk')).order_by().values('collection_id')
+        .annotate(count=Count('id')).values('count')), 0)
+    last_id = 0
+    while True:
+        ids = list(Collection.objects.filter(id__gt=last_id).order_by(
+            'id').values_list('id', flat=True)[:BATCH_SIZE])
+        if not ids:
+            return
+        Collection.objects.filter(id__in=ids).update(products_count=counts)
+        last_id = ids[-1]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0017_product_and_order_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='collection',
+            name='products_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_products, migrations.RunPython.noop),
+    ]
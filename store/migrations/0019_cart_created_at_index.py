@@ -0,0 +1,17 @@
+# Generated by Django 4.0.2 on 2026-10-17 02:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0018_collection_products_count'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cart',
+            index=models.Index(fields=['created_at', 'id'], name='store_cart_created_e4200b_idx'),
+        ),
+    ]
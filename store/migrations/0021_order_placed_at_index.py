@@ -0,0 +1,17 @@
+# Generated by Django 4.0.2 on 2026-10-17 02:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0020_outboxevent'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['placed_at', 'id'], name='store_order_placed__61eeee_idx'),
+        ),
+    ]
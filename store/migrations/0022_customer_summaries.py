@@ -0,0 +1,40 @@
+# Generated by Django 4.0.2 on 2026-10-17 02:22
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0021_order_placed_at_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerSummary',
+            fields=[
+                ('customer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='store.customer')),
+                ('orders_count', models.IntegerField(default=0)),
+                ('last_order_at', models.DateTimeField(null=True)),
+                ('total_spent', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CustomerProductSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField(default=0)),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='product_summaries', to='store.customer')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='store.product')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='customerproductsummary',
+            index=models.Index(fields=['customer', 'quantity'], name='store_custo_custome_619025_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='customerproductsummary',
+            unique_together={('customer', 'product')},
+        ),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 4.0.2 on 2026-10-17 02:25
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0022_customer_summaries'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DirtySalesDay',
+            fields=[
+                ('day', models.DateField(primary_key=True, serialize=False)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Watermark',
+            fields=[
+                ('name', models.CharField(max_length=255, primary_key=True, serialize=False)),
+                ('value', models.DateTimeField(null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('payment_status', models.CharField(choices=[('P', 'Pending'), ('C', 'Complete'), ('F', 'Failed')], max_length=1)),
+                ('units', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+            ],
+            options={
+                'unique_together': {('day', 'payment_status')},
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyProductSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('payment_status', models.CharField(choices=[('P', 'Pending'), ('C', 'Complete'), ('F', 'Failed')], max_length=1)),
+                ('units', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='store.product')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailyCollectionSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('payment_status', models.CharField(choices=[('P', 'Pending'), ('C', 'Complete'), ('F', 'Failed')], max_length=1)),
+                ('units', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('collection', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='store.collection')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='dailyproductsales',
+            index=models.Index(fields=['product', 'day'], name='store_daily_product_983c12_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='dailyproductsales',
+            unique_together={('day', 'product', 'payment_status')},
+        ),
+        migrations.AddIndex(
+            model_name='dailycollectionsales',
+            index=models.Index(fields=['collection', 'day'], name='store_daily_collect_71a7ce_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='dailycollectionsales',
+            unique_together={('day', 'collection', 'payment_status')},
+        ),
+    ]
@@ -1,13 +1,21 @@
 from django.contrib import admin
 # "FileExtensionValidator" is for when using "FileField", and allows control of what kind of files may be uploaded, like pdf, xml etc.
 from django.core.validators import MinValueValidator, FileExtensionValidator
-from django.db import models
+from django.core.cache import cache
+from django.db import IntegrityError, connection, models, transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+from collections import Counter
+from decimal import Decimal
 from uuid import uuid4  # For use of unique ids for carts.
 # For use of "User" settings in Customer, as to avoid dependencies to other apps by not importing directly from .core module.
 from django.conf import settings
+from django.utils import timezone
 
 # Custom validator for validating file sizes.
 from .validators import validate_file_size
+# Vendor specific SQL for the upsert of cart items.
+from .sql import on_conflict_increment, quote, returning, rows_table
 
 
 class Promotion(models.Model):
@@ -15,10 +23,37 @@ class Promotion(models.Model):
     discount = models.FloatField()
 
 
+class CollectionManager(models.Manager):
+    # Adds to "products_count" of several collections, from a dictionary of collection ids and the number of products added (or removed, when
+    # negative). For bulk writes, which don't send the signals that keep the counts up to date. The collections are updated in order of id, so
+    # concurrent transactions lock them in the same order.
+    def add_products_count(self, deltas):
+        for collection_id, delta in sorted(deltas.items()):
+            if delta:
+                self.filter(pk=collection_id).update(
+                    products_count=F('products_count') + delta)
+
+    # Counts the products of the collections again, and stores the counts. Returns the number of collections whose count was wrong.
+    def refresh_products_count(self, queryset=None):
+        queryset = self.all() if queryset is None else queryset
+        actual = Coalesce(Subquery(
+            Product.objects.filter(collection_id=OuterRef('pk')).order_by().values('collection_id')
+            .annotate(count=Count('id')).values('count')), 0)
+        return queryset.annotate(actual_count=actual).exclude(
+            products_count=F('actual_count')).update(products_count=actual)
+
+
 class Collection(models.Model):
     title = models.CharField(max_length=255)
     featured_product = models.ForeignKey(
         'Product', on_delete=models.SET_NULL, null=True, related_name='+', blank=True)
+    # Used for the "Last-Modified" and "ETag" headers of the collection endpoints.
+    last_update = models.DateTimeField(auto_now=True)
+    # The number of products in the collection, kept up to date by signals (and by "CollectionManager.add_products_count()" for bulk writes), so
+    # listing collections doesn't need to count the products table. Fixed with "python manage.py repair_products_count" if it ever drifts.
+    products_count = models.IntegerField(default=0, editable=False)
+
+    objects = CollectionManager()
 
     def __str__(self) -> str:
         return self.title
@@ -46,6 +81,15 @@ class Product(models.Model):
 
     class Meta:
         ordering = ['title']
+        # Indexes for the way products are filtered and ordered at the "products" endpoint. The orderings end with "title" and "id", like the keyset pagination.
+        indexes = [
+            # Products of a collection, within a price range ("ProductFilter").
+            models.Index(fields=['collection', 'unit_price']),
+            # The default ordering, and "?ordering=unit_price" and "?ordering=last_update" (also used backwards for "-unit_price" and "-last_update").
+            models.Index(fields=['title', 'id']),
+            models.Index(fields=['unit_price', 'title', 'id']),
+            models.Index(fields=['last_update', 'title', 'id']),
+        ]
 
 
 # For enabling a one-to-many (1 - *) relationship between "Product" and this new class which are basically images of those products.
@@ -58,6 +102,29 @@ class ProductImage(models.Model):
     # "FileField()" is also an option, which is used for any other types of files, like documents and PDFs. ImageField is for images only, and validates the image to ensure it's valid.
 
 
+class CustomerManager(models.Manager):
+    # The id of the customer of a user, which doesn't change, so it's cached rather than read on every checkout. Raises "Customer.DoesNotExist".
+    def get_id_for_user(self, user_id):
+        key = f"store:customer_id:{user_id}"
+        customer_id = cache.get(key)
+        if customer_id is None:
+            customer_id = self.filter(user_id=user_id).values_list("id", flat=True).get()
+            cache.set(key, customer_id, timeout=24 * 60 * 60)
+        return customer_id
+
+    # The id of the customer of an authenticated user. Read from the access token when it carries it (core/authentication.py), otherwise like
+    # "get_id_for_user()".
+    def get_id_for(self, user):
+        customer_id = getattr(user, "customer_id", None)
+        if customer_id is None:
+            customer_id = self.get_id_for_user(user.id)
+        return customer_id
+
+    # Called when the customer of a user is deleted.
+    def forget_user(self, user_id):
+        cache.delete(f"store:customer_id:{user_id}")
+
+
 class Customer(models.Model):
     MEMBERSHIP_BRONZE = 'B'
     MEMBERSHIP_SILVER = 'S'
@@ -77,6 +144,8 @@ class Customer(models.Model):
     user = models.OneToOneField(
         settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
 
+    objects = CustomerManager()
+
     # From variable "user" above.
     def __str__(self):
         return f'{self.user.first_name} {self.user.last_name}'
@@ -118,6 +187,28 @@ class Order(models.Model):
             # Each tuple is a permission. First value is the codename, second value is a description.
             ("cancel_order", "Can cancel order"),
         ]
+        indexes = [
+            # The orders of a customer, by date.
+            models.Index(fields=['customer', 'placed_at']),
+            # All orders by date, for staff ("OrderPagination").
+            models.Index(fields=['placed_at', 'id']),
+        ]
+
+
+class OrderItemManager(models.Manager):
+    # Copies the items of a cart into an order, with the current unit prices of their products, in a single "INSERT ... SELECT" statement.
+    # Returns the number of items copied.
+    def copy_from_cart(self, order_id, cart_id):
+        sql = (
+            f"INSERT INTO {quote(self.model._meta.db_table)} ({quote('order_id')}, {quote('product_id')}, {quote('quantity')}, {quote('unit_price')}) "
+            f"SELECT %s, {quote('item')}.{quote('product_id')}, {quote('item')}.{quote('quantity')}, {quote('product')}.{quote('unit_price')} "
+            f"FROM {quote(CartItem._meta.db_table)} {quote('item')} "
+            f"INNER JOIN {quote(Product._meta.db_table)} {quote('product')} ON {quote('product')}.{quote('id')} = {quote('item')}.{quote('product_id')} "
+            f"WHERE {quote('item')}.{quote('cart_id')} = %s"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [order_id, Cart._meta.pk.get_db_prep_value(cart_id, connection)])
+            return cursor.rowcount
 
 
 class OrderItem(models.Model):
@@ -129,6 +220,33 @@ class OrderItem(models.Model):
     quantity = models.PositiveSmallIntegerField()
     unit_price = models.DecimalField(max_digits=6, decimal_places=2)
 
+    objects = OrderItemManager()
+
+
+# Completed orders older than "STORE_ORDER_ARCHIVE_AGE" are moved here with their items by the "archive_orders" task (store/archive.py), so the
+# order tables stay small. They keep their ids, and are read-only.
+class ArchivedOrder(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    placed_at = models.DateTimeField()
+    payment_status = models.CharField(max_length=1, choices=Order.PAYMENT_STATUS_CHOICES)
+    customer = models.ForeignKey(Customer, on_delete=models.PROTECT, related_name="+")
+    archived_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            # The same as "Order", for the archived orders of a customer and for staff.
+            models.Index(fields=['customer', 'placed_at']),
+            models.Index(fields=['placed_at', 'id']),
+        ]
+
+
+class ArchivedOrderItem(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    order = models.ForeignKey(ArchivedOrder, on_delete=models.PROTECT, related_name="items")
+    product = models.ForeignKey(Product, on_delete=models.PROTECT, related_name="+")
+    quantity = models.PositiveSmallIntegerField()
+    unit_price = models.DecimalField(max_digits=6, decimal_places=2)
+
 
 class Address(models.Model):
     street = models.CharField(max_length=255)
@@ -137,11 +255,74 @@ class Address(models.Model):
         Customer, on_delete=models.CASCADE)
 
 
+# Totals of cart items and carts are computed by the database. Wide enough for the largest quantity times the largest unit price, many times over.
+TOTAL_PRICE_FIELD = DecimalField(max_digits=20, decimal_places=2)
+
+
+class CartManager(models.Manager):
+    # Carts with their "total_price": the sum of quantity times unit price over their items, which is 0 for an empty cart.
+    def with_total_price(self):
+        return self.annotate(total_price=Coalesce(
+            Sum(F("items__quantity") * F("items__product__unit_price"), output_field=TOTAL_PRICE_FIELD),
+            Value(Decimal(0)), output_field=TOTAL_PRICE_FIELD))
+
+    # Deletes a cart and its items with a statement each, without reading them first like "QuerySet.delete()" does. Returns False if there was no
+    # such cart, e.g. since another checkout deleted it.
+    def delete_with_items(self, cart_id):
+        CartItem.objects.filter(cart_id=cart_id).delete()
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {quote(self.model._meta.db_table)} WHERE {quote('id')} = %s",
+                           [self.model._meta.pk.get_db_prep_value(cart_id, connection)])
+            return cursor.rowcount > 0
+
+
 class Cart(models.Model):
     # Creates unique 32 char long ids for carts to prevent attacks. "uuid4" function is not being called, it's simply being referenced to.
     id = models.UUIDField(primary_key=True, default=uuid4)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = CartManager()
+
+    class Meta:
+        indexes = [
+            # Abandoned carts, oldest first, for "purge_abandoned_carts" (store/tasks.py).
+            models.Index(fields=['created_at', 'id']),
+        ]
+
+
+class CartItemManager(models.Manager):
+    # Items with their "total_price", which is quantity times the unit price of the product.
+    def with_total_price(self):
+        return self.annotate(total_price=ExpressionWrapper(
+            F("quantity") * F("product__unit_price"), output_field=TOTAL_PRICE_FIELD))
+
+    # Adds the quantities of a "{product_id: quantity}" dictionary to a cart, in a single "INSERT ... SELECT" statement. Products that don't exist
+    # are left out by joining the product table, and items already in the cart get the quantity added to theirs. Returns the added items with their
+    # new quantities, which is an empty list when there's no such cart.
+    def add_items(self, cart_id, quantities):
+        table = self.model._meta.db_table
+        cart_model = self.model._meta.get_field("cart").related_model
+        product_model = self.model._meta.get_field("product").related_model
+        added, rows_params = rows_table(["product_id", "quantity"], sorted(quantities.items()))
+        returning_sql = returning(["id", "product_id", "quantity"])
+        sql = (
+            f"INSERT INTO {quote(table)} ({quote('cart_id')}, {quote('product_id')}, {quote('quantity')}) "
+            f"SELECT {quote('cart')}.{quote('id')}, {quote('product')}.{quote('id')}, {quote('added')}.{quote('quantity')} "
+            f"FROM ({added}) {quote('added')} "
+            f"INNER JOIN {quote(product_model._meta.db_table)} {quote('product')} ON {quote('product')}.{quote('id')} = {quote('added')}.{quote('product_id')} "
+            f"INNER JOIN {quote(cart_model._meta.db_table)} {quote('cart')} ON {quote('cart')}.{quote('id')} = %s "
+            f"WHERE 1 = 1 {on_conflict_increment(table, ['cart_id', 'product_id'], ['quantity'], 'added')} "
+            f"{returning_sql}"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, rows_params + [cart_model._meta.pk.get_db_prep_value(cart_id, connection)])
+            if returning_sql:
+                rows = cursor.fetchall()
+            else:
+                # Read back the items, on databases without "RETURNING".
+                rows = self.filter(cart_id=cart_id, product_id__in=list(quantities)).values_list("id", "product_id", "quantity")
+        return [self.model(id=id, cart_id=cart_id, product_id=product_id, quantity=quantity) for id, product_id, quantity in rows]
+
 
 class CartItem(models.Model):
     cart = models.ForeignKey(
@@ -151,12 +332,204 @@ class CartItem(models.Model):
         validators=[MinValueValidator(1)]
     )  # Ensures that only a minimum of 1 item can be added to the cart, or it'll show an error message. Can be set to whatever minimum amount desired.
 
+    objects = CartItemManager()
+
     # To make sure a new cart isn't created whenever the quantity of the same product is increased. This prevents creating multiple records.
     class Meta:
         # A unique constraint on "cart" and "product". More unique constraints on 2 or 3 other fields may be added together, if desired.
         unique_together = [["cart", "product"]]
 
 
+class CustomerSummaryManager(models.Manager):
+    # Counts a new order of a customer, placed at "placed_at".
+    def add_order(self, customer_id, placed_at):
+        self._change(customer_id, orders_count=F("orders_count") + 1,
+                     last_order_at=Greatest(Coalesce(F("last_order_at"), Value(placed_at)), Value(placed_at)))
+
+    # Uncounts a deleted order of a customer. Its last order date is read again, since the deleted order may have been the last one.
+    def remove_order(self, customer_id):
+        last = [Subquery(model.objects.filter(customer_id=customer_id).order_by().values("customer_id").annotate(
+            last=Max("placed_at")).values("last")) for model in (Order, ArchivedOrder)]
+        # Either may be NULL, which "Greatest()" returns on some databases.
+        self._change(customer_id, orders_count=F("orders_count") - 1,
+                     last_order_at=Greatest(Coalesce(last[0], last[1]), Coalesce(last[1], last[0])))
+
+    # Adds a paid order to the spend and the purchased products of its customer, or takes it away again with "sign=-1", when its payment status
+    # changes to or from complete.
+    def add_paid_order(self, order_id, customer_id, sign=1):
+        items = list(OrderItem.objects.filter(order_id=order_id).values_list("product_id", "quantity", "unit_price"))
+        if not items:
+            return
+        quantities = Counter()
+        for product_id, quantity, _ in items:
+            quantities[product_id] += sign * quantity
+        spent = sum(quantity * unit_price for _, quantity, unit_price in items)
+        self._change(customer_id, quantities, total_spent=F("total_spent") + sign * spent)
+
+    # Updates the summary of a customer in the database ("F()"), so concurrent orders don't overwrite each other's changes, and adds "quantities"
+    # to its purchased products.
+    def _change(self, customer_id, quantities=None, **changes):
+        if self.filter(customer_id=customer_id).update(**changes):
+            if quantities:
+                CustomerProductSummary.objects.add_quantities(customer_id, quantities)
+            return
+        # There's no summary yet, e.g. for the first order of a customer. It's computed from all the orders of the customer instead, which already
+        # include this change.
+        try:
+            with transaction.atomic():
+                self.rebuild([customer_id])
+        except IntegrityError:
+            # Created by a concurrent order of the same customer in the meantime.
+            self._change(customer_id, quantities, **changes)
+
+    # Computes the summaries of the customers from their orders, including the archived ones, and replaces the stored ones. Each customer gets a
+    # summary, even without orders.
+    def rebuild(self, customer_ids):
+        orders = {customer_id: (0, None) for customer_id in customer_ids}
+        spent = Counter()
+        products = Counter()
+        for order_model, item_model in [(Order, OrderItem), (ArchivedOrder, ArchivedOrderItem)]:
+            for customer_id, count, last_order_at in order_model.objects.filter(customer_id__in=customer_ids).order_by().values(
+                    "customer_id").annotate(count=Count("id"), last_order_at=Max("placed_at")).values_list("customer_id", "count", "last_order_at"):
+                previous_count, previous_last = orders[customer_id]
+                orders[customer_id] = (previous_count + count, max(filter(None, [previous_last, last_order_at])))
+            paid = item_model.objects.filter(order__customer_id__in=customer_ids,
+                                             order__payment_status=Order.PAYMENT_STATUS_COMPLETE).order_by()
+            spent.update(dict(paid.values("order__customer_id").annotate(
+                spent=Sum(F("quantity") * F("unit_price"), output_field=TOTAL_PRICE_FIELD)).values_list("order__customer_id", "spent")))
+            products.update({(customer_id, product_id): quantity for customer_id, product_id, quantity in paid.values(
+                "order__customer_id", "product_id").annotate(quantity=Sum("quantity")).values_list("order__customer_id", "product_id", "quantity")})
+
+        self.filter(customer_id__in=customer_ids).delete()
+        CustomerProductSummary.objects.filter(customer_id__in=customer_ids).delete()
+        self.bulk_create([self.model(customer_id=customer_id, orders_count=count, last_order_at=last_order_at, total_spent=spent[customer_id])
+                          for customer_id, (count, last_order_at) in orders.items()])
+        CustomerProductSummary.objects.bulk_create([
+            CustomerProductSummary(customer_id=customer_id, product_id=product_id, quantity=quantity)
+            for (customer_id, product_id), quantity in products.items()])
+
+
+# The order history of a customer, kept up to date by signals ("CustomerSummaryManager") as orders are placed and paid, so it doesn't have to be
+# computed from all their orders on every request. Rebuilt with "python manage.py rebuild_customer_summaries".
+class CustomerSummary(models.Model):
+    customer = models.OneToOneField(Customer, on_delete=models.CASCADE, primary_key=True, related_name="summary")
+    # Every order of the customer, whatever its payment status.
+    orders_count = models.IntegerField(default=0)
+    last_order_at = models.DateTimeField(null=True)
+    # The total of the orders whose payment is complete.
+    total_spent = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+
+    objects = CustomerSummaryManager()
+
+
+class CustomerProductSummaryManager(models.Manager):
+    # Adds the quantities of a "{product_id: quantity}" dictionary to the purchased products of a customer, in a single "INSERT ... SELECT" statement.
+    def add_quantities(self, customer_id, quantities):
+        table = self.model._meta.db_table
+        added, rows_params = rows_table(["product_id", "quantity"], sorted(quantities.items()))
+        sql = (
+            f"INSERT INTO {quote(table)} ({quote('customer_id')}, {quote('product_id')}, {quote('quantity')}) "
+            f"SELECT %s, {quote('added')}.{quote('product_id')}, {quote('added')}.{quote('quantity')} "
+            f"FROM ({added}) {quote('added')} "
+            f"WHERE 1 = 1 {on_conflict_increment(table, ['customer_id', 'product_id'], ['quantity'], 'added')}"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [customer_id] + rows_params)
+
+    # The products a customer bought most of, with their products.
+    def top_products(self, customer_id, limit):
+        return list(self.filter(customer_id=customer_id, quantity__gt=0).select_related("product")
+                    .order_by("-quantity", "product_id")[:limit])
+
+
+# The quantity of a product bought by a customer, over their paid orders. Part of the summary of the customer ("CustomerSummary").
+class CustomerProductSummary(models.Model):
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name="product_summaries")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="+")
+    quantity = models.IntegerField(default=0)
+
+    objects = CustomerProductSummaryManager()
+
+    class Meta:
+        unique_together = [["customer", "product"]]
+        indexes = [
+            # The top products of a customer ("CustomerProductSummaryManager.top_products()").
+            models.Index(fields=['customer', 'quantity']),
+        ]
+
+
+# Events of the transactional outbox (store/outbox.py). An event is written in the same transaction as the change it's about, and sent to the
+# receivers of its signal by the "relay_outbox" task once that transaction is committed. Sent events are deleted.
+class OutboxEvent(models.Model):
+    # The name of the signal, e.g. "order_created".
+    signal = models.CharField(max_length=255)
+    # The keyword arguments of the signal. Model instances are stored as their label and primary key.
+    payload = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Failed sends are tried again from "available_at" on, with a growing delay, until "attempts" reaches "STORE_OUTBOX_MAX_ATTEMPTS".
+    available_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            # The events that are due, oldest first.
+            models.Index(fields=['available_at', 'id']),
+        ]
+
+
+# Daily sales, rolled up from the orders by the "update_sales_rollups" task (store/rollups.py), so reports don't scan the order items. Days are in
+# "TIME_ZONE". Each subclass adds the fields the sales are grouped by.
+class SalesRollup(models.Model):
+    day = models.DateField()
+    payment_status = models.CharField(max_length=1, choices=Order.PAYMENT_STATUS_CHOICES)
+    # The quantity of the order items, and their quantity times unit price.
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+
+    class Meta:
+        abstract = True
+
+
+class DailyProductSales(SalesRollup):
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="+")
+
+    class Meta:
+        unique_together = [["day", "product", "payment_status"]]
+        indexes = [
+            # The sales of a product, by day.
+            models.Index(fields=['product', 'day']),
+        ]
+
+
+# Sales by the collection the products were in when they were rolled up.
+class DailyCollectionSales(SalesRollup):
+    collection = models.ForeignKey(Collection, on_delete=models.CASCADE, related_name="+")
+
+    class Meta:
+        unique_together = [["day", "collection", "payment_status"]]
+        indexes = [
+            models.Index(fields=['collection', 'day']),
+        ]
+
+
+class DailySales(SalesRollup):
+    class Meta:
+        unique_together = [["day", "payment_status"]]
+
+
+# How far a task has processed a table that's only added to, e.g. the orders rolled up into the sales rollups, by "placed_at".
+class Watermark(models.Model):
+    name = models.CharField(max_length=255, primary_key=True)
+    value = models.DateTimeField(null=True)
+
+
+# Days whose rolled up sales are out of date, since orders placed on them changed after they were rolled up. Computed again by the
+# "update_sales_rollups" task.
+class DirtySalesDay(models.Model):
+    day = models.DateField(primary_key=True)
+
+
 class Review(models.Model):
     # The product which this is a review for, which is a Foreign Key to the Product model. The related name is included, so the Product class
     # will have an attribute called "reviews". On delete is cascade, so the review is also deleted, if the related product is deleted.
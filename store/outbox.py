@@ -0,0 +1,99 @@
+# Transactional outbox for signals whose receivers shouldn't run inside the request, like "order_created".
+#
+# "publish()" writes an "OutboxEvent" in the current transaction, so the event exists exactly when the change it's about was committed. After the
+# commit the "relay_outbox" task (store/tasks.py) is queued, which sends the due events to the receivers of their signal in batches, and deletes
+# them. The task is also scheduled in "CELERY_BEAT_SCHEDULE", which picks up events whose task couldn't be queued.
+#
+# Delivery is at least once: an event is deleted only after every receiver succeeded, so when one fails, all receivers get the event again at the
+# next attempt. Receivers must therefore be idempotent. Events about a row that no longer exists, like an order that was deleted or archived before
+# the relay ran, can never be sent, so they're logged and dropped instead.
+import logging
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import models, transaction
+from django.utils import timezone
+
+from .models import OutboxEvent
+from .signals import order_created
+
+logger = logging.getLogger(__name__)
+
+# The signals that can be sent through the outbox, by name.
+SIGNALS = {
+    "order_created": order_created,
+}
+
+# Longest delay between two attempts to send an event, in seconds.
+MAX_RETRY_DELAY = 60 * 60
+
+
+def encode(kwargs):
+    return {name: {"model": value._meta.label, "pk": value.pk} if isinstance(value, models.Model) else {"value": value}
+            for name, value in kwargs.items()}
+
+
+def decode(payload):
+    return {name: apps.get_model(value["model"])._default_manager.get(pk=value["pk"]) if "model" in value else value["value"]
+            for name, value in payload.items()}
+
+
+# Writes an event for the signal in the current transaction, and queues the relay once it's committed.
+def publish(signal, **kwargs):
+    event = OutboxEvent.objects.create(signal=signal, payload=encode(kwargs))
+    transaction.on_commit(queue_relay)
+    return event
+
+
+def queue_relay():
+    from .tasks import relay_outbox
+    try:
+        relay_outbox.delay()
+    except Exception:
+        # The scheduled run sends the event instead.
+        logger.exception("Could not queue the outbox relay")
+
+
+# Sends an event, with its decoded payload, to every receiver of its signal. Raises the first error of a receiver, after all of them got the event.
+def deliver(event, kwargs):
+    responses = SIGNALS[event.signal].send_robust(OutboxEvent, **kwargs)
+    for _, response in responses:
+        if isinstance(response, Exception):
+            raise response
+
+
+# Sends the due events, "batch_size" at a time. Each batch is locked with "SKIP LOCKED", so relays running at the same time take different events.
+# Returns the number of events sent.
+def relay(batch_size):
+    max_attempts = getattr(settings, "STORE_OUTBOX_MAX_ATTEMPTS", 10)
+    sent = 0
+    while True:
+        with transaction.atomic():
+            events = list(OutboxEvent.objects.filter(available_at__lte=timezone.now(), attempts__lt=max_attempts)
+                          .order_by("available_at", "id").select_for_update(skip_locked=True)[:batch_size])
+            if not events:
+                return sent
+            delivered = []
+            dropped = []
+            for event in events:
+                try:
+                    kwargs = decode(event.payload)
+                except ObjectDoesNotExist:
+                    logger.warning("Dropped outbox event %s, since a row of its payload no longer exists: %s", event.id, event.payload)
+                    dropped.append(event.id)
+                    continue
+                try:
+                    # In a savepoint, so a receiver's failed queries don't break the batch.
+                    with transaction.atomic():
+                        deliver(event, kwargs)
+                    delivered.append(event.id)
+                except Exception as error:
+                    logger.exception("Could not send outbox event %s", event.id)
+                    event.attempts += 1
+                    event.available_at = timezone.now() + timedelta(seconds=min(2 ** event.attempts, MAX_RETRY_DELAY))
+                    event.last_error = repr(error)
+                    event.save(update_fields=["attempts", "available_at", "last_error"])
+            OutboxEvent.objects.filter(id__in=delivered + dropped).delete()
+        sent += len(delivered)
@@ -1,5 +1,88 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import BasePagination, CursorPagination, PageNumberPagination
 
 
 class DefaultPagination(PageNumberPagination):
     page_size = 10
+
+
+# Keyset (cursor) pagination. Each page is fetched with "WHERE <ordering field> > <last seen value> ... LIMIT", so no "COUNT(*)" is run and deep pages
+# don't pay for a growing "OFFSET". The response has "next" and "previous" links, but no "count".
+class KeysetPagination(CursorPagination):
+    page_size = 10
+    # Used when the client doesn't ask for an ordering. Matches the default ordering of the "Product" model.
+    ordering = ("title", "id")
+    # Appended to whatever ordering is used, so rows with the same price or timestamp always come back in the same order between pages.
+    tie_breakers = ("title", "id")
+
+    def get_ordering(self, request, queryset, view):
+        # The ordering chosen with "?ordering=" through the OrderingFilter of the view, or the default ordering above when none was chosen.
+        ordering = None
+        for backend in getattr(view, "filter_backends", []):
+            if hasattr(backend, "get_ordering"):
+                ordering = backend().get_ordering(request, queryset, view)
+                break
+        # Search results are ordered by relevance, unless the client asked for another ordering.
+        if not ordering and "search_rank" in queryset.query.annotations:
+            ordering = ["-search_rank"]
+        ordering = list(ordering or self.ordering)
+        ordered_fields = {field.lstrip("-") for field in ordering}
+        # The tie-breakers follow the direction of the first field, so a descending ordering can read the same index backwards.
+        direction = "-" if ordering[0].startswith("-") else ""
+        ordering += [direction + field for field in self.tie_breakers
+                     if field not in ordered_fields]
+        return tuple(ordering)
+
+
+# Orders, newest first. The keyset reads the "(customer, placed_at)" index for the orders of a customer, and the "(placed_at, id)" index for staff.
+class OrderPagination(KeysetPagination):
+    ordering = ("-placed_at",)
+    tie_breakers = ("id",)
+
+
+# Rolled up sales, newest day first.
+class SalesPagination(KeysetPagination):
+    page_size = 100
+    ordering = ("-day",)
+    tie_breakers = ("id",)
+
+
+# Keyset pagination by default, with page number pagination kept as an opt-in. Clients that need the total count of results send a "?page=" parameter,
+# and get the same response as before (with "count"), while everyone else skips the "COUNT(*)" query.
+class ProductPagination(BasePagination):
+    def __init__(self):
+        self.keyset = KeysetPagination()
+        self.page_number = DefaultPagination()
+        # The paginator used for the current request. Set in "paginate_queryset()".
+        self.paginator = self.keyset
+
+    def get_paginator(self, request):
+        if self.page_number.page_query_param in request.query_params:
+            return self.page_number
+        return self.keyset
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.paginator = self.get_paginator(request)
+        return self.paginator.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return self.paginator.get_paginated_response(data)
+
+    def get_paginated_response_schema(self, schema):
+        return self.keyset.get_paginated_response_schema(schema)
+
+    # For the browsable API, which renders the page controls of the paginator that was used.
+    @property
+    def display_page_controls(self):
+        return getattr(self.paginator, "display_page_controls", False)
+
+    def to_html(self):
+        return self.paginator.to_html()
+
+    def get_results(self, data):
+        return self.paginator.get_results(data)
+
+    def get_schema_fields(self, view):
+        return self.keyset.get_schema_fields(view) + self.page_number.get_schema_fields(view)
+
+    def get_schema_operation_parameters(self, view):
+        return self.keyset.get_schema_operation_parameters(view) + self.page_number.get_schema_operation_parameters(view)
@@ -0,0 +1,102 @@
+# Daily sales rollups ("DailyProductSales", "DailyCollectionSales" and "DailySales"), so reports read a row per day instead of summing the order items.
+#
+# The "update_sales_rollups" task (store/tasks.py) adds the items of the orders placed since the "sales_rollups" watermark to the rollups, a day of
+# orders per transaction, and moves the watermark past them. Orders are rolled up "STORE_SALES_ROLLUP_DELAY" seconds after they were placed, so an
+# order whose transaction hadn't been committed yet when the task ran isn't skipped. Orders and order items that change after they were rolled up,
+# e.g. when a payment completes, mark their day as dirty (store/signals/handlers.py), and dirty days are computed again from their orders.
+from datetime import datetime, time, timedelta
+
+from django.db import connection, transaction
+from django.db.models import F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import (TOTAL_PRICE_FIELD, ArchivedOrder, ArchivedOrderItem, DailyCollectionSales, DailyProductSales, DailySales, DirtySalesDay, Order, OrderItem,
+                     Watermark)
+from .sql import on_conflict_increment, quote, rows_table
+
+WATERMARK = "sales_rollups"
+# The orders rolled up per transaction, by "placed_at".
+WINDOW = timedelta(days=1)
+# The rows written per statement.
+BATCH_SIZE = 500
+
+# The rollups, with the columns they're grouped by besides the day, and the order item lookups those are read from.
+ROLLUPS = [
+    (DailyProductSales, {"product_id": "product_id", "payment_status": "order__payment_status"}),
+    (DailyCollectionSales, {"collection_id": "product__collection_id", "payment_status": "order__payment_status"}),
+    (DailySales, {"payment_status": "order__payment_status"}),
+]
+
+
+# Marks the days of orders placed at the given times as dirty, without an error when they already are.
+def mark_dirty(*placed_at):
+    DirtySalesDay.objects.bulk_create([DirtySalesDay(day=timezone.localdate(value)) for value in placed_at], ignore_conflicts=True)
+
+
+# The sales of the items, as "(day, *columns, units, revenue)" rows. Days are in the current time zone.
+def aggregate(items, columns):
+    lookups = list(columns.values())
+    return list(items.order_by().values(*lookups, day=TruncDate("order__placed_at")).annotate(
+        units=Sum("quantity"), revenue=Sum(F("quantity") * F("unit_price"), output_field=TOTAL_PRICE_FIELD))
+        .values_list("day", *lookups, "units", "revenue"))
+
+
+# Adds the rows to a rollup, with "INSERT ... SELECT" statements that add the units and revenue to the rows that already exist.
+def add_rows(model, columns, rows):
+    table = model._meta.db_table
+    names = ["day", *columns, "units", "revenue"]
+    selected = ", ".join(quote(name) for name in names)
+    conflict = on_conflict_increment(table, ["day", *columns], ["units", "revenue"], "added")
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), BATCH_SIZE):
+            added, params = rows_table(names, rows[start:start + BATCH_SIZE])
+            cursor.execute(f"INSERT INTO {quote(table)} ({selected}) SELECT {selected} FROM ({added}) {quote('added')} WHERE 1 = 1 {conflict}",
+                           params)
+
+
+# Adds the items of the orders matching the filters to the rollups, from the order tables and from the archive (store/archive.py).
+def add_orders(**filters):
+    for item_model in (OrderItem, ArchivedOrderItem):
+        items = item_model.objects.filter(**{f"order__{lookup}": value for lookup, value in filters.items()})
+        for model, columns in ROLLUPS:
+            add_rows(model, columns, aggregate(items, columns))
+
+
+# The watermark, locked until the end of the transaction, so runs of the task at the same time wait for each other.
+def lock_watermark():
+    return Watermark.objects.select_for_update().get_or_create(name=WATERMARK)[0]
+
+
+# Rolls up the orders placed until "until", and computes the dirty days again. Returns the new watermark and the number of days computed again.
+def update(until):
+    while True:
+        with transaction.atomic():
+            watermark = lock_watermark()
+            start = watermark.value
+            if start is None:
+                # The first run starts at the first order, which may be archived.
+                firsts = [model.objects.order_by("placed_at").values_list("placed_at", flat=True).first() for model in (Order, ArchivedOrder)]
+                if not any(firsts):
+                    break
+                start = min(first for first in firsts if first) - timedelta(microseconds=1)
+            end = min(start + WINDOW, until)
+            if end <= start:
+                break
+            add_orders(placed_at__gt=start, placed_at__lte=end)
+            watermark.value = end
+            watermark.save()
+
+    with transaction.atomic():
+        watermark = lock_watermark()
+        days = list(DirtySalesDay.objects.select_for_update().values_list("day", flat=True))
+        for day in days:
+            # Only the orders up to the watermark, since the later ones are added by the next run.
+            start = timezone.make_aware(datetime.combine(day, time.min))
+            end = timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min))
+            for model, _ in ROLLUPS:
+                model.objects.filter(day=day).delete()
+            if watermark.value is not None:
+                add_orders(placed_at__gte=start, placed_at__lt=end, placed_at__lte=watermark.value)
+        DirtySalesDay.objects.filter(day__in=days).delete()
+    return watermark.value, len(days)
@@ -0,0 +1,145 @@
+# Full-text search for products. Replaces the "icontains" lookups of DRF's SearchFilter, which can't use an index, with a tokenized and ranked index.
+# Each database vendor has its own backend:
+#   - PostgreSQL: a "tsvector" column in a side table, with a GIN index.
+#   - SQLite (tests): an FTS5 virtual table.
+#   - MySQL (development): a FULLTEXT index on the product table itself.
+# Any other database falls back to the default SearchFilter behaviour. The tables and indexes are created by migration 0015_product_search.
+import re
+
+from django.db import connection
+from django.db.models import FloatField
+from django.db.models.expressions import RawSQL
+from rest_framework.filters import SearchFilter
+
+# Words of the search terms. Everything else, like quotes and operators, is dropped so it can't be used to break the search syntax of the database.
+WORD_PATTERN = re.compile(r"\w+")
+
+
+class PostgreSQLSearchBackend:
+    table = "store_product_search"
+    # Title matches are ranked higher (A) than description matches (B).
+    document = ("setweight(to_tsvector('english', coalesce(store_product.title, '')), 'A') || "
+                "setweight(to_tsvector('english', coalesce(store_product.description, '')), 'B')")
+
+    def index(self, cursor, product_ids=None):
+        sql = f"""
+            INSERT INTO {self.table} (product_id, document)
+            SELECT store_product.id, {self.document} FROM store_product"""
+        params = []
+        if product_ids is not None:
+            sql += " WHERE store_product.id = ANY(%s)"
+            params.append(list(product_ids))
+        sql += " ON CONFLICT (product_id) DO UPDATE SET document = excluded.document"
+        cursor.execute(sql, params)
+
+    def remove(self, cursor, product_ids):
+        # Rows are removed by the "ON DELETE CASCADE" of the foreign key.
+        pass
+
+    def filter(self, queryset, words):
+        # Prefix matching on every word, so "espre" still finds "espresso" like the "icontains" lookup used to.
+        query = " & ".join(f"{word}:*" for word in words)
+        return queryset.filter(
+            id__in=RawSQL(
+                f"SELECT product_id FROM {self.table} WHERE document @@ to_tsquery('english', %s)", [query])
+        ).annotate(search_rank=RawSQL(
+            f"SELECT ts_rank(document, to_tsquery('english', %s)) FROM {self.table} WHERE product_id = store_product.id",
+            [query], output_field=FloatField()))
+
+
+class SQLiteSearchBackend:
+    table = "store_product_search"
+
+    def index(self, cursor, product_ids=None):
+        # FTS5 tables have no "upsert", so the rows are replaced. The "rowid" of each row is the id of the product.
+        where, params = "", []
+        if product_ids is not None:
+            product_ids = list(product_ids)
+            placeholders = ", ".join(["%s"] * len(product_ids))
+            where = f" WHERE id IN ({placeholders})"
+            params = product_ids
+            self.remove(cursor, product_ids)
+        cursor.execute(f"""
+            INSERT INTO {self.table} (rowid, title, description)
+            SELECT id, title, coalesce(description, '') FROM store_product{where}""", params)
+
+    def remove(self, cursor, product_ids):
+        product_ids = list(product_ids)
+        placeholders = ", ".join(["%s"] * len(product_ids))
+        cursor.execute(
+            f"DELETE FROM {self.table} WHERE rowid IN ({placeholders})", product_ids)
+
+    def filter(self, queryset, words):
+        # Every word is quoted and prefix matched. Words are implicitly AND'ed.
+        query = " ".join(f'"{word}"*' for word in words)
+        return queryset.filter(
+            id__in=RawSQL(
+                f"SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s", [query])
+        ).annotate(search_rank=RawSQL(
+            # "bm25()" returns lower values for better matches, so it's negated. Title matches weigh twice as much as description matches.
+            f"SELECT -bm25({self.table}, 2.0, 1.0) FROM {self.table} WHERE {self.table} MATCH %s AND rowid = store_product.id",
+            [query], output_field=FloatField()))
+
+
+class MySQLSearchBackend:
+    # InnoDB keeps FULLTEXT indexes up to date by itself, so there's nothing to do in "index()" and "remove()".
+    def index(self, cursor, product_ids=None):
+        pass
+
+    def remove(self, cursor, product_ids):
+        pass
+
+    def filter(self, queryset, words):
+        # Boolean mode, where "+" requires the word and "*" makes it a prefix match.
+        query = " ".join(f"+{word}*" for word in words)
+        return queryset.annotate(search_rank=RawSQL(
+            "MATCH (store_product.title, store_product.description) AGAINST (%s IN BOOLEAN MODE)",
+            [query], output_field=FloatField())).filter(search_rank__gt=0)
+
+
+SEARCH_BACKENDS = {
+    "postgresql": PostgreSQLSearchBackend,
+    "sqlite": SQLiteSearchBackend,
+    "mysql": MySQLSearchBackend,
+}
+
+
+def get_search_backend(using=connection):
+    backend_class = SEARCH_BACKENDS.get(using.vendor)
+    if backend_class is None:
+        return None
+    return backend_class()
+
+
+# Called from the signal handlers when products are saved, and by anything that writes products in bulk, since "bulk_create()" and "update()" don't send signals.
+def index_products(product_ids=None):
+    backend = get_search_backend()
+    if backend is None:
+        return
+    if product_ids is not None:
+        product_ids = list(product_ids)
+        if not product_ids:
+            return
+    with connection.cursor() as cursor:
+        backend.index(cursor, product_ids)
+
+
+def remove_products(product_ids):
+    product_ids = list(product_ids)
+    backend = get_search_backend()
+    if backend is None or not product_ids:
+        return
+    with connection.cursor() as cursor:
+        backend.remove(cursor, product_ids)
+
+
+# Drop-in replacement for SearchFilter. The "?search=" parameter works the same, but matching products are found through the search index, and
+# come back ordered by relevance unless "?ordering=" is sent.
+class ProductSearchFilter(SearchFilter):
+    def filter_queryset(self, request, queryset, view):
+        backend = get_search_backend()
+        words = [word.lower() for term in self.get_search_terms(request)
+                 for word in WORD_PATTERN.findall(term)]
+        if backend is None or not words:
+            return super().filter_queryset(request, queryset, view)
+        return backend.filter(queryset, words).order_by("-search_rank", "title", "id")
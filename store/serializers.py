@@ -5,19 +5,62 @@ from dataclasses import fields
 from pyexpat import model
 from django.forms import models
 from rest_framework import serializers
+from rest_framework.exceptions import NotFound
+
+from collections import Counter
 
 # For converting the 1.1 in the tax method from a float to a decimal, before multiplying it with unit_price since unit_price is defined as a decimal.
 from decimal import Decimal
 
 # Used for transactions - either entire block of code passes and gets commited, or something fails, nothing gets commited and a rollback will happen.
 from django.db import transaction
+from django.db.models import Count
 
 # Used for "Type annotation" in custom method for SerializerMethodField. When typing "." in the instance, all memembers of the "Product" class is accessable.
-from .models import Cart, CartItem, Customer, Order, OrderItem, Product, Collection, ProductImage, Review
-from .signals import order_created  # Signal.
-
-
-class CollectionSerializer(serializers.ModelSerializer):
+from .models import ArchivedOrder, ArchivedOrderItem, Cart, CartItem, Customer, CustomerProductSummary, CustomerSummary, DailyCollectionSales, DailyProductSales, DailySales, Order, OrderItem, Product, Collection, ProductImage, Review
+# Sends signals, like "order_created", after the commit.
+from . import outbox
+# For reading the "?fields=" and "?omit=" query parameters only on requests that read data.
+from rest_framework.permissions import SAFE_METHODS
+
+
+# Returns the names in "available" that were asked for with "?fields=" (comma separated, all fields if not sent), minus the ones in "?omit=".
+# Unknown names are ignored. Only read requests are narrowed, so creating and updating objects still validates every field.
+def get_sparse_fields(request, available):
+    if request is None or request.method not in SAFE_METHODS:
+        return list(available)
+    fields = {name.strip() for name in request.query_params.get("fields", "").split(",") if name.strip()}
+    omit = {name.strip() for name in request.query_params.get("omit", "").split(",") if name.strip()}
+    return [name for name in available if (not fields or name in fields) and name not in omit]
+
+
+# Mixin for serializers, which drops the fields that weren't asked for with "?fields=" or were excluded with "?omit=".
+# Views use "get_columns()" to only load the database columns the remaining fields need, with ".only()".
+class SparseFieldsMixin:
+    # Columns needed by fields that aren't a column of the model with the same name. An empty list means no column, like a reverse relation.
+    field_columns = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        selected = set(get_sparse_fields(
+            self.context.get("request"), self.Meta.fields))
+        for name in list(self.fields):
+            if name not in selected:
+                self.fields.pop(name)
+
+    @classmethod
+    def get_fields_for(cls, request):
+        return get_sparse_fields(request, cls.Meta.fields)
+
+    @classmethod
+    def get_columns(cls, fields):
+        columns = []
+        for name in fields:
+            columns += cls.field_columns.get(name, [name])
+        return columns
+
+
+class CollectionSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Collection
         fields = ['id', 'title', 'products_count']
@@ -41,10 +84,12 @@ class ProductImageSerializer(serializers.ModelSerializer):
 
 # Decide what fields of the Product class to serialize - what fields to include in a Python dictionary, which then can be accessed through APIs.
 # This will be the external representation of the internal resources and data - not all fields needs to be displayed or defined here, as in the "Product" class.
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     # Many must be set to True, since more than one image is allowed per product.
     # Read-only must be set to True, otherwise multiple images must be passed when creating a product. Only properties related to a product-object is wanted to be passed when creating a product.
     images = ProductImageSerializer(many=True, read_only=True)
+    # The tax is calculated from "unit_price", and images are prefetched rather than being a column.
+    field_columns = {"price_with_tax": ["unit_price"], "images": []}
 
     class Meta:  # ModelSerializer is used to define a new Meta data, which will set the chosen fields much more simple. Custom created fields can also be added.
         model = Product
@@ -68,6 +113,16 @@ class ProductSerializer(serializers.ModelSerializer):
         return product.unit_price * Decimal(1.1)
 
 
+# Validates the rows of a product import file (the "import_products" command). The collection is given by its title rather than its id.
+class ProductImportSerializer(serializers.ModelSerializer):
+    collection = serializers.CharField(max_length=255)
+
+    class Meta:
+        model = Product
+        fields = ['title', 'slug', 'description',
+                  'unit_price', 'inventory', 'collection']
+
+
 class ReviewSerializer(serializers.ModelSerializer):
     class Meta:
         model = Review
@@ -96,6 +151,9 @@ class CartItemSerializer(serializers.ModelSerializer):
 
     # Annotate with "CartItem" to access ".quantity" inside cart_item. Is otherwise unaccessable.
     def get_total_price(self, cart_item: CartItem):
+        # Computed by the database, when the item was read with "CartItem.objects.with_total_price()".
+        if hasattr(cart_item, "total_price"):
+            return cart_item.total_price
         # For the custom made field "total_price" in "CartItem".
         return cart_item.quantity * cart_item.product.unit_price
 
@@ -112,6 +170,9 @@ class CartSerializer(serializers.ModelSerializer):
     total_price = serializers.SerializerMethodField()  # Defining custom field.
 
     def get_total_price(self, cart):
+        # Computed by the database, when the cart was read with "Cart.objects.with_total_price()".
+        if hasattr(cart, "total_price"):
+            return cart.total_price
         # List comprehension. Syntax is: "[item for item in collection]".
         # "cart.items" returns a manager object, and using ".all()" returns a queryset used to return all the items.
         # ".quantity" * ".unit_price" for each item returns a list of totals for this collection.
@@ -123,42 +184,48 @@ class CartSerializer(serializers.ModelSerializer):
         fields = ["id", "items", "total_price"]
 
 
+# The largest quantity of a cart item, which is the largest value of its "quantity" column ("PositiveSmallIntegerField").
+MAX_CART_ITEM_QUANTITY = 32767
+
+
+# Adds a "{product_id: quantity}" dictionary to the cart of the context, with the cart backend (store/carts.py) given in the context too.
+# Whether the cart and the products exist is found out by the same statement that adds the items, rather than by queries beforehand.
+# Returns the added items, or raises the errors of "product_ids", a product id for each item that was sent.
+def add_cart_items(context, quantities, product_ids):
+    items = context["cart_backend"].add_items(context["cart_id"], quantities)
+    if items is None:
+        raise NotFound("No cart with the given ID was found.")
+    found = {item.product_id for item in items}
+    if len(found) < len(quantities):
+        raise serializers.ValidationError([
+            {} if product_id in found else {"product_id": ["No product with the given ID was found."]} for product_id in product_ids])
+    too_large = {item.product_id for item in items if item.quantity > MAX_CART_ITEM_QUANTITY}
+    if too_large:
+        raise serializers.ValidationError([
+            {"quantity": [f"The quantity of an item can't be more than {MAX_CART_ITEM_QUANTITY}."]} if product_id in too_large else {}
+            for product_id in product_ids])
+    return items
+
+
 # Creating this class to bypass the "product" object that must be passed in, when posting a product to a cart. Only product, without an object, and quantity is needed.
 class AddCartItemSerializer(serializers.ModelSerializer):
     # This attribute is generated dynamically at run-time, and must therefore be defined explicitly.
     product_id = serializers.IntegerField()
 
-    # For validating individual fields, rather than entire objects. To prevent app from crashing when posting item of 0 id.
-    def validate_product_id(self, value):  # "value" being validated - the id.
-        if not Product.objects.filter(pk=value).exists():
-            raise serializers.ValidationError(
-                'No product with the given ID was found.')
-        return value
-
     # Overwritting the default save method, since adding the same product to the same cart multiple times will otherwise create multiple cartitem records.
-    # Simply updating the quantity of an existing item is desired.
+    # Simply updating the quantity of an existing item is desired. The backend does that in a single statement, so concurrent adds can't race.
     def save(self, **kwargs):
-        # Getting the URL parameter from the overwritten context object, and passed in here.
-        cart_id = self.context["cart_id"]
         # When the data gets validated in the serializers, the attribute "validated_data" becomes accessable, which is a dict. Then "product_id" can be read which was received from the client.
         product_id = self.validated_data["product_id"]
-        quantity = self.validated_data["quantity"]
-
-        # If there is no such cart item, throw an exception.
         try:
-            # Saving logic. "get" cart item with 2 attributes - custom defined cart id, custom defined product id.
-            cart_item = CartItem.objects.get(
-                cart_id=cart_id, product_id=product_id)
-            cart_item.quantity += quantity  # Update an existing item.
-            cart_item.save()
-            self.instance = cart_item
-        except CartItem.DoesNotExist:
-            # May also pass parameters in as "product_id=product=id, quantity=quantity". Or just unpack self.validated_data dictionary as done below.
-            self.instance = CartItem.objects.create(
-                cart_id=cart_id, **self.validated_data)  # Create a new item.
+            items = add_cart_items(self.context, {product_id: self.validated_data["quantity"]}, [product_id])
+        except serializers.ValidationError as error:
+            # The error of the only item.
+            raise serializers.ValidationError(error.detail[0])
 
         # "self.instance" must be included in the logic. Either to update a record or to create a record. The object that is updated/created must be stored in this attribute of
         # the "validated_data" dictionary within the save method. Finally, "self.instance" is returned.
+        self.instance = items[0]
         return self.instance
 
     class Meta:
@@ -166,6 +233,22 @@ class AddCartItemSerializer(serializers.ModelSerializer):
         fields = ["id", "product_id", "quantity"]
 
 
+# For "POST /store/carts/{id}/items/batch/", which adds many items in one statement. Quantities of the same product are added together.
+class AddCartItemsSerializer(serializers.Serializer):
+    items = AddCartItemSerializer(many=True, allow_empty=False, max_length=100)
+
+    def save(self, **kwargs):
+        quantities = Counter()
+        for item in self.validated_data["items"]:
+            quantities[item["product_id"]] += item["quantity"]
+        try:
+            items = add_cart_items(self.context, quantities, [item["product_id"] for item in self.validated_data["items"]])
+        except serializers.ValidationError as error:
+            raise serializers.ValidationError({"items": error.detail})
+        self.instance = {"items": items}
+        return self.instance
+
+
 class UpdateCartItemSerializer(serializers.ModelSerializer):
     # Allows only quantity to be updated, when a patch request is sent.
     class Meta:
@@ -174,7 +257,7 @@ class UpdateCartItemSerializer(serializers.ModelSerializer):
 
 
 # For storing customer data for a profile.
-class CustomerSerializer(serializers.ModelSerializer):
+class CustomerSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     # Must be defined, since it doesn't exist in the Customer class. This attribute must be created dynamically at runtime.
     # Field is otherwise updateable, which is not desireable since it can create issues.
     user_id = serializers.IntegerField(read_only=True)
@@ -184,6 +267,24 @@ class CustomerSerializer(serializers.ModelSerializer):
         fields = ["id", "user_id", "phone", "birth_date", "membership", ]
 
 
+class CustomerProductSummarySerializer(serializers.ModelSerializer):
+    product = SimpleProductSerializer()
+
+    class Meta:
+        model = CustomerProductSummary
+        fields = ["product", "quantity"]
+
+
+# The order history of a customer, read from its summary. "top_products" is set on the summary by the view.
+class CustomerHistorySerializer(serializers.ModelSerializer):
+    customer_id = serializers.IntegerField(read_only=True)
+    top_products = CustomerProductSummarySerializer(many=True, read_only=True)
+
+    class Meta:
+        model = CustomerSummary
+        fields = ["customer_id", "orders_count", "total_spent", "last_order_at", "top_products"]
+
+
 class OrderItemSerializer(serializers.ModelSerializer):
     # Allows for nested objects to appear in the Orders endpoint, within each order each orderitem with its details on products will appear. Each product is a nested object.
     product = SimpleProductSerializer()
@@ -193,15 +294,33 @@ class OrderItemSerializer(serializers.ModelSerializer):
         fields = ["id", "product", "unit_price", "quantity"]
 
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     # Establishing a Foreign Key, so items can be accessed.
     items = OrderItemSerializer(many=True)
+    field_columns = {"items": []}
 
     class Meta:
         model = Order
         fields = ['id', 'customer', 'placed_at', 'payment_status', 'items']
 
 
+# Archived orders (store/archive.py), in the same shape as orders.
+class ArchivedOrderItemSerializer(serializers.ModelSerializer):
+    product = SimpleProductSerializer()
+
+    class Meta:
+        model = ArchivedOrderItem
+        fields = ["id", "product", "unit_price", "quantity"]
+
+
+class ArchivedOrderSerializer(serializers.ModelSerializer):
+    items = ArchivedOrderItemSerializer(many=True)
+
+    class Meta:
+        model = ArchivedOrder
+        fields = ['id', 'customer', 'placed_at', 'payment_status', 'items']
+
+
 # Creating a new serializer for updating orders with only the desired field to be updatable, rather than hardcoding the unwanted fields as "read_only" in the "OrderSerializer" serializer.
 class UpdateOrderSerializer(serializers.ModelSerializer):
     # Will only allow to update, "PATCH" request, the payment_status field, since all the other fields (id, customer, placed at, items) are to be left untouched.
@@ -215,49 +334,59 @@ class CreateOrderSerializer(serializers.Serializer):
     cart_id = serializers.UUIDField()
 
     # To avoid creating an order regardless if a cart exists or not. Validating the data ensures an order is only created if the cart id exists.
+    # The cart and the number of its items are read in one query. It's None when there's no such cart.
     def validate_cart_id(self, cart_id):  # Two parameters is needed.
-        if not Cart.objects.filter(pk=cart_id).exists():
+        items_count = Cart.objects.filter(pk=cart_id).annotate(items_count=Count("items")).values_list("items_count", flat=True).first()
+        if items_count is None:
             raise serializers.ValidationError("No cart with that ID exists.")
-        if CartItem.objects.filter(cart_id=cart_id).count() == 0:  # If cart is empty
+        if items_count == 0:  # If cart is empty
             raise serializers.ValidationError(
                 "The cart is empty. Please add something to your order.")
         return cart_id  # Otherwise return the cart id as a valid value.
 
     # Overriding the save method, since the logic of saving an order is very specific, and Django can not auto generate it.
     # The logic is, go to shopping cart table, grab all cart items, move to order_items table, delete shopping cart.
+    # Each step is a single statement, so the transaction is held for as few round trips as possible.
     def save(self, **kwargs):
-        with transaction.atomic():  # A transaction for rollback purposes in case of failure.
-            # Set to an expression here, so to easier access several times in below code.
-            cart_id = self.validated_data["cart_id"]
+        # Set to an expression here, so to easier access several times in below code.
+        cart_id = self.validated_data["cart_id"]
+        # From the access token, or cached, so usually no query. Read before the transaction starts.
+        customer_id = Customer.objects.get_id_for(self.context["user"])
 
-            customer = Customer.objects.get(
-                user_id=self.context["user_id"])  # Getting the customer object, so it can be passed in below. "get_or_create" method returns a tuple, and must be unpacked immediately.
+        with transaction.atomic():  # A transaction for rollback purposes in case of failure.
             # Creating an order object. Passing in "customer" field only, since the other 2 fields are already set by and auto field and default field.
-            order = Order.objects.create(customer=customer)
-
-            #  For creating order items, firstly items must be added to the "cart_id", then for each cart item an order item must be created and saved in the DB.
-            cart_items = CartItem.objects.select_related("product").filter(
-                cart_id=cart_id)  # Filter where cart_id = validated data of cart id. This returns a list of cart items, which is a queryset.
-
-            # "cart_items" must be converted into "order_items". A list comprehension is used, syntax is "[item for item in collection]".
-            order_items = [  # A list of order items is returned.
-                OrderItem(  # Using kwargs, this OrderItem object is being initialized.
-                    order=order,  # Set to the order object created above at the overwritten "save" method
-                    # When retrieving the cart items, eager loadinging with their products must be done; otherwise for each cart item an extra query will be sent to read the product of that item.
-                    product=item.product,
-                    # Unit price must be set at the time of placing the order.
-                    unit_price=item.product.unit_price,
-                    quantity=item.quantity
-                ) for item in cart_items  # Collection is "cart_items"
-            ]
-            # A method to avoid iterating over each individual order, item, and save them, to avoid sending too many queries to the DB.
-            OrderItem.objects.bulk_create(order_items)
-
-            Cart.objects.filter(pk=cart_id).delete()
-
-            # Firing the signal. If one of the receivers fails and throws and exception, the other receivers are notified with "send_robust".
-            # The class that is sending the signal. Getting it from self.__class__. It's a magic attribute that returns the class of the current instance.
-            # Optionally supplying additional data - the order that was created. Set order as a keyword argument. In the store app, everytime an order is created, the signal is fired.
-            order_created.send_robust(self.__class__, order=order)
+            order = Order.objects.create(customer_id=customer_id)
+
+            # The cart items are copied into order items by the database, with the unit prices at the time of placing the order.
+            # The cart may have been emptied since it was validated, e.g. by a concurrent request, and then the order is rolled back.
+            if not OrderItem.objects.copy_from_cart(order.id, cart_id):
+                raise serializers.ValidationError({"cart_id": ["The cart is empty. Please add something to your order."]})
+
+            # Nothing is kept if the cart was deleted in the meantime, e.g. by a concurrent checkout of the same cart.
+            if not Cart.objects.delete_with_items(cart_id):
+                raise serializers.ValidationError({"cart_id": ["No cart with that ID exists."]})
+
+            # Firing the signal through the outbox (store/outbox.py). The event is written in this transaction, and the receivers get it from a
+            # Celery task after the commit, so they don't add to the time of the checkout. Supplying additional data - the order that was created.
+            outbox.publish("order_created", order=order)
 
             return order
+
+
+# Rolled up sales (store/rollups.py), for reports.
+class DailyProductSalesSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DailyProductSales
+        fields = ["day", "product_id", "payment_status", "units", "revenue"]
+
+
+class DailyCollectionSalesSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DailyCollectionSales
+        fields = ["day", "collection_id", "payment_status", "units", "revenue"]
+
+
+class DailySalesSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DailySales
+        fields = ["day", "payment_status", "units", "revenue"]
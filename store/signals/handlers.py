@@ -1,10 +1,13 @@
 # A decorator. It tells Django to use whatever function is decorated, when a "User" model is saved.
 from django.dispatch import receiver
-from django.db.models.signals import post_save  # A "post save" signal.
+from django.db.models.signals import pre_save, post_save, post_delete  # A "post save" signal.
 # To avoid building dependencies between apps, settings is imported, since the User setting is defined there as AUTH_USER_MODEL.
 from django.conf import settings
+from django.utils import timezone
 
-from store.models import Customer
+from store.models import Collection, Customer, CustomerSummary, Order, OrderItem, Product, ProductImage
+from store import rollups, search, snapshot
+from store.caching import CATALOG_SCOPE, bump_versions, collection_scope, product_scope
 
 
 # Tells Django to use this function whenever a "User" model is saved. The function creates a new "customer" when a user is created.
@@ -15,3 +18,139 @@ def create_customer_for_new_user(sender, **kwargs):
     if kwargs["created"]:  # A key. Checking to see if a new model instance is created
         # Customer is created. To get the instance go to the keyword arguments and pick the instance.
         Customer.objects.create(user=kwargs["instance"])
+
+
+# The cached customer id of the user ("CustomerManager.get_id_for_user()") is dropped with the customer.
+@receiver(post_delete, sender=Customer)
+def forget_deleted_customer(sender, **kwargs):
+    Customer.objects.forget_user(kwargs["instance"].user_id)
+
+
+# Remembers the payment status of an order before it's saved, so a change to or from complete can be added to the summary of its customer.
+@receiver(pre_save, sender=Order)
+def remember_previous_payment_status(sender, **kwargs):
+    order = kwargs["instance"]
+    order._previous_payment_status = None
+    if order.pk is not None:
+        order._previous_payment_status = Order.objects.filter(
+            pk=order.pk).values_list("payment_status", flat=True).first()
+
+
+# Keeps "CustomerSummary" up to date, in the same transaction as the order. Orders are counted when they're placed, and their items when they're paid.
+@receiver(post_save, sender=Order)
+def summarize_saved_order(sender, **kwargs):
+    order = kwargs["instance"]
+    if kwargs["created"]:
+        CustomerSummary.objects.add_order(order.customer_id, order.placed_at)
+    paid = order.payment_status == Order.PAYMENT_STATUS_COMPLETE
+    was_paid = getattr(order, "_previous_payment_status", None) == Order.PAYMENT_STATUS_COMPLETE
+    if paid != was_paid:
+        CustomerSummary.objects.add_paid_order(order.pk, order.customer_id, 1 if paid else -1)
+
+
+# Only orders without items can be deleted, so there's no spend to take away.
+@receiver(post_delete, sender=Order)
+def summarize_deleted_order(sender, **kwargs):
+    CustomerSummary.objects.remove_order(kwargs["instance"].customer_id)
+
+
+# Orders that changed after they may have been rolled up mark their day as dirty, so its sales are computed again (store/rollups.py). New orders
+# are added by the "update_sales_rollups" task.
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+def mark_order_sales_dirty(sender, **kwargs):
+    order = kwargs["instance"]
+    if kwargs["signal"] is post_save and (kwargs["created"] or order.payment_status == getattr(order, "_previous_payment_status", None)):
+        return
+    rollups.mark_dirty(order.placed_at)
+
+
+# Checkouts copy the items with SQL, so this is only for items changed afterwards, e.g. in the admin.
+@receiver(post_save, sender=OrderItem)
+@receiver(post_delete, sender=OrderItem)
+def mark_order_item_sales_dirty(sender, **kwargs):
+    item = kwargs["instance"]
+    # The order of the item is only read when it isn't loaded already, and then only its "placed_at".
+    if OrderItem.order.is_cached(item):
+        placed_at = item.order.placed_at
+    else:
+        placed_at = Order.objects.filter(pk=item.order_id).values_list("placed_at", flat=True).first()
+    # Nothing to mark when the order is gone already.
+    if placed_at is not None:
+        rollups.mark_dirty(placed_at)
+
+
+# Keeps the full-text search index of products up to date. Runs in the same transaction as the save, so the index never disagrees with the table.
+@receiver(post_save, sender=Product)
+def index_saved_product(sender, **kwargs):
+    search.index_products([kwargs["instance"].pk])
+
+
+@receiver(post_delete, sender=Product)
+def remove_deleted_product(sender, **kwargs):
+    search.remove_products([kwargs["instance"].pk])
+
+
+# Remembers the collection a product belonged to before it's saved, so both the old and the new collection can be invalidated when it moves.
+@receiver(pre_save, sender=Product)
+def remember_previous_collection(sender, **kwargs):
+    product = kwargs["instance"]
+    product._previous_collection_id = None
+    if product.pk is not None:
+        product._previous_collection_id = Product.objects.filter(
+            pk=product.pk).values_list("collection_id", flat=True).first()
+
+
+# Keeps "Collection.products_count" up to date. The counts are added to in the database ("F()"), so concurrent saves don't overwrite each other's counts.
+@receiver(post_save, sender=Product)
+def count_saved_product(sender, **kwargs):
+    product = kwargs["instance"]
+    if kwargs["created"]:
+        Collection.objects.add_products_count({product.collection_id: 1})
+        return
+    previous_collection_id = getattr(product, "_previous_collection_id", None)
+    if previous_collection_id is not None and previous_collection_id != product.collection_id:
+        Collection.objects.add_products_count(
+            {previous_collection_id: -1, product.collection_id: 1})
+
+
+@receiver(post_delete, sender=Product)
+def count_deleted_product(sender, **kwargs):
+    Collection.objects.add_products_count({kwargs["instance"].collection_id: -1})
+
+
+# Invalidates the cached responses of the catalog, by bumping the versions of every scope the change is visible in.
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product(sender, **kwargs):
+    product = kwargs["instance"]
+    scopes = [CATALOG_SCOPE, product_scope(product.pk),
+              collection_scope(product.collection_id)]
+    previous_collection_id = getattr(product, "_previous_collection_id", None)
+    if previous_collection_id is not None:
+        scopes.append(collection_scope(previous_collection_id))
+    bump_versions(*scopes)
+    # Deleted products are sent along, since the snapshot can't find them by their "last_update".
+    snapshot.publish_change(
+        deleted_products=[product.pk] if kwargs["signal"] is post_delete else [])
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def invalidate_product_image(sender, **kwargs):
+    product_id = kwargs["instance"].product_id
+    # Images are part of the product, so adding or removing one counts as an update of the product, for the "Last-Modified" and "ETag" headers.
+    Product.objects.filter(pk=product_id).update(last_update=timezone.now())
+    collection_id = Product.objects.filter(
+        pk=product_id).values_list("collection_id", flat=True).first()
+    bump_versions(CATALOG_SCOPE, product_scope(product_id),
+                  collection_scope(collection_id))
+    snapshot.publish_change()
+
+
+@receiver(post_save, sender=Collection)
+@receiver(post_delete, sender=Collection)
+def invalidate_collection(sender, **kwargs):
+    bump_versions(CATALOG_SCOPE, collection_scope(kwargs["instance"].pk))
+    snapshot.publish_change(
+        deleted_collections=[kwargs["instance"].pk] if kwargs["signal"] is post_delete else [])
@@ -0,0 +1,382 @@
+# In-process snapshot of the catalog (products, their images and collections), kept by every worker process, so the busiest catalog reads are answered
+# from memory without any query. Turned on with the "STORE_CATALOG_SNAPSHOT" setting.
+#
+# Writes publish a message on a Redis pub/sub channel (through the "django_redis" cache). Each process listens in a background thread, and marks its
+# snapshot stale when a message arrives. The next read then refreshes it incrementally: only products and collections with a "last_update" since the
+# previous refresh are read again, and deleted ids are carried in the messages. A refresh is also done after "STORE_CATALOG_SNAPSHOT_MAX_AGE"
+# seconds, which reloads the snapshot when its row counts disagree with the database (e.g. after a missed message). The whole catalog is read again
+# every "STORE_CATALOG_SNAPSHOT_FULL_RELOAD" seconds, for the changes a refresh can't see, like a transaction committed long after its "last_update",
+# or a "QuerySet.update()" that doesn't set "last_update".
+import json
+import logging
+import operator
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.filters import OrderingFilter
+from rest_framework.response import Response
+
+from .fast_serializers import FastProductSerializer
+from .models import Collection, Product, ProductImage
+from .serializers import CollectionSerializer
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "store:catalog:changes"
+# Rows saved just before a refresh may commit just after it. Re-reading a short window before the previous refresh makes sure they're picked up.
+REFRESH_OVERLAP = timedelta(seconds=60)
+
+
+def snapshot_enabled():
+    return getattr(settings, "STORE_CATALOG_SNAPSHOT", False)
+
+
+# Records use "__slots__", which take a fraction of the memory of model instances or dictionaries, since a snapshot holds the whole catalog.
+class ProductRecord:
+    __slots__ = ("id", "title", "description", "slug", "inventory", "unit_price", "last_update", "collection_id", "images")
+
+    def __init__(self, row, images):
+        for name in ("id", "title", "description", "slug", "inventory", "unit_price", "last_update", "collection_id"):
+            setattr(self, name, row[name])
+        # "(id, name)" pairs of the images of the product.
+        self.images = images
+
+    # The same row as the "values()" rows of FastProductSerializer.
+    def as_row(self):
+        return {"id": self.id, "title": self.title, "description": self.description, "slug": self.slug, "inventory": self.inventory,
+                "unit_price": self.unit_price, "last_update": self.last_update, "collection": self.collection_id}
+
+
+class CollectionRecord:
+    __slots__ = ("id", "title", "last_update")
+
+    def __init__(self, row):
+        self.id = row["id"]
+        self.title = row["title"]
+        self.last_update = row["last_update"]
+
+
+# One version of the catalog. Never changed once built; a refresh builds a new one and swaps it in, so readers never see a half updated snapshot.
+class CatalogState:
+    def __init__(self, products, collections, loaded_at):
+        self.products = products
+        self.collections = collections
+        self.loaded_at = loaded_at
+        # Every product id, and an index by collection, in the default ordering of products ("title", then "id").
+        self.ordered = []
+        self.by_collection = {collection_id: [] for collection_id in collections}
+        for product in sorted(products.values(), key=lambda product: (product.title, product.id)):
+            self.ordered.append(product.id)
+            self.by_collection.setdefault(product.collection_id, []).append(product.id)
+        self.last_update = max((product.last_update for product in products.values()), default=None)
+
+    # "(last_update, count)" of the products of a collection.
+    def collection_products_stats(self, collection_id):
+        products = [self.products[product_id] for product_id in self.by_collection.get(collection_id, ())]
+        return max((product.last_update for product in products), default=None), len(products)
+
+
+class CatalogSnapshot:
+    def __init__(self):
+        self.state = None
+        self.lock = threading.Lock()
+        self.stale = True
+        self.refreshed_at = 0
+        self.loaded_all_at = 0
+        # Ids deleted since the last refresh, from the invalidation messages.
+        self.deleted_products = set()
+        self.deleted_collections = set()
+        self.listener_pid = None
+
+    # Marks the snapshot stale. Called for every invalidation message, from this process or another one.
+    def invalidate(self, message=None):
+        message = message or {}
+        self.deleted_products.update(message.get("products", ()))
+        self.deleted_collections.update(message.get("collections", ()))
+        self.stale = True
+
+    # Returns an up to date state, refreshing it first if needed.
+    def get_state(self):
+        self.start_listener()
+        max_age = getattr(settings, "STORE_CATALOG_SNAPSHOT_MAX_AGE", 60)
+        if self.stale or time.monotonic() - self.refreshed_at > max_age:
+            with self.lock:
+                # Another thread may have refreshed it while this one waited for the lock.
+                if self.stale or time.monotonic() - self.refreshed_at > max_age:
+                    self.refresh(check_counts=not self.stale)
+        return self.state
+
+    # "check_counts" compares the row counts with the database, for refreshes that aren't due to a message.
+    def refresh(self, check_counts=False):
+        # Cleared before reading, so a message arriving during the refresh leaves the snapshot stale for the next read.
+        self.stale = False
+        deleted_products, self.deleted_products = self.deleted_products, set()
+        deleted_collections, self.deleted_collections = self.deleted_collections, set()
+        now = timezone.now()
+        state = self.state
+        full_reload = getattr(settings, "STORE_CATALOG_SNAPSHOT_FULL_RELOAD", 10 * 60)
+        if state is None or time.monotonic() - self.loaded_all_at > full_reload:
+            self.state = self.load_all(now)
+            self.loaded_all_at = time.monotonic()
+        else:
+            since = state.loaded_at - REFRESH_OVERLAP
+            products = {product_id: product for product_id, product in state.products.items()
+                        if product_id not in deleted_products}
+            collections = {collection_id: collection for collection_id, collection in state.collections.items()
+                           if collection_id not in deleted_collections}
+            # Adding or removing an image updates the "last_update" of its product, so the images of changed products are enough.
+            state = self.load(Product.objects.filter(last_update__gte=since), ProductImage.objects.filter(product__last_update__gte=since),
+                              Collection.objects.filter(last_update__gte=since), products, collections, now)
+            # Deletes from paths that send no message, like raw SQL, show up as a different count.
+            if check_counts and (len(state.products) != Product.objects.count() or len(state.collections) != Collection.objects.count()):
+                state = self.load_all(now)
+                self.loaded_all_at = time.monotonic()
+            self.state = state
+        self.refreshed_at = time.monotonic()
+
+    def load_all(self, loaded_at):
+        return self.load(Product.objects.all(), ProductImage.objects.all(), Collection.objects.all(), {}, {}, loaded_at)
+
+    # Reads the given products, images and collections into copies of "products" and "collections", and returns a new state. The images are those
+    # of the products read.
+    def load(self, product_queryset, image_queryset, collection_queryset, products, collections, loaded_at):
+        rows = list(product_queryset.order_by().values(
+            "id", "title", "description", "slug", "inventory", "unit_price", "last_update", "collection_id"))
+        images = {}
+        for image_id, product_id, name in image_queryset.order_by("id").values_list("id", "product_id", "image"):
+            images.setdefault(product_id, []).append((image_id, name))
+        products = dict(products)
+        for row in rows:
+            products[row["id"]] = ProductRecord(row, tuple(images.get(row["id"], ())))
+
+        collections = dict(collections)
+        for row in collection_queryset.order_by().values("id", "title", "last_update"):
+            collections[row["id"]] = CollectionRecord(row)
+        return CatalogState(products, collections, loaded_at)
+
+    # Starts the thread listening for invalidation messages, once per process. Checked by process id, since worker processes are forked.
+    def start_listener(self):
+        if self.listener_pid == os.getpid():
+            return
+        self.listener_pid = os.getpid()
+        client = get_redis_client()
+        if client is None:
+            return
+        threading.Thread(target=self.listen, args=(client,), name="catalog-snapshot-listener", daemon=True).start()
+
+    def listen(self, client):
+        delay = 1
+        while True:
+            try:
+                pubsub = client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(CHANNEL)
+                # Messages may have been missed while (re)connecting.
+                self.invalidate()
+                delay = 1
+                for message in pubsub.listen():
+                    self.invalidate(json.loads(message["data"]))
+            except Exception:
+                logger.exception("Catalog snapshot listener failed, reconnecting in %s seconds", delay)
+                time.sleep(delay)
+                # Waits longer after each failure, so a Redis outage doesn't flood the logs.
+                delay = min(delay * 2, 30)
+
+
+# The Redis client of the default cache, or None when the cache isn't a "django_redis" cache.
+def get_redis_client():
+    try:
+        from django_redis import get_redis_connection
+        return get_redis_connection("default")
+    except (ImportError, NotImplementedError):
+        return None
+
+
+catalog_snapshot = CatalogSnapshot()
+
+
+def get_catalog_state():
+    return catalog_snapshot.get_state()
+
+
+def publish(message):
+    catalog_snapshot.invalidate(message)
+    client = get_redis_client()
+    if client is None:
+        return
+    try:
+        client.publish(CHANNEL, json.dumps(message))
+    except Exception:
+        # Other processes still pick up the change at their next periodic refresh.
+        logger.exception("Could not publish a catalog change")
+
+
+# Called whenever products, images or collections change. This process is invalidated right away, and every process once the transaction commits,
+# so a refresh never keeps data read before the commit.
+def publish_change(deleted_products=(), deleted_collections=()):
+    if not snapshot_enabled():
+        return
+    message = {"products": list(deleted_products), "collections": list(deleted_collections)}
+    catalog_snapshot.invalidate(message)
+    transaction.on_commit(lambda: publish(message))
+
+
+# The filters of ProductFilter, read from the query parameters. Returns None when they can't be applied to the snapshot, like an unknown collection
+# or an invalid price, so the request goes to the database and gets its usual error.
+def parse_product_filters(query_params, state):
+    filters = {}
+    collection_id = query_params.get("collection_id", "")
+    if collection_id:
+        if not collection_id.isdigit() or int(collection_id) not in state.collections:
+            return None
+        filters["collection_id"] = int(collection_id)
+    for name in ("unit_price__gt", "unit_price__lt"):
+        value = query_params.get(name, "")
+        if value:
+            try:
+                filters[name] = Decimal(value)
+            except InvalidOperation:
+                return None
+            if not filters[name].is_finite():
+                return None
+    return filters
+
+
+def filter_products(state, filters):
+    product_ids = state.by_collection[filters["collection_id"]] if "collection_id" in filters else state.ordered
+    products = [state.products[product_id] for product_id in product_ids]
+    if "unit_price__gt" in filters:
+        products = [product for product in products if product.unit_price > filters["unit_price__gt"]]
+    if "unit_price__lt" in filters:
+        products = [product for product in products if product.unit_price < filters["unit_price__lt"]]
+    return products
+
+
+# Sorts records like "order_by(*ordering)". Python's sort is stable, so sorting by each field from the last one to the first gives the combined order.
+def order_records(records, ordering):
+    records = list(records)
+    for field in reversed(ordering):
+        name = field.lstrip("-")
+        records.sort(key=lambda record: getattr(record, name), reverse=field.startswith("-"))
+    return records
+
+
+# Just enough of a queryset for KeysetPagination to page through records: "order_by()", the "<field>__gt" or "<field>__lt" filter of a cursor
+# position, and slicing. Positions are the strings of the cursor, so they're converted to the type of the field first.
+class RecordQuerySet(list):
+    # Read by KeysetPagination for the relevance ordering of searches, which aren't served from the snapshot.
+    query = SimpleNamespace(annotations={})
+
+    def order_by(self, *ordering):
+        return RecordQuerySet(order_records(self, ordering))
+
+    def filter(self, **kwargs):
+        (lookup, position), = kwargs.items()
+        name, comparison = lookup.rsplit("__", 1)
+        if not self:
+            return self
+        example = getattr(self[0], name)
+        position = datetime.fromisoformat(position) if isinstance(example, datetime) else type(example)(position)
+        compare = operator.gt if comparison == "gt" else operator.lt
+        return RecordQuerySet(record for record in self if compare(getattr(record, name), position))
+
+
+# Mixin for the product viewset. Serves the product detail, and product lists without "?search=" (keyset pages, or page numbers with "?page="), from
+# the snapshot. Searches go to the database, and so does anything the snapshot can't answer, like an unknown id.
+class ProductSnapshotMixin:
+    # The filtered and ordered product records of a list request, or None when the request isn't served from the snapshot. Keyset pages are ordered
+    # by the paginator, which adds the tie-breakers.
+    def get_snapshot_products(self):
+        if not hasattr(self, "_snapshot_products"):
+            self._snapshot_products = None
+            params = self.request.query_params
+            if snapshot_enabled() and not params.get("search"):
+                state = get_catalog_state()
+                filters = parse_product_filters(params, state)
+                if filters is not None:
+                    records = filter_products(state, filters)
+                    ordering = OrderingFilter().get_ordering(self.request, Product.objects.none(), self)
+                    self._snapshot_products = RecordQuerySet(order_records(records, ordering) if ordering else records)
+        return self._snapshot_products
+
+    def get_snapshot_product(self):
+        pk = str(self.kwargs.get("pk", ""))
+        if not snapshot_enabled() or not pk.isdigit():
+            return None
+        return get_catalog_state().products.get(int(pk))
+
+    # The same validators as the database queries of "get_conditional_validators()", or None.
+    def get_snapshot_validators(self):
+        if self.action == "retrieve":
+            record = self.get_snapshot_product()
+            return None if record is None else (record.last_update, "")
+        if self.action == "list":
+            records = self.get_snapshot_products()
+            if records is not None:
+                return max((record.last_update for record in records), default=None), len(records)
+        return None
+
+    def serialize_snapshot_products(self, records):
+        rows = [record.as_row() for record in records]
+        return FastProductSerializer(self.request).serialize(rows, {record.id: record.images for record in records})
+
+    def list(self, request, *args, **kwargs):
+        records = self.get_snapshot_products()
+        if records is None:
+            return super().list(request, *args, **kwargs)
+        page = self.paginate_queryset(records)
+        return self.get_paginated_response(self.serialize_snapshot_products(page))
+
+    def retrieve(self, request, *args, **kwargs):
+        record = self.get_snapshot_product()
+        if record is None:
+            return super().retrieve(request, *args, **kwargs)
+        return Response(self.serialize_snapshot_products([record])[0])
+
+
+# Mixin for the collection viewset. Serves the collection list and detail from the snapshot.
+class CollectionSnapshotMixin:
+    def get_snapshot_collection(self):
+        pk = str(self.kwargs.get("pk", ""))
+        if not snapshot_enabled() or not pk.isdigit():
+            return None
+        return get_catalog_state().collections.get(int(pk))
+
+    def get_snapshot_validators(self):
+        if not snapshot_enabled():
+            return None
+        if self.action == "retrieve":
+            record = self.get_snapshot_collection()
+            if record is None:
+                return None
+            last_update, products_count = get_catalog_state().collection_products_stats(record.id)
+            return max(filter(None, [record.last_update, last_update])), products_count
+        if self.action == "list":
+            state = get_catalog_state()
+            last_updates = list(filter(None, [state.last_update, *(record.last_update for record in state.collections.values())]))
+            return (max(last_updates) if last_updates else None), f"{len(state.collections)}-{len(state.products)}"
+        return None
+
+    # Same output as CollectionSerializer, with "?fields=" and "?omit=".
+    def serialize_snapshot_collection(self, state, record):
+        data = {"id": record.id, "title": record.title, "products_count": len(state.by_collection.get(record.id, ()))}
+        return {name: data[name] for name in CollectionSerializer.get_fields_for(self.request)}
+
+    def list(self, request, *args, **kwargs):
+        if not snapshot_enabled():
+            return super().list(request, *args, **kwargs)
+        state = get_catalog_state()
+        records = sorted(state.collections.values(), key=lambda record: (record.title, record.id))
+        return Response([self.serialize_snapshot_collection(state, record) for record in records])
+
+    def retrieve(self, request, *args, **kwargs):
+        record = self.get_snapshot_collection()
+        if record is None:
+            return super().retrieve(request, *args, **kwargs)
+        return Response(self.serialize_snapshot_collection(get_catalog_state(), record))
@@ -0,0 +1,32 @@
+# Pieces of SQL the ORM can't express, written for each database vendor: Postgres in production, MySQL in development and SQLite for tests.
+from django.db import connection
+
+
+def quote(name):
+    return connection.ops.quote_name(name)
+
+
+# A derived table of literal rows, as "SELECT %s AS a, %s AS b UNION ALL SELECT %s, %s", and its parameters. Works with every vendor, unlike
+# "VALUES" lists, whose syntax and column names differ.
+def rows_table(columns, rows):
+    first = "SELECT " + ", ".join(f"%s AS {quote(column)}" for column in columns)
+    rest = " UNION ALL SELECT " + ", ".join(["%s"] * len(columns))
+    return first + rest * (len(rows) - 1), [value for row in rows for value in row]
+
+
+# The end of an "INSERT ... SELECT", which adds "columns" of the selected row to the existing row when the insert conflicts on "conflict_columns".
+# "source" is the alias of the selected table, which MySQL reads the new values from. SQLite needs a WHERE clause in the SELECT before it.
+def on_conflict_increment(table, conflict_columns, columns, source):
+    if connection.vendor == "mysql":
+        # MySQL uses the unique key that conflicted, so "conflict_columns" isn't needed.
+        return "ON DUPLICATE KEY UPDATE " + ", ".join(
+            f"{quote(column)} = {quote(table)}.{quote(column)} + {quote(source)}.{quote(column)}" for column in columns)
+    return (f"ON CONFLICT ({', '.join(quote(name) for name in conflict_columns)}) DO UPDATE SET " + ", ".join(
+        f"{quote(column)} = {quote(table)}.{quote(column)} + excluded.{quote(column)}" for column in columns))
+
+
+# "RETURNING" the columns of the written rows, where the database supports it, or else "".
+def returning(columns):
+    if not connection.features.can_return_rows_from_bulk_insert:
+        return ""
+    return "RETURNING " + ", ".join(quote(column) for column in columns)
@@ -0,0 +1,53 @@
+import logging
+from datetime import timedelta
+
+from celery import shared_task
+from django.conf import settings
+from django.utils import timezone
+
+from . import archive, outbox, rollups
+from .carts import get_cart_backend, purge_carts
+
+logger = logging.getLogger(__name__)
+
+
+# Write-behind of the carts kept in Redis: writes the carts changed since the previous run to the database. Scheduled in "CELERY_BEAT_SCHEDULE".
+@shared_task
+def persist_carts():
+    return get_cart_backend().persist_changed(getattr(settings, "STORE_CART_PERSIST_BATCH_SIZE", 500))
+
+
+# Deletes the carts that were never checked out, "STORE_ABANDONED_CART_AGE" seconds after they were created. Scheduled in "CELERY_BEAT_SCHEDULE".
+@shared_task
+def purge_abandoned_carts():
+    created_before = timezone.now() - timedelta(seconds=settings.STORE_ABANDONED_CART_AGE)
+    carts, items = purge_carts(created_before, getattr(settings, "STORE_ABANDONED_CART_BATCH_SIZE", 1000))
+    logger.info("Purged %s abandoned carts with %s items", carts, items)
+    return {"carts": carts, "items": items}
+
+
+# Sends the events of the outbox (store/outbox.py) to the receivers of their signals. Queued after each commit that published an event, and also
+# scheduled in "CELERY_BEAT_SCHEDULE".
+@shared_task
+def relay_outbox():
+    return outbox.relay(getattr(settings, "STORE_OUTBOX_BATCH_SIZE", 100))
+
+
+# Rolls up the orders placed until "STORE_SALES_ROLLUP_DELAY" seconds ago into the daily sales rollups (store/rollups.py), and computes the days
+# whose orders changed again. Scheduled in "CELERY_BEAT_SCHEDULE".
+@shared_task
+def update_sales_rollups():
+    until = timezone.now() - timedelta(seconds=getattr(settings, "STORE_SALES_ROLLUP_DELAY", 5 * 60))
+    watermark, days = rollups.update(until)
+    logger.info("Rolled up sales until %s, computed %s dirty days again", watermark, days)
+    return {"until": watermark.isoformat() if watermark else None, "dirty_days": days}
+
+
+# Moves the completed orders placed more than "STORE_ORDER_ARCHIVE_AGE" seconds ago to the archive (store/archive.py). Scheduled in
+# "CELERY_BEAT_SCHEDULE".
+@shared_task
+def archive_orders():
+    placed_before = timezone.now() - timedelta(seconds=settings.STORE_ORDER_ARCHIVE_AGE)
+    orders, items = archive.archive_orders(placed_before, getattr(settings, "STORE_ORDER_ARCHIVE_BATCH_SIZE", 1000))
+    logger.info("Archived %s orders with %s items", orders, items)
+    return {"orders": orders, "items": items}
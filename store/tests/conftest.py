@@ -1,9 +1,14 @@
 # Special file for pytest. Fixtures and reuseable functions defined here, pytest will automatically load them, without explicitly loading this module every time.
 
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from model_bakery import baker
 from rest_framework.test import APIClient
 import pytest
 
+from store.models import Customer
+
 
 @pytest.fixture  # Applying the fixture decorator to make this function a fixture
 def api_client():  # Function for importing the APIclient class.
@@ -17,3 +22,18 @@ def authenticate(api_client):  # Takes api_client for posting purposes.
         # Creating an User object to avoid importing User class in every test module. The value of is_staff is set to what is received in the inner function.
         return api_client.force_authenticate(user=User(is_staff=is_staff))
     return do_authenticate
+
+
+@pytest.fixture
+def customer():
+    # Customers are created by a signal when a user is saved, so a user is made and its customer is returned.
+    user = baker.make(settings.AUTH_USER_MODEL)
+    return Customer.objects.get(user=user)
+
+
+# The database is rolled back after every test, but the cache isn't. Clearing it keeps what a test cached, like the customer id of a user whose id
+# the next test reuses, from leaking into other tests.
+@pytest.fixture(autouse=True)
+def clear_cache():
+    yield
+    cache.clear()
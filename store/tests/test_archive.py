@@ -0,0 +1,108 @@
+from datetime import timedelta
+from decimal import Decimal
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.utils import timezone
+from model_bakery import baker
+from rest_framework import status
+
+from store.models import ArchivedOrder, ArchivedOrderItem, CustomerSummary, DailySales, Order, OrderItem, Product
+from store.tasks import archive_orders, update_sales_rollups
+
+
+@pytest.fixture
+def place_order(customer):
+    # An order of 2 items, placed "days_ago" days ago.
+    def do_place_order(days_ago, payment_status=Order.PAYMENT_STATUS_COMPLETE):
+        order = Order.objects.create(customer=customer, payment_status=payment_status)
+        OrderItem.objects.bulk_create([OrderItem(order=order, product=product, quantity=2, unit_price=Decimal('3.00'))
+                                       for product in baker.make(Product, _quantity=2)])
+        Order.objects.filter(pk=order.pk).update(placed_at=timezone.now() - timedelta(days=days_ago))
+        order.refresh_from_db()
+        return order
+    return do_place_order
+
+
+@pytest.fixture
+def archive(settings):
+    settings.STORE_ORDER_ARCHIVE_AGE = 30 * 24 * 60 * 60
+    settings.STORE_ORDER_ARCHIVE_BATCH_SIZE = 2
+    return archive_orders
+
+
+@pytest.mark.django_db
+class TestArchiveOrders:
+    def test_if_completed_orders_are_old_moves_them_in_batches(self, archive, place_order):
+        old = [place_order(days_ago=40 + day) for day in range(3)]
+        pending = place_order(days_ago=40, payment_status=Order.PAYMENT_STATUS_PENDING)
+        new = place_order(days_ago=1)
+
+        archived = archive()
+
+        assert archived == {'orders': 3, 'items': 6}
+        assert sorted(Order.objects.values_list('id', flat=True)) == sorted([pending.id, new.id])
+        assert sorted(ArchivedOrder.objects.values_list('id', 'placed_at', 'payment_status', 'customer_id')) == sorted(
+            (order.id, order.placed_at, order.payment_status, order.customer_id) for order in old)
+        assert sorted(ArchivedOrderItem.objects.values_list('order_id', 'quantity', 'unit_price')) == sorted(
+            (order.id, 2, Decimal('3.00')) for order in old for _ in range(2))
+        assert not OrderItem.objects.filter(order_id__in=[order.id for order in old]).exists()
+
+    def test_if_orders_are_archived_keeps_history_and_rollups(self, settings, archive, customer, place_order):
+        settings.STORE_SALES_ROLLUP_DELAY = 0
+        order = place_order(days_ago=40)
+        day = timezone.localdate(order.placed_at)
+        archive()
+
+        call_command('rebuild_customer_summaries')
+        update_sales_rollups()
+
+        summary = CustomerSummary.objects.get(customer=customer)
+        assert (summary.orders_count, summary.total_spent, summary.last_order_at) == (1, Decimal('12.00'), order.placed_at)
+        assert list(DailySales.objects.values_list('day', 'payment_status', 'units', 'revenue')) == [(day, 'C', 4, Decimal('12.00'))]
+
+
+@pytest.mark.django_db
+class TestArchivedOrderReads:
+    def test_if_order_is_archived_retrieves_it_from_archive(self, api_client, archive, customer, place_order):
+        order = place_order(days_ago=40)
+        archive()
+        api_client.force_authenticate(user=customer.user)
+
+        response = api_client.get(f'/store/orders/{order.id}/')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['id'] == order.id
+        assert len(response.data['items']) == 2
+
+    def test_if_order_is_of_another_customer_returns_404(self, api_client, archive, place_order):
+        order = place_order(days_ago=40)
+        archive()
+        api_client.force_authenticate(user=baker.make(get_user_model()))
+
+        response = api_client.get(f'/store/orders/{order.id}/')
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_if_archived_orders_are_listed_returns_newest_first(self, api_client, archive, customer, place_order):
+        orders = [place_order(days_ago=40 + day) for day in range(3)]
+        place_order(days_ago=1)
+        archive()
+        api_client.force_authenticate(user=customer.user)
+
+        response = api_client.get('/store/orders/archived/')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [order['id'] for order in response.data['results']] == [order.id for order in orders]
+
+    def test_if_product_has_archived_orders_returns_405(self, api_client, archive, place_order):
+        order = place_order(days_ago=40)
+        archive()
+        product = ArchivedOrderItem.objects.filter(order_id=order.id).first().product
+        api_client.force_authenticate(user=baker.make(get_user_model(), is_staff=True))
+
+        response = api_client.delete(f'/store/products/{product.id}/')
+
+        assert response.status_code == status.HTTP_405_METHOD_NOT_ALLOWED
+        assert Product.objects.filter(pk=product.id).exists()
@@ -0,0 +1,76 @@
+import pytest
+from model_bakery import baker
+from rest_framework import status
+from store.models import Collection, Product
+
+
+@pytest.mark.django_db
+class TestProductResponseCache:
+    def test_if_product_is_retrieved_twice_second_response_is_cached(self, api_client, django_assert_num_queries):
+        product = baker.make(Product)
+        api_client.get(f'/store/products/{product.id}/')
+
+        # Only the "Last-Modified" lookup of the conditional request support, no product or image queries.
+        with django_assert_num_queries(1):
+            response = api_client.get(f'/store/products/{product.id}/')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['id'] == product.id
+
+    def test_if_product_is_updated_returns_new_data(self, api_client):
+        product = baker.make(Product, title='a')
+        api_client.get(f'/store/products/{product.id}/')
+
+        product.title = 'b'
+        product.save()
+        response = api_client.get(f'/store/products/{product.id}/')
+
+        assert response.data['title'] == 'b'
+
+    def test_if_id_is_zero_padded_returns_new_data(self, api_client):
+        product = baker.make(Product, title='a')
+        api_client.get(f'/store/products/0{product.id}/')
+        api_client.get(f'/store/products/?collection_id=0{product.collection_id}')
+
+        product.title = 'b'
+        product.save()
+        response = api_client.get(f'/store/products/0{product.id}/')
+        products = api_client.get(f'/store/products/?collection_id=0{product.collection_id}')
+
+        assert response.data['title'] == 'b'
+        assert products.data['results'][0]['title'] == 'b'
+
+    def test_if_product_moves_collection_returns_it_in_new_collection_list(self, api_client):
+        old_collection, new_collection = baker.make(Collection, _quantity=2)
+        product = baker.make(Product, collection=old_collection)
+        api_client.get(f'/store/products/?collection_id={old_collection.id}')
+        api_client.get(f'/store/products/?collection_id={new_collection.id}')
+
+        product.collection = new_collection
+        product.save()
+        old = api_client.get(f'/store/products/?collection_id={old_collection.id}')
+        new = api_client.get(f'/store/products/?collection_id={new_collection.id}')
+
+        assert old.data['results'] == []
+        assert [p['id'] for p in new.data['results']] == [product.id]
+
+    def test_if_query_params_are_reordered_uses_same_entry(self, api_client, django_assert_num_queries):
+        collection = baker.make(Collection)
+        baker.make(Product, collection=collection, unit_price=5)
+        api_client.get(f'/store/products/?collection_id={collection.id}&unit_price__gt=1')
+
+        # Only the validation of the collection by the filter and the "ETag" aggregate, no product or image queries.
+        with django_assert_num_queries(2):
+            api_client.get(f'/store/products/?unit_price__gt=1&collection_id={collection.id}')
+
+
+@pytest.mark.django_db
+class TestCollectionResponseCache:
+    def test_if_product_is_added_returns_new_products_count(self, api_client):
+        collection = baker.make(Collection)
+        api_client.get(f'/store/collections/{collection.id}/')
+
+        baker.make(Product, collection=collection)
+        response = api_client.get(f'/store/collections/{collection.id}/')
+
+        assert response.data['products_count'] == 1
@@ -0,0 +1,263 @@
+from datetime import timedelta
+from decimal import Decimal
+
+import pytest
+from model_bakery import baker
+from django.utils import timezone
+from rest_framework import status
+
+from store.carts import get_cart_backend
+from store.models import Cart, CartItem, Order, Product
+from store.tasks import persist_carts, purge_abandoned_carts
+
+
+@pytest.fixture
+def redis_carts(settings):
+    settings.STORE_CART_BACKEND = 'store.carts.RedisCartBackend'
+    backend = get_cart_backend()
+    try:
+        backend.client.ping()
+    except Exception:
+        # E.g. the tests run with a cache that isn't Redis.
+        pytest.skip('Redis is not available')
+    yield backend
+    for key in backend.client.scan_iter(f'{backend.key_prefix}:*'):
+        backend.client.delete(key)
+
+
+# Runs each test with both backends.
+@pytest.fixture(params=['database', 'redis'])
+def cart_backend(request):
+    if request.param == 'redis':
+        request.getfixturevalue('redis_carts')
+
+
+@pytest.fixture
+def products():
+    return [baker.make(Product, unit_price=Decimal(price)) for price in ('2.50', '10.00')]
+
+
+@pytest.fixture
+def create_cart(api_client):
+    def do_create_cart(*items):
+        cart_id = api_client.post('/store/carts/').data['id']
+        for product, quantity in items:
+            api_client.post(f'/store/carts/{cart_id}/items/', {'product_id': product.id, 'quantity': quantity})
+        return cart_id
+    return do_create_cart
+
+
+@pytest.mark.django_db
+class TestCarts:
+    def test_if_cart_is_created_returns_201(self, api_client, cart_backend):
+        response = api_client.post('/store/carts/')
+
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.data['items'] == []
+        assert response.data['total_price'] == 0
+
+    def test_if_product_is_added_twice_adds_up_quantity(self, api_client, cart_backend, products, create_cart):
+        cart_id = create_cart((products[0], 2))
+
+        response = api_client.post(f'/store/carts/{cart_id}/items/', {'product_id': products[0].id, 'quantity': 3})
+
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.data['product_id'] == products[0].id
+        assert response.data['quantity'] == 5
+
+    def test_if_cart_is_retrieved_returns_items_and_total(self, api_client, cart_backend, products, create_cart):
+        cart_id = create_cart((products[0], 2), (products[1], 1))
+
+        response = api_client.get(f'/store/carts/{cart_id}/')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [(item['product']['id'], item['quantity'], item['total_price']) for item in response.data['items']] == [
+            (products[0].id, 2, Decimal('5.00')), (products[1].id, 1, Decimal('10.00'))]
+        assert response.data['total_price'] == Decimal('15.00')
+
+    def test_if_product_does_not_exist_returns_400(self, api_client, cart_backend, create_cart):
+        cart_id = create_cart()
+
+        response = api_client.post(f'/store/carts/{cart_id}/items/', {'product_id': 0, 'quantity': 1})
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_if_cart_does_not_exist_returns_404(self, api_client, cart_backend, products):
+        response = api_client.post('/store/carts/00000000-0000-0000-0000-000000000000/items/', {'product_id': products[0].id, 'quantity': 1})
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_if_items_are_added_in_batch_returns_201(self, api_client, cart_backend, products, create_cart):
+        cart_id = create_cart((products[0], 1))
+
+        response = api_client.post(f'/store/carts/{cart_id}/items/batch/', {'items': [
+            {'product_id': products[0].id, 'quantity': 2}, {'product_id': products[1].id, 'quantity': 3},
+            {'product_id': products[1].id, 'quantity': 1}]}, format='json')
+        cart = api_client.get(f'/store/carts/{cart_id}/')
+
+        assert response.status_code == status.HTTP_201_CREATED
+        assert [(item['product_id'], item['quantity']) for item in response.data['items']] == [(products[0].id, 3), (products[1].id, 4)]
+        assert [(item['product']['id'], item['quantity']) for item in cart.data['items']] == [(products[0].id, 3), (products[1].id, 4)]
+
+    def test_if_batch_has_unknown_product_adds_nothing(self, api_client, cart_backend, products, create_cart):
+        cart_id = create_cart()
+
+        response = api_client.post(f'/store/carts/{cart_id}/items/batch/', {'items': [
+            {'product_id': products[0].id, 'quantity': 2}, {'product_id': 0, 'quantity': 1}]}, format='json')
+        cart = api_client.get(f'/store/carts/{cart_id}/')
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.data['items'][0] == {}
+        assert 'product_id' in response.data['items'][1]
+        assert cart.data['items'] == []
+
+    def test_if_item_is_updated_and_removed_returns_new_items(self, api_client, cart_backend, products, create_cart):
+        cart_id = create_cart((products[0], 2), (products[1], 1))
+        items = api_client.get(f'/store/carts/{cart_id}/items/').data
+
+        updated = api_client.patch(f'/store/carts/{cart_id}/items/{items[0]["id"]}/', {'quantity': 7})
+        deleted = api_client.delete(f'/store/carts/{cart_id}/items/{items[1]["id"]}/')
+        response = api_client.get(f'/store/carts/{cart_id}/items/')
+
+        assert updated.data == {'quantity': 7}
+        assert deleted.status_code == status.HTTP_204_NO_CONTENT
+        assert [(item['product']['id'], item['quantity']) for item in response.data] == [(products[0].id, 7)]
+
+    def test_if_cart_is_deleted_returns_404(self, api_client, cart_backend, products, create_cart):
+        cart_id = create_cart((products[0], 1))
+
+        deleted = api_client.delete(f'/store/carts/{cart_id}/')
+        response = api_client.get(f'/store/carts/{cart_id}/')
+
+        assert deleted.status_code == status.HTTP_204_NO_CONTENT
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_if_cart_is_checked_out_creates_order(self, api_client, cart_backend, customer, products, create_cart,
+                                                  django_capture_on_commit_callbacks):
+        cart_id = create_cart((products[0], 2), (products[1], 1))
+        api_client.force_authenticate(user=customer.user)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            response = api_client.post('/store/orders/', {'cart_id': cart_id})
+
+        order = Order.objects.get(pk=response.data['id'])
+        assert response.status_code == status.HTTP_200_OK
+        assert sorted(order.items.values_list('product_id', 'quantity')) == [(products[0].id, 2), (products[1].id, 1)]
+        assert api_client.get(f'/store/carts/{cart_id}/').status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db
+class TestDatabaseCarts:
+    def test_if_item_is_added_runs_one_query(self, api_client, products, create_cart, django_assert_num_queries):
+        cart_id = create_cart((products[0], 1))
+
+        with django_assert_num_queries(1):
+            response = api_client.post(f'/store/carts/{cart_id}/items/', {'product_id': products[0].id, 'quantity': 2})
+
+        assert response.data['quantity'] == 3
+        assert CartItem.objects.get().quantity == 3
+
+    def test_if_cart_is_retrieved_computes_totals_in_two_queries(self, api_client, products, create_cart, django_assert_num_queries):
+        cart_id = create_cart((products[0], 3), (products[1], 2))
+
+        # The cart with its total, and the items with theirs and their products.
+        with django_assert_num_queries(2):
+            response = api_client.get(f'/store/carts/{cart_id}/')
+
+        assert [item['total_price'] for item in response.data['items']] == [Decimal('7.50'), Decimal('20.00')]
+        assert response.data['total_price'] == Decimal('27.50')
+
+
+@pytest.mark.django_db
+class TestRedisCarts:
+    def test_if_items_are_added_writes_nothing_to_database(self, redis_carts, products, create_cart):
+        create_cart((products[0], 2))
+
+        assert not Cart.objects.exists()
+        assert not CartItem.objects.exists()
+
+    def test_if_carts_are_persisted_writes_changed_carts(self, api_client, redis_carts, products, create_cart):
+        cart_id = create_cart((products[0], 2), (products[1], 1))
+        create_cart()
+
+        persisted = persist_carts()
+        api_client.post(f'/store/carts/{cart_id}/items/', {'product_id': products[1].id, 'quantity': 1})
+        persist_carts()
+
+        # The empty cart was never changed, so it isn't written.
+        assert persisted == 1
+        assert [str(pk) for pk in Cart.objects.values_list('id', flat=True)] == [cart_id]
+        assert sorted(CartItem.objects.values_list('product_id', 'quantity')) == [(products[0].id, 2), (products[1].id, 2)]
+
+    def test_if_cart_is_only_in_database_loads_it(self, api_client, redis_carts, products):
+        cart = baker.make(Cart)
+        baker.make(CartItem, cart=cart, product=products[1], quantity=3)
+
+        response = api_client.get(f'/store/carts/{cart.id}/')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [(item['id'], item['quantity']) for item in response.data['items']] == [(products[1].id, 3)]
+        assert redis_carts.read(cart.id)[1] == {products[1].id: 3}
+
+    def test_if_quantity_goes_over_limit_returns_400(self, api_client, redis_carts, products, create_cart):
+        cart_id = create_cart((products[0], 30000))
+
+        response = api_client.post(f'/store/carts/{cart_id}/items/', {'product_id': products[0].id, 'quantity': 5000})
+        batch = api_client.post(f'/store/carts/{cart_id}/items/batch/', {'items': [
+            {'product_id': products[1].id, 'quantity': 1}, {'product_id': products[0].id, 'quantity': 5000}]}, format='json')
+        persist_carts()
+
+        assert response.status_code == batch.status_code == status.HTTP_400_BAD_REQUEST
+        assert redis_carts.read(cart_id)[1] == {products[0].id: 30000}
+        assert list(CartItem.objects.values_list('product_id', 'quantity')) == [(products[0].id, 30000)]
+
+    def test_if_cart_is_checked_out_while_persisted_does_not_write_it_back(self, monkeypatch, api_client, redis_carts, customer, products,
+                                                                            create_cart, django_capture_on_commit_callbacks):
+        cart_id = create_cart((products[0], 2))
+        api_client.force_authenticate(user=customer.user)
+        read = redis_carts.read
+        responses = []
+
+        # The task reads the cart, and the checkout runs before the task writes it. The checkout reads the cart too, without checking out again.
+        def read_then_check_out(cart_id):
+            cart = read(cart_id)
+            monkeypatch.setattr(redis_carts, 'read', read)
+            responses.append(api_client.post('/store/orders/', {'cart_id': str(cart_id)}))
+            return cart
+        monkeypatch.setattr(redis_carts, 'read', read_then_check_out)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            persist_carts()
+
+        assert responses[0].status_code == status.HTTP_200_OK
+        assert not Cart.objects.exists()
+        assert not CartItem.objects.exists()
+
+    def test_if_checkout_fails_cart_is_persisted_again(self, api_client, redis_carts, customer, products, create_cart):
+        cart_id = create_cart()
+        api_client.force_authenticate(user=customer.user)
+
+        response = api_client.post('/store/orders/', {'cart_id': cart_id})
+        api_client.post(f'/store/carts/{cart_id}/items/', {'product_id': products[0].id, 'quantity': 1})
+        persist_carts()
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert [str(pk) for pk in Cart.objects.values_list('id', flat=True)] == [cart_id]
+
+
+@pytest.mark.django_db
+class TestPurgeAbandonedCarts:
+    def test_if_carts_are_old_deletes_them_in_batches(self, settings, products):
+        settings.STORE_ABANDONED_CART_AGE = 24 * 60 * 60
+        settings.STORE_ABANDONED_CART_BATCH_SIZE = 2
+        old = baker.make(Cart, _quantity=5)
+        for cart in old:
+            baker.make(CartItem, cart=cart, product=products[0], quantity=1)
+        Cart.objects.filter(pk__in=[cart.pk for cart in old]).update(created_at=timezone.now() - timedelta(days=2))
+        new = baker.make(Cart)
+
+        purged = purge_abandoned_carts()
+
+        assert purged == {'carts': 5, 'items': 5}
+        assert list(Cart.objects.values_list('id', flat=True)) == [new.id]
+        assert not CartItem.objects.exists()
@@ -10,7 +10,12 @@ from model_bakery import baker
 import pytest  # For access to decorator "django.db" for testing.
 
 # For testing if collections exists so they can be retrieved.
-from store.models import Collection
+from store.models import Collection, Product
+
+from io import StringIO
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
 '''
 Commands for testing with pytest:
@@ -106,3 +111,48 @@ class TestRetrieveCollection:
             'title': collection.title,
             'products_count': 0
         }
+
+
+@pytest.mark.django_db
+class TestProductsCount:
+    def test_if_products_are_added_and_deleted_count_follows(self, api_client):
+        collection = baker.make(Collection)
+        products = baker.make(Product, collection=collection, _quantity=3)
+        products[0].delete()
+
+        response = api_client.get(f'/store/collections/{collection.id}/')
+
+        assert response.data['products_count'] == 2
+
+    def test_if_product_moves_both_counts_change(self):
+        old_collection, new_collection = baker.make(Collection, _quantity=2)
+        product = baker.make(Product, collection=old_collection)
+
+        product.collection = new_collection
+        product.save()
+        old_collection.refresh_from_db()
+        new_collection.refresh_from_db()
+
+        assert old_collection.products_count == 0
+        assert new_collection.products_count == 1
+
+    def test_if_collections_are_listed_products_are_not_counted(self, api_client):
+        baker.make(Product, _quantity=2)
+
+        with CaptureQueriesContext(connection) as context:
+            api_client.get('/store/collections/')
+
+        # The count used to be a "GROUP BY" join of collections and products.
+        assert not any('GROUP BY' in query['sql'] for query in context.captured_queries)
+
+    def test_if_counts_drift_repair_command_fixes_them(self):
+        collection = baker.make(Collection)
+        baker.make(Product, collection=collection, _quantity=2)
+        Collection.objects.filter(pk=collection.pk).update(products_count=7)
+        stdout = StringIO()
+
+        call_command('repair_products_count', '--batch-size', '1', stdout=stdout)
+        collection.refresh_from_db()
+
+        assert collection.products_count == 2
+        assert 'fixed 1' in stdout.getvalue()
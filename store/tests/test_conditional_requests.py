@@ -0,0 +1,104 @@
+import pytest
+from model_bakery import baker
+from rest_framework import status
+from store.models import Collection, Product
+
+
+@pytest.mark.django_db
+class TestConditionalProductRequests:
+    def test_if_product_is_retrieved_returns_validators(self, api_client):
+        product = baker.make(Product)
+
+        response = api_client.get(f'/store/products/{product.id}/')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response['ETag'].startswith('W/"')
+        assert 'Last-Modified' in response
+
+    def test_if_etag_matches_returns_304_with_a_single_query(self, api_client, django_assert_num_queries):
+        product = baker.make(Product)
+        etag = api_client.get(f'/store/products/{product.id}/')['ETag']
+
+        with django_assert_num_queries(1):
+            response = api_client.get(
+                f'/store/products/{product.id}/', HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert response['ETag'] == etag
+
+    def test_if_product_is_updated_returns_200(self, api_client):
+        product = baker.make(Product, title='a')
+        etag = api_client.get(f'/store/products/{product.id}/')['ETag']
+
+        product.title = 'b'
+        product.save()
+        response = api_client.get(
+            f'/store/products/{product.id}/', HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['title'] == 'b'
+
+    def test_if_list_is_unchanged_returns_304(self, api_client):
+        baker.make(Product, _quantity=2)
+        etag = api_client.get('/store/products/')['ETag']
+
+        response = api_client.get('/store/products/', HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    def test_if_product_is_deleted_list_returns_200(self, api_client):
+        first, second = baker.make(Product, _quantity=2)
+        etag = api_client.get('/store/products/')['ETag']
+
+        Product.objects.filter(pk=first.id).delete()
+        response = api_client.get('/store/products/', HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == status.HTTP_200_OK
+
+    def test_if_list_is_retrieved_returns_no_last_modified(self, api_client):
+        baker.make(Product, _quantity=2)
+
+        response = api_client.get('/store/products/')
+
+        assert response['ETag'].startswith('W/"')
+        assert 'Last-Modified' not in response
+
+    def test_if_older_product_is_deleted_list_with_if_modified_since_returns_200(self, api_client):
+        first, second = baker.make(Product, _quantity=2)
+        last_modified = api_client.get(f'/store/products/{second.id}/')['Last-Modified']
+
+        Product.objects.filter(pk=first.id).delete()
+        response = api_client.get('/store/products/', HTTP_IF_MODIFIED_SINCE=last_modified)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.data['results']) == 1
+
+    def test_if_query_params_differ_etags_differ(self, api_client):
+        baker.make(Product, _quantity=2)
+
+        first = api_client.get('/store/products/?ordering=unit_price')['ETag']
+        second = api_client.get('/store/products/?ordering=-unit_price')['ETag']
+
+        assert first != second
+
+
+@pytest.mark.django_db
+class TestConditionalCollectionRequests:
+    def test_if_product_is_added_to_collection_returns_200(self, api_client):
+        collection = baker.make(Collection)
+        etag = api_client.get(f'/store/collections/{collection.id}/')['ETag']
+
+        baker.make(Product, collection=collection)
+        response = api_client.get(
+            f'/store/collections/{collection.id}/', HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['products_count'] == 1
+
+    def test_if_collections_are_unchanged_returns_304(self, api_client):
+        baker.make(Collection)
+        etag = api_client.get('/store/collections/')['ETag']
+
+        response = api_client.get('/store/collections/', HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
@@ -0,0 +1,130 @@
+from decimal import Decimal
+
+import pytest
+from django.conf import settings
+from django.core.management import call_command
+from model_bakery import baker
+from rest_framework import status
+
+from store.models import CustomerProductSummary, CustomerSummary, Order, OrderItem, Product
+
+
+@pytest.fixture
+def products():
+    return baker.make(Product, _quantity=3)
+
+
+@pytest.fixture
+def place_order(customer):
+    # Items are "(product, quantity, unit price)" tuples.
+    def do_place_order(*items, payment_status=Order.PAYMENT_STATUS_PENDING):
+        order = Order.objects.create(customer=customer)
+        for product, quantity, unit_price in items:
+            baker.make(OrderItem, order=order, product=product, quantity=quantity, unit_price=Decimal(unit_price))
+        if payment_status != order.payment_status:
+            order.payment_status = payment_status
+            order.save()
+        return order
+    return do_place_order
+
+
+@pytest.fixture
+def get_history(api_client):
+    api_client.force_authenticate(user=baker.make(settings.AUTH_USER_MODEL, is_staff=True, is_superuser=True))
+
+    def do_get_history(customer_id):
+        return api_client.get(f'/store/customers/{customer_id}/history/')
+    return do_get_history
+
+
+@pytest.mark.django_db
+class TestCustomerHistory:
+    def test_if_orders_are_placed_and_paid_returns_summary(self, get_history, customer, products, place_order):
+        place_order((products[0], 2, '5.00'), (products[1], 1, '3.00'), payment_status=Order.PAYMENT_STATUS_COMPLETE)
+        place_order((products[1], 4, '3.00'), payment_status=Order.PAYMENT_STATUS_COMPLETE)
+        last = place_order((products[2], 9, '1.00'))
+
+        response = get_history(customer.id)
+
+        assert response.status_code == status.HTTP_200_OK
+        # Every order is counted, but only the paid ones are spent and bought.
+        assert response.data['orders_count'] == 3
+        assert response.data['total_spent'] == Decimal('25.00')
+        assert response.data['last_order_at'] == last.placed_at.isoformat().replace('+00:00', 'Z')
+        assert [(product['product']['id'], product['quantity']) for product in response.data['top_products']] == [
+            (products[1].id, 5), (products[0].id, 2)]
+
+    def test_if_payment_is_no_longer_complete_takes_order_away(self, get_history, customer, products, place_order):
+        order = place_order((products[0], 2, '5.00'), payment_status=Order.PAYMENT_STATUS_COMPLETE)
+
+        order.payment_status = Order.PAYMENT_STATUS_FAILED
+        order.save()
+        response = get_history(customer.id)
+
+        assert response.data['orders_count'] == 1
+        assert response.data['total_spent'] == Decimal('0.00')
+        assert response.data['top_products'] == []
+
+    def test_if_order_is_deleted_uncounts_it(self, customer, place_order):
+        first = place_order()
+        place_order().delete()
+
+        summary = CustomerSummary.objects.get(customer=customer)
+
+        assert summary.orders_count == 1
+        assert summary.last_order_at == first.placed_at
+
+    def test_if_customer_has_no_orders_returns_empty_summary(self, get_history, customer):
+        response = get_history(customer.id)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data == {'customer_id': customer.id, 'orders_count': 0, 'total_spent': Decimal('0.00'),
+                                  'last_order_at': None, 'top_products': []}
+
+    def test_if_customer_does_not_exist_returns_404(self, get_history):
+        response = get_history(0)
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_if_customer_id_is_not_a_number_returns_404(self, get_history):
+        response = get_history('abc')
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_if_history_is_read_runs_two_queries(self, get_history, customer, products, place_order, django_assert_num_queries):
+        for _ in range(5):
+            place_order((products[0], 1, '5.00'), (products[1], 2, '3.00'), payment_status=Order.PAYMENT_STATUS_COMPLETE)
+
+        # The summary, and the top products with their products.
+        with django_assert_num_queries(2):
+            response = get_history(customer.id)
+
+        assert response.data['orders_count'] == 5
+
+    def test_if_user_is_not_permitted_returns_403(self, api_client, customer):
+        api_client.force_authenticate(user=baker.make(settings.AUTH_USER_MODEL, is_staff=True))
+
+        response = api_client.get(f'/store/customers/{customer.id}/history/')
+
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+
+@pytest.mark.django_db
+class TestRebuildCustomerSummaries:
+    @pytest.mark.parametrize('chunk_size', [1, 1000])
+    def test_if_summaries_drifted_rebuilds_them(self, customer, products, place_order, chunk_size):
+        place_order((products[0], 2, '5.00'), payment_status=Order.PAYMENT_STATUS_COMPLETE)
+        place_order((products[0], 1, '5.00'), (products[2], 3, '2.00'), payment_status=Order.PAYMENT_STATUS_COMPLETE)
+        other = baker.make(settings.AUTH_USER_MODEL).customer
+        expected = list(CustomerSummary.objects.filter(customer=customer).values())
+        expected_products = sorted(CustomerProductSummary.objects.values_list('customer_id', 'product_id', 'quantity'))
+        # E.g. orders changed with "QuerySet.update()", which doesn't send signals.
+        CustomerSummary.objects.update(orders_count=0, total_spent=0)
+        CustomerProductSummary.objects.all().delete()
+
+        call_command('rebuild_customer_summaries', chunk_size=chunk_size)
+
+        assert list(CustomerSummary.objects.filter(customer=customer).values()) == expected
+        assert expected[0]['total_spent'] == Decimal('21.00')
+        assert sorted(CustomerProductSummary.objects.values_list('customer_id', 'product_id', 'quantity')) == expected_products
+        assert CustomerSummary.objects.get(customer=other).orders_count == 0
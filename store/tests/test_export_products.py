@@ -0,0 +1,90 @@
+import csv
+import json
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from model_bakery import baker
+from rest_framework import status
+
+from store.models import Collection, Product, ProductImage
+from store.views import ProductViewSet
+
+
+def read_content(response):
+    return b''.join(response.streaming_content).decode()
+
+
+@pytest.mark.django_db
+class TestExportProducts:
+    def test_if_format_is_ndjson_returns_every_product(self, api_client):
+        collection = baker.make(Collection, title='Kitchen')
+        products = baker.make(Product, collection=collection, _quantity=3)
+        baker.make(ProductImage, product=products[0], image='store/images/kettle.jpg')
+
+        response = api_client.get('/store/products/export/')
+        rows = [json.loads(line) for line in read_content(response).splitlines()]
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response['Content-Type'] == 'application/x-ndjson'
+        assert [row['id'] for row in rows] == [product.id for product in products]
+        assert rows[0]['collection'] == 'Kitchen'
+        assert rows[0]['images'] == ['http://testserver/media/store/images/kettle.jpg']
+        assert rows[1]['images'] == []
+
+    def test_if_format_is_csv_returns_header_and_rows(self, api_client):
+        baker.make(Product, _quantity=2)
+
+        response = api_client.get('/store/products/export/?export_format=csv')
+        rows = list(csv.DictReader(StringIO(read_content(response))))
+
+        assert response['Content-Type'] == 'text/csv'
+        assert len(rows) == 2
+        assert set(rows[0]) >= {'id', 'title', 'collection', 'images'}
+
+    def test_if_format_is_unknown_returns_400(self, api_client):
+        response = api_client.get('/store/products/export/?export_format=xml')
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_if_collection_is_filtered_returns_its_products_only(self, api_client):
+        collection = baker.make(Collection)
+        product = baker.make(Product, collection=collection)
+        baker.make(Product)
+
+        response = api_client.get(f'/store/products/export/?collection_id={collection.id}')
+        rows = [json.loads(line) for line in read_content(response).splitlines()]
+
+        assert [row['id'] for row in rows] == [product.id]
+
+    def test_if_catalog_spans_batches_runs_two_queries_per_batch(self, api_client, django_assert_num_queries, monkeypatch):
+        monkeypatch.setattr(ProductViewSet, 'export_batch_size', 2)
+        baker.make(Product, _quantity=5)
+
+        response = api_client.get('/store/products/export/')
+        # Products and images for 3 batches, and the query which finds no more products.
+        with django_assert_num_queries(7):
+            content = read_content(response)
+
+        assert len(content.splitlines()) == 5
+
+
+@pytest.mark.django_db
+class TestExportProductsCommand:
+    def test_if_output_is_a_file_writes_every_product(self, tmp_path):
+        baker.make(Product, _quantity=3)
+        path = tmp_path / 'products.csv'
+
+        call_command('export_products', '--format', 'csv', '--output', str(path), '--batch-size', '2')
+
+        with open(path, newline='') as file:
+            assert len(list(csv.DictReader(file))) == 3
+
+    def test_if_base_url_is_given_image_urls_are_absolute(self):
+        product = baker.make(Product)
+        baker.make(ProductImage, product=product, image='store/images/kettle.jpg')
+        stdout = StringIO()
+
+        call_command('export_products', '--base-url', 'https://example.com/', stdout=stdout)
+
+        assert json.loads(stdout.getvalue())['images'] == ['https://example.com/media/store/images/kettle.jpg']
@@ -0,0 +1,106 @@
+from decimal import Decimal
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from model_bakery import baker
+from rest_framework import status
+
+from store.models import Collection, Product
+
+
+@pytest.fixture
+def catalog():
+    kitchen = baker.make(Collection, title='Kitchen')
+    garden = baker.make(Collection, title='Garden')
+    for price in ['5', '15', '30']:
+        baker.make(Product, title=f'Kettle {price}', collection=kitchen, unit_price=Decimal(price))
+    baker.make(Product, title='Hose', collection=garden, unit_price=Decimal('150'))
+    return {'kitchen': kitchen, 'garden': garden}
+
+
+def count_queries(api_client, url):
+    with CaptureQueriesContext(connection) as context:
+        response = api_client.get(url)
+    return response, len(context.captured_queries)
+
+
+@pytest.mark.django_db
+class TestProductFacets:
+    def test_if_facets_are_not_requested_returns_no_facets(self, api_client, catalog):
+        response = api_client.get('/store/products/')
+
+        assert 'facets' not in response.data
+
+    def test_if_facets_are_requested_returns_collection_and_price_counts(self, api_client, catalog):
+        response = api_client.get('/store/products/?facets=true')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['facets']['collections'] == [
+            {'id': catalog['kitchen'].id, 'title': 'Kitchen', 'count': 3},
+            {'id': catalog['garden'].id, 'title': 'Garden', 'count': 1},
+        ]
+        assert response.data['facets']['price'] == [
+            {'min': None, 'max': '10', 'count': 1},
+            {'min': '10', 'max': '25', 'count': 1},
+            {'min': '25', 'max': '50', 'count': 1},
+            {'min': '50', 'max': '100', 'count': 0},
+            {'min': '100', 'max': None, 'count': 1},
+        ]
+
+    def test_if_list_is_filtered_counts_only_matching_products(self, api_client, catalog):
+        response = api_client.get('/store/products/?facets=true&unit_price__lt=20')
+
+        assert response.data['facets']['collections'] == [
+            {'id': catalog['kitchen'].id, 'title': 'Kitchen', 'count': 2}]
+
+    def test_if_price_buckets_are_sent_uses_them(self, api_client, catalog):
+        response = api_client.get('/store/products/?facets=true&price_buckets=20')
+
+        assert [bucket['count'] for bucket in response.data['facets']['price']] == [2, 2]
+
+    def test_if_price_buckets_are_invalid_returns_400(self, api_client, catalog):
+        response = api_client.get('/store/products/?facets=true&price_buckets=cheap')
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    @pytest.mark.parametrize('price_buckets', ['NaN', 'sNaN', 'Infinity', '10,-Infinity'])
+    def test_if_price_buckets_are_not_finite_returns_400(self, api_client, catalog, price_buckets):
+        response = api_client.get(f'/store/products/?facets=true&price_buckets={price_buckets}')
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_if_facets_are_requested_runs_one_more_query(self, api_client, catalog, settings):
+        settings.STORE_RESPONSE_CACHE_ENABLED = False
+
+        _, without_facets = count_queries(api_client, '/store/products/')
+        _, with_facets = count_queries(api_client, '/store/products/?facets=true')
+
+        assert with_facets == without_facets + 1
+
+    def test_if_only_page_or_ordering_changes_facets_come_from_cache(self, api_client, catalog):
+        api_client.get('/store/products/?facets=true')
+
+        _, without_facets = count_queries(api_client, '/store/products/?ordering=unit_price')
+        response, with_facets = count_queries(api_client, '/store/products/?facets=true&ordering=-unit_price')
+
+        assert with_facets == without_facets
+        assert response.data['facets']['collections'][0]['count'] == 3
+
+    def test_if_product_changes_facets_are_recomputed(self, api_client, catalog):
+        api_client.get('/store/products/?facets=true')
+
+        baker.make(Product, collection=catalog['garden'], unit_price=Decimal('60'))
+        response = api_client.get('/store/products/?facets=true')
+
+        assert response.data['facets']['price'][3]['count'] == 1
+
+
+# Committed data, like the other search tests.
+@pytest.mark.django_db(transaction=True)
+class TestProductFacetsWithSearch:
+    def test_if_search_is_sent_counts_only_matching_products(self, api_client, catalog):
+        response = api_client.get('/store/products/?facets=true&search=hose')
+
+        assert response.data['facets']['collections'] == [
+            {'id': catalog['garden'].id, 'title': 'Garden', 'count': 1}]
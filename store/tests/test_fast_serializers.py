@@ -0,0 +1,62 @@
+import pytest
+from model_bakery import baker
+from store.models import Cart, CartItem, Order, OrderItem, Product, ProductImage
+
+
+# Fetches the same URL with and without fast serializers, and returns both bodies. The response cache is turned off, so both are really rendered.
+@pytest.fixture
+def fetch_both(api_client, settings):
+    def do_fetch_both(url):
+        settings.STORE_RESPONSE_CACHE_ENABLED = False
+        settings.STORE_FAST_SERIALIZERS = False
+        slow = api_client.get(url)
+        settings.STORE_FAST_SERIALIZERS = True
+        fast = api_client.get(url)
+        assert slow.status_code == fast.status_code == 200
+        return slow.content, fast.content
+    return do_fetch_both
+
+
+@pytest.mark.django_db
+class TestFastSerializers:
+    def test_product_list_is_identical(self, fetch_both):
+        products = baker.make(Product, unit_price=19.99,
+                              description=None, _quantity=3)
+        baker.make(ProductImage, product=products[0],
+                   image='store/images/a.jpg', _quantity=2)
+
+        slow, fast = fetch_both('/store/products/?ordering=unit_price')
+
+        assert slow == fast
+
+    def test_product_list_with_page_numbers_is_identical(self, fetch_both):
+        baker.make(Product, _quantity=12)
+
+        slow, fast = fetch_both('/store/products/?page=2')
+
+        assert slow == fast
+
+    def test_cart_is_identical(self, fetch_both):
+        cart = baker.make(Cart)
+        baker.make(CartItem, cart=cart, quantity=3, product__unit_price=2.5)
+        baker.make(CartItem, cart=cart, quantity=1, product__unit_price=10)
+
+        slow, fast = fetch_both(f'/store/carts/{cart.id}/')
+
+        assert slow == fast
+
+    def test_empty_cart_is_identical(self, fetch_both):
+        cart = baker.make(Cart)
+
+        slow, fast = fetch_both(f'/store/carts/{cart.id}/')
+
+        assert slow == fast
+
+    def test_order_list_is_identical(self, authenticate, customer, fetch_both):
+        authenticate(is_staff=True)
+        order = baker.make(Order, customer=customer)
+        baker.make(OrderItem, order=order, unit_price=4.2, quantity=2, _quantity=2)
+
+        slow, fast = fetch_both('/store/orders/')
+
+        assert slow == fast
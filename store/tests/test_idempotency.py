@@ -0,0 +1,91 @@
+from decimal import Decimal
+
+import pytest
+from model_bakery import baker
+from rest_framework import status
+
+from store import idempotency
+from store.models import Cart, CartItem, Order, Product
+
+
+@pytest.fixture
+def product():
+    return baker.make(Product, unit_price=Decimal('2.50'))
+
+
+@pytest.fixture
+def add_item(api_client, product):
+    cart_id = api_client.post('/store/carts/').data['id']
+
+    def do_add_item(key, quantity=1):
+        return api_client.post(f'/store/carts/{cart_id}/items/', {'product_id': product.id, 'quantity': quantity},
+                               HTTP_IDEMPOTENCY_KEY=key)
+    do_add_item.cart_id = cart_id
+    return do_add_item
+
+
+@pytest.mark.django_db
+class TestIdempotency:
+    def test_if_checkout_is_retried_returns_first_order(self, api_client, customer, product):
+        cart = baker.make(Cart)
+        baker.make(CartItem, cart=cart, product=product, quantity=2)
+        api_client.force_authenticate(user=customer.user)
+
+        first = api_client.post('/store/orders/', {'cart_id': str(cart.id)}, HTTP_IDEMPOTENCY_KEY='checkout-1')
+        retry = api_client.post('/store/orders/', {'cart_id': str(cart.id)}, HTTP_IDEMPOTENCY_KEY='checkout-1')
+
+        assert first.status_code == retry.status_code == status.HTTP_200_OK
+        assert retry.data == first.data
+        assert retry['Idempotent-Replayed'] == 'true'
+        assert Order.objects.count() == 1
+
+    def test_if_item_is_added_again_with_same_key_adds_it_once(self, add_item):
+        add_item('add-1', quantity=2)
+        retry = add_item('add-1', quantity=2)
+        other = add_item('add-2', quantity=2)
+
+        assert retry.status_code == status.HTTP_201_CREATED
+        assert retry.data['quantity'] == 2
+        assert other.data['quantity'] == 4
+        assert CartItem.objects.get().quantity == 4
+
+    def test_if_key_is_reused_with_other_body_returns_422(self, add_item):
+        add_item('add-1', quantity=2)
+
+        response = add_item('add-1', quantity=3)
+
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+        assert CartItem.objects.get().quantity == 2
+
+    def test_if_request_is_invalid_replays_error(self, api_client, customer):
+        api_client.force_authenticate(user=customer.user)
+        missing = '00000000-0000-0000-0000-000000000000'
+
+        first = api_client.post('/store/orders/', {'cart_id': missing}, HTTP_IDEMPOTENCY_KEY='checkout-1')
+        retry = api_client.post('/store/orders/', {'cart_id': missing}, HTTP_IDEMPOTENCY_KEY='checkout-1')
+
+        assert first.status_code == retry.status_code == status.HTTP_400_BAD_REQUEST
+        assert retry['Idempotent-Replayed'] == 'true'
+
+    def test_if_first_request_is_in_progress_waits_for_it(self, monkeypatch, add_item):
+        first = add_item('add-1', quantity=2)
+        stored = idempotency.cache.get
+        # The first request still runs: its response isn't there at the first look, but is after a wait.
+        looks = []
+        monkeypatch.setattr(idempotency.cache, 'get', lambda key: stored(key) if looks else looks.append(key))
+        monkeypatch.setattr(idempotency.cache, 'add', lambda *args, **kwargs: False)
+        monkeypatch.setattr(idempotency.time, 'sleep', lambda seconds: None)
+
+        retry = add_item('add-1', quantity=2)
+
+        assert retry.data == first.data
+        assert CartItem.objects.get().quantity == 2
+
+    def test_if_first_request_takes_too_long_returns_409(self, settings, monkeypatch, add_item):
+        settings.STORE_IDEMPOTENCY_LOCK_TIMEOUT = 0
+        monkeypatch.setattr(idempotency.cache, 'add', lambda *args, **kwargs: False)
+
+        response = add_item('add-1')
+
+        assert response.status_code == status.HTTP_409_CONFLICT
+        assert not CartItem.objects.exists()
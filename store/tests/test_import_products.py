@@ -0,0 +1,111 @@
+import json
+from decimal import Decimal
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from model_bakery import baker
+
+from store.models import Collection, Product
+
+
+@pytest.fixture
+def import_products(tmp_path):
+    def do_import_products(name, content, *args):
+        path = tmp_path / name
+        path.write_text(content)
+        stdout, stderr = StringIO(), StringIO()
+        call_command('import_products', str(path), *args,
+                     stdout=stdout, stderr=stderr)
+        return stdout.getvalue(), stderr.getvalue()
+    return do_import_products
+
+
+CSV_HEADER = 'title,slug,description,unit_price,inventory,collection\n'
+
+
+def ndjson(*rows):
+    return ''.join(json.dumps(row) + '\n' for row in rows)
+
+
+@pytest.mark.django_db
+class TestImportProducts:
+    def test_if_csv_is_imported_creates_products_and_collections(self, import_products):
+        stdout, _ = import_products('products.csv', CSV_HEADER +
+                                    'Kettle,kettle,Boils water,19.99,5,Kitchen\n'
+                                    'Teapot,teapot,,9.50,3,Kitchen\n')
+
+        assert Product.objects.count() == 2
+        assert Collection.objects.get(title='Kitchen').products_count == 2
+        kettle = Product.objects.get(slug='kettle')
+        assert kettle.collection.title == 'Kitchen'
+        assert kettle.unit_price == Decimal('19.99')
+        assert '2 created' in stdout
+        assert 'rows/sec' in stdout
+
+    def test_if_slug_exists_updates_product(self, import_products):
+        collection = baker.make(Collection, title='Kitchen')
+        product = baker.make(Product, slug='kettle', title='Old',
+                             unit_price=Decimal('5'), collection=collection)
+
+        stdout, _ = import_products('products.ndjson', ndjson(
+            {'title': 'Kettle', 'slug': 'kettle', 'unit_price': '19.99', 'inventory': 5, 'collection': 'Garden'}))
+
+        product.refresh_from_db()
+        collection.refresh_from_db()
+        assert Product.objects.count() == 1
+        assert product.title == 'Kettle'
+        assert product.collection.title == 'Garden'
+        assert product.collection.products_count == 1
+        assert collection.products_count == 0
+        assert '1 updated' in stdout
+
+    def test_if_slug_is_repeated_last_row_wins(self, import_products):
+        import_products('products.ndjson', ndjson(
+            {'title': 'First', 'slug': 'kettle', 'unit_price': '1', 'inventory': 1, 'collection': 'Kitchen'},
+            {'title': 'Second', 'slug': 'kettle', 'unit_price': '2', 'inventory': 1, 'collection': 'Kitchen'}))
+
+        assert list(Product.objects.values_list('title', flat=True)) == ['Second']
+
+    def test_if_rows_are_invalid_skips_and_reports_them(self, import_products):
+        stdout, stderr = import_products('products.ndjson', ndjson(
+            {'title': 'Kettle', 'slug': 'kettle', 'unit_price': '0', 'inventory': 5, 'collection': 'Kitchen'},
+            {'title': 'Teapot', 'slug': 'teapot', 'unit_price': '9.50', 'inventory': 3, 'collection': 'Kitchen'}) + '{not json\n')
+
+        assert list(Product.objects.values_list('slug', flat=True)) == ['teapot']
+        assert '2 invalid' in stdout
+        assert 'Line 1' in stderr
+        assert 'Line 3' in stderr
+
+    def test_if_batches_are_small_imports_every_row(self, import_products):
+        rows = [{'title': f'Product {i}', 'slug': f'product-{i}', 'unit_price': '1', 'inventory': 1, 'collection': f'Collection {i % 3}'}
+                for i in range(25)]
+
+        import_products('products.ndjson', ndjson(*rows), '--batch-size', '4')
+
+        assert Product.objects.count() == 25
+        assert Collection.objects.filter(
+            title__startswith='Collection ').count() == 3
+
+    def test_if_product_is_imported_it_can_be_searched(self, api_client, import_products):
+        import_products('products.csv', CSV_HEADER +
+                        'Espresso machine,espresso,,99,1,Kitchen\n')
+
+        response = api_client.get('/store/products/?search=espresso')
+
+        assert [product['slug'] for product in response.data['results']] == ['espresso']
+
+
+# Committed data, so the worker threads, which have their own database connections, can see it.
+@pytest.mark.django_db(transaction=True)
+class TestImportProductsInParallel:
+    def test_if_workers_are_used_imports_every_row(self, import_products):
+        rows = [{'title': f'Product {i}', 'slug': f'product-{i % 40}', 'unit_price': str(i + 1), 'inventory': 1, 'collection': 'Kitchen'}
+                for i in range(100)]
+
+        import_products('products.ndjson', ndjson(*rows),
+                        '--batch-size', '7', '--workers', '3')
+
+        assert Product.objects.count() == 40
+        # Rows of the same slug are written in the order of the file.
+        assert Product.objects.get(slug='product-5').unit_price == 86
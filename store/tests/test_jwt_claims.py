@@ -0,0 +1,57 @@
+import pytest
+from rest_framework import status
+from rest_framework_simplejwt.tokens import AccessToken
+
+
+@pytest.fixture
+def login(api_client, customer):
+    customer.user.set_password('secret')
+    customer.user.save()
+
+    def do_login():
+        response = api_client.post('/auth/jwt/create/', {'username': customer.user.username, 'password': 'secret'})
+        assert response.status_code == status.HTTP_200_OK
+        return response.data
+    return do_login
+
+
+@pytest.mark.django_db
+class TestJWTClaims:
+    def test_if_user_logs_in_token_has_customer_claims(self, login, customer):
+        token = AccessToken(login()['access'])
+
+        assert token['customer_id'] == customer.id
+        assert token['is_staff'] is False
+
+    def test_if_token_is_refreshed_keeps_claims(self, api_client, login, customer):
+        refresh = login()['refresh']
+
+        response = api_client.post('/auth/jwt/refresh/', {'refresh': refresh})
+
+        assert AccessToken(response.data['access'])['customer_id'] == customer.id
+
+    # The user, and the orders. The customer id comes from the token.
+    def test_if_token_has_customer_id_reads_no_customer(self, api_client, login, django_assert_num_queries):
+        api_client.credentials(HTTP_AUTHORIZATION=f'JWT {login()["access"]}')
+
+        with django_assert_num_queries(2):
+            response = api_client.get('/store/orders/')
+
+        assert response.status_code == status.HTTP_200_OK
+
+    def test_if_claims_are_turned_off_reads_customer(self, settings, api_client, login, django_assert_num_queries):
+        settings.STORE_JWT_CLAIMS = False
+        api_client.credentials(HTTP_AUTHORIZATION=f'JWT {login()["access"]}')
+
+        with django_assert_num_queries(3):
+            response = api_client.get('/store/orders/')
+
+        assert response.status_code == status.HTTP_200_OK
+
+    def test_if_customer_reads_profile_returns_it(self, api_client, login, customer):
+        api_client.credentials(HTTP_AUTHORIZATION=f'JWT {login()["access"]}')
+
+        response = api_client.get('/store/customers/me/')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['id'] == customer.id
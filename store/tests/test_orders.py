@@ -0,0 +1,153 @@
+from decimal import Decimal
+
+import pytest
+from model_bakery import baker
+from rest_framework import status
+
+from store.models import Cart, CartItem, Customer, CustomerSummary, Order, OrderItem, Product
+from store.serializers import CreateOrderSerializer
+
+
+@pytest.fixture
+def cart():
+    cart = baker.make(Cart)
+    for price, quantity in [('2.50', 2), ('10.00', 1), ('4.00', 3)]:
+        baker.make(CartItem, cart=cart, quantity=quantity, product=baker.make(Product, unit_price=Decimal(price)))
+    return cart
+
+
+@pytest.fixture
+def checkout(api_client, customer):
+    api_client.force_authenticate(user=customer.user)
+
+    def do_checkout(cart_id):
+        return api_client.post('/store/orders/', {'cart_id': str(cart_id)})
+    return do_checkout
+
+
+@pytest.mark.django_db
+class TestCheckout:
+    def test_if_cart_is_checked_out_copies_items_and_deletes_cart(self, checkout, customer, cart):
+        items = list(cart.items.values_list('product_id', 'quantity', 'product__unit_price'))
+
+        response = checkout(cart.id)
+
+        order = Order.objects.get(pk=response.data['id'])
+        assert response.status_code == status.HTTP_200_OK
+        assert order.customer_id == customer.id
+        assert sorted(order.items.values_list('product_id', 'quantity', 'unit_price')) == sorted(items)
+        assert [item['product']['id'] for item in response.data['items']] == sorted(item[0] for item in items)
+        assert not Cart.objects.filter(pk=cart.id).exists()
+        assert not CartItem.objects.filter(cart_id=cart.id).exists()
+
+    def test_if_cart_is_empty_returns_400(self, checkout):
+        response = checkout(baker.make(Cart).id)
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert not Order.objects.exists()
+
+    def test_if_cart_is_emptied_after_validation_returns_400(self, monkeypatch, checkout, cart):
+        validate_cart_id = CreateOrderSerializer.validate_cart_id
+
+        # Another request empties the cart between the validation and the copy of its items.
+        def validate_then_empty(self, cart_id):
+            cart_id = validate_cart_id(self, cart_id)
+            CartItem.objects.filter(cart_id=cart_id).delete()
+            return cart_id
+        monkeypatch.setattr(CreateOrderSerializer, 'validate_cart_id', validate_then_empty)
+
+        response = checkout(cart.id)
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert not Order.objects.exists()
+
+    def test_if_cart_does_not_exist_returns_400(self, checkout):
+        response = checkout('00000000-0000-0000-0000-000000000000')
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_if_customer_id_is_cached_runs_pinned_number_of_queries(self, checkout, customer, cart, django_assert_num_queries):
+        Customer.objects.get_id_for_user(customer.user_id)
+        # The summary of the customer exists after their first order.
+        CustomerSummary.objects.rebuild([customer.id])
+
+        # The cart with its number of items, the order, the summary of the customer, the order items (INSERT ... SELECT), the cart items, the cart,
+        # the outbox event, and the items of the order for the response. The other 2 are the savepoint of the transaction, since the test runs in one.
+        with django_assert_num_queries(10):
+            response = checkout(cart.id)
+
+        assert response.status_code == status.HTTP_200_OK
+
+    def test_if_customer_is_deleted_forgets_cached_id(self, customer):
+        Customer.objects.get_id_for_user(customer.user_id)
+
+        customer.delete()
+
+        with pytest.raises(Customer.DoesNotExist):
+            Customer.objects.get_id_for_user(customer.user_id)
+
+
+@pytest.fixture
+def make_orders(customer):
+    def do_make_orders(count, items):
+        orders = baker.make(Order, customer=customer, _quantity=count)
+        for order in orders if items else []:
+            baker.make(OrderItem, order=order, unit_price=Decimal('1.50'), quantity=1, _quantity=items)
+        return orders
+    return do_make_orders
+
+
+@pytest.mark.django_db
+class TestOrderReads:
+    # The orders and their items with their products, whatever the number of orders and items.
+    @pytest.mark.parametrize('count, items', [(2, 1), (8, 4)])
+    def test_if_staff_lists_orders_runs_two_queries(self, api_client, authenticate, make_orders, django_assert_num_queries, count, items):
+        make_orders(count, items)
+        authenticate(is_staff=True)
+
+        with django_assert_num_queries(2):
+            response = api_client.get('/store/orders/')
+
+        assert len(response.data['results']) == count
+        assert all(len(order['items']) == items for order in response.data['results'])
+
+    @pytest.mark.parametrize('count, items', [(2, 1), (8, 4)])
+    def test_if_customer_lists_orders_runs_two_queries(self, api_client, customer, make_orders, django_assert_num_queries, count, items):
+        make_orders(count, items)
+        api_client.force_authenticate(user=customer.user)
+        # The customer id is read once, and then cached.
+        api_client.get('/store/orders/')
+
+        with django_assert_num_queries(2):
+            response = api_client.get('/store/orders/')
+
+        assert len(response.data['results']) == count
+
+    def test_if_order_is_retrieved_runs_two_queries(self, api_client, authenticate, make_orders, django_assert_num_queries):
+        order = make_orders(1, 3)[0]
+        authenticate(is_staff=True)
+
+        with django_assert_num_queries(2):
+            response = api_client.get(f'/store/orders/{order.id}/')
+
+        assert len(response.data['items']) == 3
+
+    def test_if_items_are_omitted_runs_one_query(self, api_client, authenticate, make_orders, django_assert_num_queries):
+        make_orders(3, 2)
+        authenticate(is_staff=True)
+
+        with django_assert_num_queries(1):
+            response = api_client.get('/store/orders/?omit=items')
+
+        assert 'items' not in response.data['results'][0]
+
+    def test_if_orders_are_paginated_returns_newest_first(self, api_client, authenticate, make_orders):
+        orders = make_orders(12, 0)
+        authenticate(is_staff=True)
+
+        first = api_client.get('/store/orders/')
+        second = api_client.get(first.data['next'])
+
+        ids = [order['id'] for order in first.data['results'] + second.data['results']]
+        assert len(first.data['results']) == 10
+        assert ids == [order.id for order in sorted(orders, key=lambda order: (order.placed_at, order.id), reverse=True)]
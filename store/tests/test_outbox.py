@@ -0,0 +1,90 @@
+import pytest
+from django.utils import timezone
+from model_bakery import baker
+
+from store import outbox
+from store.models import Cart, CartItem, Order, OutboxEvent
+from store.signals import order_created
+
+
+@pytest.fixture
+def received():
+    calls = []
+
+    def receiver(sender, **kwargs):
+        calls.append(kwargs['order'].id)
+    order_created.connect(receiver)
+    yield calls
+    order_created.disconnect(receiver)
+
+
+@pytest.fixture
+def failing_receiver():
+    def receiver(sender, **kwargs):
+        raise RuntimeError('Mail server is down')
+    order_created.connect(receiver)
+    yield
+    order_created.disconnect(receiver)
+
+
+@pytest.mark.django_db
+class TestOutbox:
+    def test_if_order_is_placed_writes_event_without_calling_receivers(self, api_client, customer, received):
+        cart = baker.make(Cart)
+        baker.make(CartItem, cart=cart, quantity=1)
+        api_client.force_authenticate(user=customer.user)
+
+        response = api_client.post('/store/orders/', {'cart_id': str(cart.id)})
+
+        event = OutboxEvent.objects.get()
+        assert received == []
+        assert event.signal == 'order_created'
+        assert event.payload == {'order': {'model': 'store.Order', 'pk': response.data['id']}}
+
+    def test_if_events_are_relayed_sends_and_deletes_them(self, customer, received):
+        orders = baker.make(Order, customer=customer, _quantity=3)
+        for order in orders:
+            outbox.publish('order_created', order=order)
+
+        sent = outbox.relay(batch_size=2)
+
+        assert sent == 3
+        assert received == [order.id for order in orders]
+        assert not OutboxEvent.objects.exists()
+
+    def test_if_receiver_fails_keeps_event_for_retry(self, customer, received, failing_receiver):
+        order = baker.make(Order, customer=customer)
+        outbox.publish('order_created', order=order)
+
+        sent = outbox.relay(batch_size=10)
+
+        event = OutboxEvent.objects.get()
+        # The other receivers still got the event, and get it again at the retry.
+        assert sent == 0
+        assert received == [order.id]
+        assert event.attempts == 1
+        assert event.available_at > timezone.now()
+        assert 'Mail server is down' in event.last_error
+
+    def test_if_attempts_are_used_up_skips_event(self, settings, customer, received):
+        settings.STORE_OUTBOX_MAX_ATTEMPTS = 3
+        order = baker.make(Order, customer=customer)
+        outbox.publish('order_created', order=order)
+        OutboxEvent.objects.update(attempts=3)
+
+        sent = outbox.relay(batch_size=10)
+
+        assert sent == 0
+        assert received == []
+        assert OutboxEvent.objects.exists()
+
+    def test_if_order_is_gone_drops_event(self, customer, received, failing_receiver):
+        order = baker.make(Order, customer=customer)
+        outbox.publish('order_created', order=order)
+        Order.objects.filter(pk=order.pk).delete()
+
+        sent = outbox.relay(batch_size=10)
+
+        assert sent == 0
+        assert received == []
+        assert not OutboxEvent.objects.exists()
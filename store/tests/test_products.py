@@ -1,7 +1,9 @@
 import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from model_bakery import baker
 from rest_framework import status
-from store.models import Product
+from store.models import Collection, Product
 
 
 @pytest.fixture
@@ -18,3 +20,124 @@ class TestCreateProduct:
         response = create_product({"Product": "a"})
 
         assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+@pytest.mark.django_db
+class TestListProducts:
+    def test_if_no_page_is_requested_returns_keyset_page_without_count(self, api_client):
+        baker.make(Product, _quantity=3)
+
+        response = api_client.get('/store/products/')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert 'count' not in response.data
+        assert len(response.data['results']) == 3
+
+    def test_if_page_is_requested_returns_count(self, api_client):
+        baker.make(Product, _quantity=3)
+
+        response = api_client.get('/store/products/?page=1')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['count'] == 3
+
+    def test_if_following_next_links_returns_every_product_once(self, api_client):
+        # Duplicated prices, so the tie-breakers are needed to page through them.
+        collection = baker.make(Collection)
+        products = baker.make(Product, collection=collection,
+                              unit_price=10, _quantity=25)
+
+        ids = []
+        url = '/store/products/?ordering=unit_price'
+        while url:
+            response = api_client.get(url)
+            ids += [product['id'] for product in response.data['results']]
+            url = response.data['next']
+
+        assert sorted(ids) == sorted(product.id for product in products)
+
+
+# Transactional, since some databases (like MySQL) only update full-text indexes on commit.
+@pytest.mark.django_db(transaction=True)
+class TestSearchProducts:
+    def test_if_term_matches_title_returns_product(self, api_client):
+        product = baker.make(Product, title='Espresso Machine')
+        baker.make(Product, title='Tea Kettle')
+
+        response = api_client.get('/store/products/?search=espresso')
+
+        assert [p['id'] for p in response.data['results']] == [product.id]
+
+    def test_if_term_is_a_prefix_returns_product(self, api_client):
+        product = baker.make(Product, title='Espresso Machine')
+
+        response = api_client.get('/store/products/?search=espres')
+
+        assert [p['id'] for p in response.data['results']] == [product.id]
+
+    def test_if_term_matches_description_returns_product(self, api_client):
+        product = baker.make(Product, title='Kettle', description='Boils water quickly')
+
+        response = api_client.get('/store/products/?search=water')
+
+        assert [p['id'] for p in response.data['results']] == [product.id]
+
+    def test_if_product_is_updated_returns_new_title_matches(self, api_client):
+        product = baker.make(Product, title='Kettle')
+        product.title = 'Teapot'
+        product.save()
+
+        old = api_client.get('/store/products/?search=kettle')
+        new = api_client.get('/store/products/?search=teapot')
+
+        assert old.data['results'] == []
+        assert [p['id'] for p in new.data['results']] == [product.id]
+
+    def test_if_title_and_description_match_ranks_title_first(self, api_client):
+        by_description = baker.make(Product, title='Mug', description='Great for coffee')
+        by_title = baker.make(Product, title='Coffee Grinder', description='Grinds beans')
+
+        response = api_client.get('/store/products/?search=coffee')
+
+        assert [p['id'] for p in response.data['results']] == [by_title.id, by_description.id]
+
+
+@pytest.mark.django_db
+class TestSparseFields:
+    def test_if_fields_are_requested_returns_only_those_fields(self, api_client):
+        product = baker.make(Product)
+
+        response = api_client.get(f'/store/products/{product.id}/?fields=id,title,unit_price')
+
+        assert list(response.data) == ['id', 'title', 'unit_price']
+
+    def test_if_fields_are_omitted_returns_the_other_fields(self, api_client):
+        product = baker.make(Product)
+
+        response = api_client.get(f'/store/products/{product.id}/?omit=description,images')
+
+        assert 'description' not in response.data
+        assert 'images' not in response.data
+        assert 'title' in response.data
+
+    def test_if_fields_are_requested_queries_only_their_columns(self, api_client, settings):
+        settings.STORE_RESPONSE_CACHE_ENABLED = False
+        baker.make(Product, _quantity=2)
+
+        with CaptureQueriesContext(connection) as context:
+            api_client.get('/store/products/?fields=id,title,unit_price')
+
+        product_queries = [query['sql'] for query in context.captured_queries
+                           if 'store_productimage' in query['sql'] or 'description' in query['sql']]
+        assert product_queries == []
+
+    def test_if_fields_are_requested_with_fast_serializers_returns_same_data(self, api_client, settings):
+        settings.STORE_RESPONSE_CACHE_ENABLED = False
+        baker.make(Product, _quantity=2)
+        url = '/store/products/?fields=id,unit_price,price_with_tax,collection'
+
+        slow = api_client.get(url).content
+        settings.STORE_FAST_SERIALIZERS = True
+        fast = api_client.get(url).content
+
+        assert slow == fast
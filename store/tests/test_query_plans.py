@@ -0,0 +1,152 @@
+# Query plan regression tests. The catalog, cart and order endpoints are called against a few thousand rows, and every SELECT they run is explained
+# with the database in use ("EXPLAIN QUERY PLAN" on SQLite, "EXPLAIN" on PostgreSQL and MySQL). A test fails when a large table is read with a full
+# (sequential) scan instead of an index, which usually means a filter or an ordering is missing its index in "Meta.indexes".
+import re
+from decimal import Decimal
+
+import pytest
+from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from model_bakery import baker
+
+from store.models import Cart, CartItem, Collection, Customer, Order, OrderItem, Product
+from store.search import index_products
+
+# Tables that grow with the business. Small lookup tables (like "store_collection") can be scanned, the database is right to do so.
+LARGE_TABLES = {"store_product", "store_order",
+                "store_orderitem", "store_cartitem"}
+
+PRODUCTS = 2000
+COLLECTIONS = 20
+CUSTOMERS = 20
+ORDERS_PER_CUSTOMER = 25
+
+
+def explain(sql):
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            cursor.execute("EXPLAIN QUERY PLAN " + sql)
+            # Rows are "(id, parent, notused, detail)".
+            return [row[3] for row in cursor.fetchall()]
+        cursor.execute("EXPLAIN " + sql)
+        if connection.vendor == "mysql":
+            # One row per table, turned into "name=value" text so it can be checked like the other plans.
+            columns = [column[0] for column in cursor.description]
+            return [" ".join(f"{name}={value}" for name, value in zip(columns, row)) for row in cursor.fetchall()]
+        return [row[0] for row in cursor.fetchall()]
+
+
+# Returns the large tables read with a full scan in a query plan.
+def sequential_scans(plan):
+    if connection.vendor == "sqlite":
+        # "SCAN store_product" is a full scan, "SCAN store_product USING INDEX ..." reads an index in order, which is fine.
+        pattern = r"^SCAN (\w+)$"
+    elif connection.vendor == "mysql":
+        pattern = r"\btable=(\w+) .*\btype=ALL\b"
+    else:
+        pattern = r"Seq Scan on (\w+)"
+    tables = set()
+    for line in plan:
+        match = re.search(pattern, line.strip())
+        if match:
+            tables.add(match.group(1))
+    return tables & LARGE_TABLES
+
+
+@pytest.fixture
+def catalog():
+    Collection.objects.bulk_create(
+        [Collection(title=f"Collection {i}") for i in range(COLLECTIONS)])
+    collections = list(Collection.objects.order_by("id"))
+    Product.objects.bulk_create([
+        Product(title=f"Product {i}", slug=f"product-{i}", description=f"Description of product {i}",
+                unit_price=Decimal(i % 100) + Decimal("0.99"), inventory=10, collection=collections[i % COLLECTIONS])
+        for i in range(PRODUCTS)])
+    products = list(Product.objects.order_by("id"))
+    # "bulk_create()" doesn't send the signals which keep the search index up to date.
+    index_products()
+
+    # Customers are created by a signal when a user is saved.
+    users = baker.make(settings.AUTH_USER_MODEL, _quantity=CUSTOMERS)
+    customers = list(Customer.objects.filter(user__in=users).order_by("id"))
+    Order.objects.bulk_create([Order(customer=customer)
+                              for customer in customers for _ in range(ORDERS_PER_CUSTOMER)])
+    OrderItem.objects.bulk_create([
+        OrderItem(order=order, product=products[(order.id * 3 + i) % PRODUCTS], quantity=1, unit_price=Decimal("1.99"))
+        for order in Order.objects.all() for i in range(3)])
+
+    carts = [Cart.objects.create() for _ in range(20)]
+    CartItem.objects.bulk_create([
+        CartItem(cart=cart, product=products[(index * 20 + i) % PRODUCTS], quantity=1)
+        for index, cart in enumerate(carts) for i in range(20)])
+
+    # Up to date statistics, so the planner sees the tables as large.
+    with connection.cursor() as cursor:
+        if connection.vendor == "mysql":
+            cursor.execute("ANALYZE TABLE " + ", ".join(LARGE_TABLES))
+        else:
+            cursor.execute("ANALYZE")
+
+    return {"collection": collections[3], "product": products[PRODUCTS // 2], "cart": carts[5],
+            "customer": customers[7]}
+
+
+@pytest.mark.django_db
+class TestQueryPlans:
+    @pytest.fixture(autouse=True)
+    def disable_response_cache(self, settings):
+        # Cached responses would skip the queries under test.
+        settings.STORE_RESPONSE_CACHE_ENABLED = False
+
+    def assert_no_sequential_scans(self, api_client, url):
+        with CaptureQueriesContext(connection) as context:
+            response = api_client.get(url)
+        assert response.status_code == 200
+
+        scans = {}
+        for query in context.captured_queries:
+            if not query["sql"].lstrip().upper().startswith("SELECT"):
+                continue
+            tables = sequential_scans(explain(query["sql"]))
+            if tables:
+                scans[query["sql"]] = sorted(tables)
+        assert scans == {}
+
+    @pytest.mark.parametrize("query", [
+        "",
+        "?ordering=unit_price",
+        "?ordering=-unit_price",
+        "?ordering=-last_update",
+        "?unit_price__gt=10&unit_price__lt=20",
+        "?search=product",
+        "?page=3",
+    ])
+    def test_product_list(self, api_client, catalog, query):
+        self.assert_no_sequential_scans(
+            api_client, f"/store/products/{query}")
+
+    def test_product_list_of_collection(self, api_client, catalog):
+        collection = catalog["collection"]
+        self.assert_no_sequential_scans(
+            api_client, f"/store/products/?collection_id={collection.id}&unit_price__gt=10&ordering=unit_price")
+
+    def test_product_detail(self, api_client, catalog):
+        self.assert_no_sequential_scans(
+            api_client, f"/store/products/{catalog['product'].id}/")
+
+    def test_collection_detail(self, api_client, catalog):
+        self.assert_no_sequential_scans(
+            api_client, f"/store/collections/{catalog['collection'].id}/")
+
+    def test_cart_detail(self, api_client, catalog):
+        self.assert_no_sequential_scans(
+            api_client, f"/store/carts/{catalog['cart'].id}/")
+
+    def test_order_list_of_customer(self, api_client, catalog):
+        api_client.force_authenticate(user=catalog["customer"].user)
+        self.assert_no_sequential_scans(api_client, "/store/orders/")
+
+    def test_order_list_of_staff(self, api_client, authenticate, catalog):
+        authenticate(is_staff=True)
+        self.assert_no_sequential_scans(api_client, "/store/orders/")
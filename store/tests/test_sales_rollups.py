@@ -0,0 +1,133 @@
+from datetime import timedelta
+from decimal import Decimal
+
+import pytest
+from django.utils import timezone
+from model_bakery import baker
+from rest_framework import status
+
+from store.models import DailyCollectionSales, DailyProductSales, DailySales, DirtySalesDay, Order, OrderItem, Product
+from store.tasks import update_sales_rollups
+
+
+@pytest.fixture(autouse=True)
+def no_delay(settings):
+    settings.STORE_SALES_ROLLUP_DELAY = 0
+
+
+@pytest.fixture
+def products():
+    return baker.make(Product, unit_price=Decimal('1.00'), _quantity=2)
+
+
+@pytest.fixture
+def place_order(customer):
+    # Items are "(product, quantity, unit price)" tuples. The order is placed "days_ago" days ago.
+    def do_place_order(*items, days_ago=0):
+        order = Order.objects.create(customer=customer)
+        OrderItem.objects.bulk_create([OrderItem(order=order, product=product, quantity=quantity, unit_price=Decimal(unit_price))
+                                       for product, quantity, unit_price in items])
+        if days_ago:
+            Order.objects.filter(pk=order.pk).update(placed_at=timezone.now() - timedelta(days=days_ago))
+            order.refresh_from_db()
+        return order
+    return do_place_order
+
+
+def sales(model, *columns):
+    return sorted(model.objects.values_list('day', *columns, 'units', 'revenue'))
+
+
+@pytest.mark.django_db
+class TestSalesRollups:
+    def test_if_orders_are_placed_rolls_them_up_by_day(self, products, place_order):
+        old = place_order((products[0], 2, '5.00'), days_ago=3)
+        new = place_order((products[0], 1, '4.00'), (products[1], 3, '2.00'))
+        place_order((products[1], 1, '2.00'))
+        old_day, new_day = timezone.localdate(old.placed_at), timezone.localdate(new.placed_at)
+
+        update_sales_rollups()
+
+        assert sales(DailyProductSales, 'product_id', 'payment_status') == sorted([
+            (old_day, products[0].id, 'P', 2, Decimal('10.00')), (new_day, products[0].id, 'P', 1, Decimal('4.00')),
+            (new_day, products[1].id, 'P', 4, Decimal('8.00'))])
+        assert sales(DailyCollectionSales, 'collection_id') == sorted([
+            (old_day, products[0].collection_id, 2, Decimal('10.00')), (new_day, products[0].collection_id, 1, Decimal('4.00')),
+            (new_day, products[1].collection_id, 4, Decimal('8.00'))])
+        assert sales(DailySales, 'payment_status') == [(old_day, 'P', 2, Decimal('10.00')), (new_day, 'P', 5, Decimal('12.00'))]
+
+    def test_if_run_again_adds_only_new_orders(self, products, place_order):
+        place_order((products[0], 2, '5.00'))
+        update_sales_rollups()
+        update_sales_rollups()
+
+        order = place_order((products[0], 1, '5.00'))
+        update_sales_rollups()
+
+        assert sales(DailySales, 'payment_status') == [(timezone.localdate(order.placed_at), 'P', 3, Decimal('15.00'))]
+
+    def test_if_orders_are_too_recent_waits_for_them(self, settings, products, place_order):
+        settings.STORE_SALES_ROLLUP_DELAY = 60 * 60
+        place_order((products[0], 2, '5.00'))
+
+        update_sales_rollups()
+
+        assert not DailySales.objects.exists()
+
+    def test_if_payment_completes_computes_day_again(self, products, place_order):
+        order = place_order((products[0], 2, '5.00'), (products[1], 1, '2.00'))
+        place_order((products[1], 1, '2.00'))
+        update_sales_rollups()
+
+        order.payment_status = Order.PAYMENT_STATUS_COMPLETE
+        order.save()
+        update_sales_rollups()
+
+        day = timezone.localdate(order.placed_at)
+        assert sales(DailySales, 'payment_status') == [(day, 'C', 3, Decimal('12.00')), (day, 'P', 1, Decimal('2.00'))]
+        assert not DirtySalesDay.objects.exists()
+
+    # The item, its order's "placed_at", and the dirty day. The order itself isn't loaded.
+    def test_if_item_is_changed_marks_day_dirty(self, products, place_order, django_assert_num_queries):
+        order = place_order((products[0], 2, '5.00'), days_ago=3)
+        item = OrderItem.objects.get(order=order)
+        item.quantity = 3
+
+        with django_assert_num_queries(3):
+            item.save()
+
+        assert list(DirtySalesDay.objects.values_list('day', flat=True)) == [timezone.localdate(order.placed_at)]
+
+    def test_if_order_of_item_is_gone_marks_nothing(self, products, place_order):
+        item = OrderItem.objects.get(order=place_order((products[0], 2, '5.00')))
+        # Like an order archived with SQL, which sends no signals.
+        item.order_id = 0
+
+        item.delete()
+
+        assert not DirtySalesDay.objects.exists()
+
+
+@pytest.mark.django_db
+class TestSalesReports:
+    def test_if_admin_lists_product_sales_returns_filtered_days(self, api_client, authenticate, products, place_order):
+        place_order((products[0], 2, '5.00'), days_ago=5)
+        place_order((products[0], 1, '5.00'), days_ago=1)
+        place_order((products[1], 1, '1.00'), days_ago=1)
+        update_sales_rollups()
+        authenticate(is_staff=True)
+        since = timezone.localdate() - timedelta(days=2)
+
+        response = api_client.get('/store/sales/products/', {'product': products[0].id, 'day__gte': since.isoformat()})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [(row['product_id'], row['units'], row['revenue']) for row in response.data['results']] == [
+            (products[0].id, 1, Decimal('5.00'))]
+
+    @pytest.mark.parametrize('url', ['/store/sales/', '/store/sales/products/', '/store/sales/collections/'])
+    def test_if_user_is_not_admin_returns_403(self, api_client, authenticate, url):
+        authenticate()
+
+        response = api_client.get(url)
+
+        assert response.status_code == status.HTTP_403_FORBIDDEN
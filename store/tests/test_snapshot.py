@@ -0,0 +1,169 @@
+from datetime import timedelta
+from decimal import Decimal
+
+import pytest
+from django.db import connection
+from django.utils import timezone
+from model_bakery import baker
+from rest_framework import status
+
+from store.models import Collection, Product, ProductImage
+from store.snapshot import catalog_snapshot
+
+
+@pytest.fixture
+def use_snapshot(settings):
+    # Responses come from the views, not the response cache.
+    settings.STORE_RESPONSE_CACHE_ENABLED = False
+    settings.STORE_CATALOG_SNAPSHOT = True
+    # The snapshot is kept by the process, so every test starts with an empty one.
+    catalog_snapshot.__init__()
+    yield
+    catalog_snapshot.__init__()
+
+
+@pytest.fixture
+def catalog():
+    kitchen = baker.make(Collection, title='Kitchen')
+    garden = baker.make(Collection, title='Garden')
+    products = [baker.make(Product, title=title, collection=collection, unit_price=Decimal(price))
+                for title, collection, price in [('Kettle', kitchen, '20'), ('Teapot', kitchen, '15'), ('Hose', garden, '30')]]
+    baker.make(ProductImage, product=products[0], image='store/images/kettle.jpg')
+    return {'kitchen': kitchen, 'garden': garden, 'products': products}
+
+
+# The response without the snapshot, and the one with it.
+def get_both(api_client, settings, url):
+    settings.STORE_CATALOG_SNAPSHOT = False
+    expected = api_client.get(url)
+    settings.STORE_CATALOG_SNAPSHOT = True
+    return expected, api_client.get(url)
+
+
+@pytest.mark.django_db
+class TestCatalogSnapshot:
+    @pytest.mark.parametrize('url', [
+        '/store/products/{kettle}/',
+        '/store/products/{kettle}/?fields=id,images',
+        '/store/products/?page=1',
+        '/store/products/?page=1&ordering=-unit_price',
+        '/store/products/?page=1&collection_id={kitchen}&unit_price__lt=18',
+        '/store/collections/',
+        '/store/collections/{kitchen}/',
+        '/store/collections/?omit=products_count',
+    ])
+    def test_if_snapshot_is_used_returns_same_response(self, api_client, settings, use_snapshot, catalog, url):
+        url = url.format(kettle=catalog['products'][0].id, kitchen=catalog['kitchen'].id)
+
+        expected, response = get_both(api_client, settings, url)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.content == expected.content
+        assert response['ETag'] == expected['ETag']
+
+    def test_if_snapshot_is_loaded_reads_run_no_queries(self, api_client, use_snapshot, catalog, django_assert_num_queries):
+        product = catalog['products'][0]
+        api_client.get(f'/store/products/{product.id}/')
+
+        with django_assert_num_queries(0):
+            api_client.get(f'/store/products/{product.id}/')
+            api_client.get('/store/products/?page=1')
+            api_client.get('/store/collections/')
+
+    def test_if_list_uses_keyset_pagination_runs_no_queries(self, api_client, use_snapshot, catalog, django_assert_num_queries):
+        api_client.get('/store/products/?page=1')
+
+        with django_assert_num_queries(0):
+            response = api_client.get('/store/products/')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.data['results']) == 3
+
+    @pytest.mark.parametrize('ordering', ['', '-unit_price', 'last_update'])
+    def test_if_keyset_pages_are_followed_returns_same_responses(self, api_client, settings, use_snapshot, catalog, ordering):
+        baker.make(Product, collection=catalog['kitchen'], _quantity=12)
+        url = f'/store/products/?ordering={ordering}'
+
+        for _ in range(3):
+            expected, response = get_both(api_client, settings, url)
+            assert response.status_code == status.HTTP_200_OK
+            assert response.content == expected.content
+            url = response.data['next'] or response.data['previous']
+
+    def test_if_product_is_updated_returns_new_data(self, api_client, use_snapshot, catalog):
+        product = catalog['products'][0]
+        api_client.get(f'/store/products/{product.id}/')
+
+        product.title = 'Kettle 2'
+        product.save()
+        response = api_client.get(f'/store/products/{product.id}/')
+
+        assert response.data['title'] == 'Kettle 2'
+
+    def test_if_product_is_deleted_returns_404(self, api_client, use_snapshot, catalog):
+        product = catalog['products'][2]
+        api_client.get('/store/collections/')
+
+        product.delete()
+        response = api_client.get(f'/store/products/{product.id}/')
+        collections = api_client.get('/store/collections/')
+
+        counts = {collection['id']: collection['products_count'] for collection in collections.data}
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+        assert counts[catalog['garden'].id] == 0
+        assert counts[catalog['kitchen'].id] == 2
+
+    def test_if_image_is_added_returns_it(self, api_client, use_snapshot, catalog):
+        product = catalog['products'][1]
+        api_client.get(f'/store/products/{product.id}/')
+
+        baker.make(ProductImage, product=product, image='store/images/teapot.jpg')
+        response = api_client.get(f'/store/products/{product.id}/')
+
+        assert len(response.data['images']) == 1
+
+    def test_if_message_is_missed_refreshes_after_max_age(self, api_client, settings, use_snapshot, catalog):
+        product = catalog['products'][2]
+        api_client.get('/store/products/?page=1')
+
+        # Deleted without any signal or message.
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM store_product WHERE id = %s', [product.id])
+        stale = api_client.get('/store/products/?page=1')
+        settings.STORE_CATALOG_SNAPSHOT_MAX_AGE = 0
+        fresh = api_client.get('/store/products/?page=1')
+
+        assert stale.data['count'] == 3
+        assert fresh.data['count'] == 2
+
+    # The changed products, their images and the changed collections. No counts, since the deletes come with the message.
+    def test_if_message_arrives_refreshes_without_counts(self, api_client, use_snapshot, catalog, django_assert_num_queries):
+        product = catalog['products'][0]
+        api_client.get(f'/store/products/{product.id}/')
+        product.title = 'Kettle 2'
+        product.save()
+
+        with django_assert_num_queries(3):
+            response = api_client.get(f'/store/products/{product.id}/')
+
+        assert response.data['title'] == 'Kettle 2'
+
+    def test_if_update_keeps_last_update_reloads_everything_later(self, api_client, settings, use_snapshot, catalog):
+        product = catalog['products'][0]
+        api_client.get(f'/store/products/{product.id}/')
+
+        # Written with an old "last_update", like a late commit, so an incremental refresh doesn't see it.
+        Product.objects.filter(pk=product.id).update(title='Kettle 2', last_update=timezone.now() - timedelta(hours=1))
+        catalog_snapshot.invalidate()
+        stale = api_client.get(f'/store/products/{product.id}/')
+        settings.STORE_CATALOG_SNAPSHOT_FULL_RELOAD = 0
+        catalog_snapshot.invalidate()
+        fresh = api_client.get(f'/store/products/{product.id}/')
+
+        assert stale.data['title'] == 'Kettle'
+        assert fresh.data['title'] == 'Kettle 2'
+
+    def test_if_collection_is_unknown_reads_database(self, api_client, use_snapshot, catalog):
+        response = api_client.get('/store/products/?page=1&collection_id=999999')
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
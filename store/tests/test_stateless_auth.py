@@ -0,0 +1,99 @@
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework_simplejwt.tokens import AccessToken
+
+from core.authentication import user_cache_key
+
+
+@pytest.fixture
+def stateless(settings):
+    settings.STORE_JWT_STATELESS = True
+
+
+@pytest.fixture
+def login(api_client, customer):
+    customer.user.set_password('secret')
+    customer.user.save()
+
+    def do_login():
+        response = api_client.post('/auth/jwt/create/', {'username': customer.user.username, 'password': 'secret'})
+        api_client.credentials(HTTP_AUTHORIZATION=f'JWT {response.data["access"]}')
+        return response.data['access']
+    return do_login
+
+
+@pytest.mark.django_db
+class TestStatelessAuthentication:
+    # Only the orders. The user and the customer id come from the token.
+    def test_if_stateless_reads_no_user(self, stateless, api_client, login, django_assert_num_queries):
+        login()
+
+        with django_assert_num_queries(1):
+            response = api_client.get('/store/orders/')
+
+        assert response.status_code == status.HTTP_200_OK
+
+    def test_if_view_needs_full_user_reads_it_once(self, stateless, api_client, login, customer, django_assert_num_queries):
+        login()
+        api_client.get('/auth/users/me/')
+
+        with django_assert_num_queries(0):
+            response = api_client.get('/auth/users/me/')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['username'] == customer.user.username
+
+    def test_if_user_is_saved_forgets_cached_user(self, stateless, api_client, login, customer):
+        login()
+        api_client.get('/auth/users/me/')
+
+        customer.user.first_name = 'Changed'
+        customer.user.save()
+        response = api_client.get('/auth/users/me/')
+
+        assert response.data['first_name'] == 'Changed'
+
+    def test_if_user_is_updated_saves_changes(self, stateless, api_client, login, customer):
+        login()
+
+        response = api_client.patch('/auth/users/me/', {'first_name': 'Changed'})
+
+        assert response.status_code == status.HTTP_200_OK
+        customer.user.refresh_from_db()
+        assert customer.user.first_name == 'Changed'
+
+    def test_if_password_is_changed_forgets_cached_user(self, stateless, api_client, login, customer):
+        login()
+        api_client.get('/auth/users/me/')
+
+        response = api_client.post('/auth/users/set_password/', {'current_password': 'secret', 'new_password': 'An0ther-secret!'})
+
+        assert response.status_code == status.HTTP_204_NO_CONTENT
+        assert cache.get(user_cache_key(customer.user.id)) is None
+
+    def test_if_cached_user_is_inactive_returns_401(self, stateless, api_client, login, customer):
+        login()
+        get_user_model().objects.filter(pk=customer.user.pk).update(is_active=False)
+
+        response = api_client.get('/auth/users/me/')
+
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_if_user_is_admin_reads_staff_flag_from_token(self, stateless, api_client, login, customer):
+        get_user_model().objects.filter(pk=customer.user.pk).update(is_staff=True)
+        assert AccessToken(login())['is_staff'] is True
+
+        response = api_client.get('/store/sales/')
+
+        assert response.status_code == status.HTTP_200_OK
+
+    # The user, and the orders.
+    def test_if_stateless_is_off_reads_user(self, api_client, login, django_assert_num_queries):
+        login()
+
+        with django_assert_num_queries(2):
+            response = api_client.get('/store/orders/')
+
+        assert response.status_code == status.HTTP_200_OK
@@ -13,6 +13,10 @@ router.register("carts", views.CartViewSet)
 router.register("customers", views.CustomerViewSet)
 # Basename must be set for generating the name of views, like "orders-list" and "orders-detail". But only the prefix, the first part of the name, needs to be specified.
 router.register("orders", views.OrderViewSet, basename="orders")
+# Daily sales, for reports.
+router.register("sales/products", views.ProductSalesViewSet, basename="product-sales")
+router.register("sales/collections", views.CollectionSalesViewSet, basename="collection-sales")
+router.register("sales", views.SalesViewSet, basename="sales")
 
 # The parent router. The parent prefix. The lookup parameter.
 products_router = routers.NestedDefaultRouter(
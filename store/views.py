@@ -1,8 +1,10 @@
 # Handles error messages, and allows to avoid repeated "try/exception" blocks.
 from django.shortcuts import get_object_or_404
-from django.http import HttpResponse, response
+from django.http import Http404, HttpResponse, StreamingHttpResponse, response
 # For implementing annotations, "Count" function is needed.
-from django.db.models.aggregates import Count
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
+from django.db.models.aggregates import Count, Max
 
 # For generic filtering.
 from django_filters.rest_framework import DjangoFilterBackend
@@ -14,13 +16,13 @@ from rest_framework.filters import SearchFilter, OrderingFilter
 # These modules are used to simplify the process of creating querysets, serializations and validating data with built-in functions.
 from rest_framework.mixins import ListModelMixin, CreateModelMixin, RetrieveModelMixin, DestroyModelMixin, UpdateModelMixin
 # For supplying permission classes used for authentication, to allow or deny access to chosen views.
-from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser, DjangoModelPermissions
+from rest_framework.permissions import SAFE_METHODS, IsAuthenticated, AllowAny, IsAdminUser, DjangoModelPermissions
 # This is to replace Djangos "HttpResponse" class, with a simpler and more powerful class.
 from rest_framework.response import Response
 # ModelViewSet is for combining the logic for multiple related views inside 1 class, to avoid repeating the querysets, serializers etc. various places.
 from rest_framework.viewsets import ModelViewSet, GenericViewSet
 # Used for constants, for various HTTP status codes. Used e.g. for returning error messages.
-from rest_framework import status
+from rest_framework import generics, status
 # Used to paginate data using a pagenumber.
 from rest_framework.pagination import PageNumberPagination
 # These modules are for creating generic views, which have many built-in functions for serializing, retrieving and posting data.
@@ -30,27 +32,52 @@ from rest_framework.views import APIView
 
 
 # From the "models" module, in the current folder, import the "Product" class.
-from .models import Cart, CartItem, Collection, Customer, Order, Product, OrderItem, ProductImage, Review
-from .serializers import AddCartItemSerializer, CartItemSerializer, CartSerializer, CollectionSerializer, CreateOrderSerializer, CustomerSerializer, OrderSerializer, ProductImageSerializer, ProductSerializer, ReviewSerializer, UpdateCartItemSerializer, UpdateOrderSerializer
+from .models import ArchivedOrder, ArchivedOrderItem, Cart, CartItem, Collection, Customer, CustomerProductSummary, CustomerSummary, DailyCollectionSales, DailyProductSales, DailySales, Order, Product, OrderItem, ProductImage, Review
+from .serializers import AddCartItemSerializer, ArchivedOrderSerializer, AddCartItemsSerializer, CartItemSerializer, CartSerializer, CollectionSerializer, CreateOrderSerializer, CustomerHistorySerializer, CustomerSerializer, DailyCollectionSalesSerializer, DailyProductSalesSerializer, DailySalesSerializer, OrderSerializer, ProductImageSerializer, ProductSerializer, ReviewSerializer, UpdateCartItemSerializer, UpdateOrderSerializer
 from .filters import ProductFilter  # Custom created filters.
-from .pagination import DefaultPagination  # Custom created pagination.
+# Full-text search, used instead of the "icontains" lookups of SearchFilter.
+from .search import ProductSearchFilter
+from .pagination import OrderPagination, ProductPagination, SalesPagination  # Custom created pagination.
+# Response cache for the catalog, invalidated by version counters.
+from .caching import CATALOG_SCOPE, CachedResponseMixin, collection_scope, product_scope
+# Keeps carts in the database, or in Redis, depending on the "STORE_CART_BACKEND" setting.
+from .carts import CartItemStorageMixin, CartStorageMixin, get_cart_backend
+# "ETag" and "Last-Modified" headers, and "304 Not Modified" responses.
+from .conditional import ConditionalGetMixin
+# Opt-in fast serialization for read endpoints, turned on with the "STORE_FAST_SERIALIZERS" setting.
+from .fast_serializers import FastCartSerializer, FastOrderSerializer, FastProductSerializer, FastSerializationMixin
+# Streaming export of the whole catalog.
+from .export import EXPORT_BATCH_SIZE, EXPORT_FORMATS, export_products, render_export
+# Collection and price counts for the product list.
+from .facets import FacetsMixin
+# In-process catalog snapshot, for reads without queries.
+from .snapshot import CollectionSnapshotMixin, ProductSnapshotMixin
+# Replays the responses of retried requests with an "Idempotency-Key" header.
+from .idempotency import idempotent
 # Custom created permission for authenticated access to modify or only read objects.
 from .permissions import FullDjangoModelPermissions, IsAdminOrReadOnly, ViewCustomerHistoryPermission
 
 
 # Generic API view, used to combine the logic of multiple related views together.
-class ProductViewSet(ModelViewSet):
+# The mixins must come first, so their "list()" and "retrieve()" wrap the ones of ModelViewSet. Conditional requests are checked before the response cache.
+class ProductViewSet(ConditionalGetMixin, CachedResponseMixin, FacetsMixin, ProductSnapshotMixin, FastSerializationMixin, ModelViewSet):
     queryset = Product.objects.prefetch_related("images").all()  # Eager load.
     # Just the class is returned, and not creating an object "()"
     serializer_class = ProductSerializer
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
+    fast_serializer_class = FastProductSerializer
+    filter_backends = [DjangoFilterBackend,
+                       ProductSearchFilter, OrderingFilter]
     # Custom created fields are being imported here. Allows for prices to be filtered using comparison logic.
     filterset_class = ProductFilter
     # Line can be removed if a global pagination setting have been defined in settings.py.
-    pagination_class = DefaultPagination
+    # Keyset pagination by default. Page number pagination, with a total count, when "?page=" is sent.
+    pagination_class = ProductPagination
     permission_classes = [IsAdminOrReadOnly]
+    # Only used when the database has no full-text search backend.
     search_fields = ["title", "description"]
     ordering_fields = ["unit_price", "last_update"]  # Fields to sort by.
+    # Products read per query by the "export" action.
+    export_batch_size = EXPORT_BATCH_SIZE
 
     # ALL OF THIS LOGIC IS MADE OBSELETE WITH THE IMPLEMENTATION OF DJANGOFILTERBACKENDS LIBRARY, AND QUERYSET ATTRIBUTE IS BROUGHT BACK.
     # # Overwritting since filtering is not possible with the "all()" function.
@@ -64,24 +91,106 @@ class ProductViewSet(ModelViewSet):
 
     #     return queryset
 
+    # Narrows the query to the fields asked for with "?fields=" and "?omit=". Unneeded columns are deferred with "only()", and images are only
+    # prefetched when they are part of the response. The columns used for ordering and pagination are always loaded.
+    def get_queryset(self):
+        fields = ProductSerializer.get_fields_for(self.request)
+        queryset = Product.objects.all()
+        if "images" in fields:
+            queryset = queryset.prefetch_related("images")
+        if len(fields) < len(ProductSerializer.Meta.fields):
+            queryset = queryset.only(
+                "id", "title", "unit_price", "last_update", *ProductSerializer.get_columns(fields))
+        return queryset
+
     # Overwritting this method by returning the request object.
 
     def get_serializer_context(self):
         return {"request": self.request}
 
+    # A product depends on its own version. A list filtered by collection only depends on that collection, and any other list on the whole catalog.
+    def get_cache_scopes(self):
+        if self.action == "retrieve":
+            return [product_scope(self.kwargs["pk"])]
+        collection_id = self.request.query_params.get("collection_id", "")
+        if collection_id.isdigit():
+            return [collection_scope(collection_id)]
+        return [CATALOG_SCOPE]
+
+    # The last update of the product, or of the filtered list of products along with their count, so deleted products also change the validators.
+    def get_conditional_validators(self):
+        validators = self.get_snapshot_validators()
+        if validators is not None:
+            return validators
+        if self.action == "retrieve":
+            if not str(self.kwargs["pk"]).isdigit():
+                return None
+            last_update = Product.objects.filter(pk=self.kwargs["pk"]).values_list(
+                "last_update", flat=True).first()
+            if last_update is None:  # Let "retrieve()" return the 404.
+                return None
+            return last_update, ""
+        stats = self.filter_queryset(self.get_queryset()).aggregate(
+            last_update=Max("last_update"), count=Count("id"))
+        return stats["last_update"], stats["count"]
+
+    # Streams every product (or the products matching the filters, like "?collection_id="), as NDJSON by default or as CSV with "?export_format=csv".
+    # "?format=" can't be used, since it picks the renderer of the response.
+    @action(detail=False)
+    def export(self, request):
+        export_format = request.query_params.get("export_format", "ndjson")
+        if export_format not in EXPORT_FORMATS:
+            return Response({"export_format": f"Must be one of: {', '.join(EXPORT_FORMATS)}."}, status=status.HTTP_400_BAD_REQUEST)
+
+        storage = ProductImage._meta.get_field("image").storage
+        rows = export_products(self.filter_queryset(Product.objects.all()),
+                               image_url=lambda name: request.build_absolute_uri(storage.url(name)), batch_size=self.export_batch_size)
+        response = StreamingHttpResponse(render_export(
+            rows, export_format), content_type=EXPORT_FORMATS[export_format])
+        response["Content-Disposition"] = f'attachment; filename="products.{export_format}"'
+        return response
+
     def destroy(self, request, *args, **kwargs):
-        if OrderItem.objects.filter(product_id=kwargs['pk']).count() > 0:
+        # Archived order items keep their product too ("on_delete=PROTECT").
+        if OrderItem.objects.filter(product_id=kwargs['pk']).exists() or ArchivedOrderItem.objects.filter(product_id=kwargs['pk']).exists():
             return Response({'error': 'Product cannot be deleted because it is associated with an order item.'}, status=status.HTTP_405_METHOD_NOT_ALLOWED)
 
         return super().destroy(request, *args, **kwargs)
 
 
-class CollectionViewSet(ModelViewSet):
-    queryset = Collection.objects.annotate(
-        products_count=Count('products')).all()
+class CollectionViewSet(ConditionalGetMixin, CachedResponseMixin, CollectionSnapshotMixin, ModelViewSet):
+    # The count of products is stored in the "products_count" column, so no join over the product table is needed.
+    queryset = Collection.objects.order_by("title", "id")
     serializer_class = CollectionSerializer
     permission_classes = [IsAdminOrReadOnly]
 
+    def get_cache_scopes(self):
+        if self.action == "retrieve":
+            return [collection_scope(self.kwargs["pk"])]
+        return [CATALOG_SCOPE]
+
+    # Collections show a count of their products, so the validators cover both the collections and their products.
+    def get_conditional_validators(self):
+        validators = self.get_snapshot_validators()
+        if validators is not None:
+            return validators
+        if self.action == "retrieve":
+            if not str(self.kwargs["pk"]).isdigit():
+                return None
+            row = Collection.objects.filter(pk=self.kwargs["pk"]).annotate(
+                products_last_update=Max("products__last_update")
+            ).values_list("last_update", "products_last_update", "products_count").first()
+            if row is None:
+                return None
+            last_update, products_last_update, products_count = row
+            return max(filter(None, [last_update, products_last_update])), products_count
+        collections = Collection.objects.aggregate(
+            last_update=Max("last_update"), count=Count("id"))
+        products = Product.objects.aggregate(
+            last_update=Max("last_update"), count=Count("id"))
+        last_updates = list(filter(None, [collections["last_update"], products["last_update"]]))
+        return (max(last_updates) if last_updates else None), f'{collections["count"]}-{products["count"]}'
+
     def destroy(self, request, *args, **kwargs):
         if Product.objects.filter(collection_id=kwargs['pk']):
             return Response({'error': 'Collection cannot be deleted because it includes one or more products.'}, status=status.HTTP_405_METHOD_NOT_ALLOWED)
@@ -104,18 +213,24 @@ class ReviewViewSet(ModelViewSet):
 
 # This inherits from other classes, since only the quantity of items needs to be updated, and the cart id MUST NOT be sent to the API endpoint.
 # "ModelViewSet" has Update and List models, that are not needed in this view. So a custom viewset is needed.
-class CartViewSet(CreateModelMixin, DestroyModelMixin, RetrieveModelMixin, GenericViewSet):
+class CartViewSet(CartStorageMixin, FastSerializationMixin, CreateModelMixin, DestroyModelMixin, RetrieveModelMixin, GenericViewSet):
     # "prefetch_related" is called to enable eager loading. When retrieving a cart, its items and products are loaded with it simultaneously. Otherwise additional queries are sent to the DB.
-    queryset = Cart.objects.prefetch_related("items__product").all()
+    # The totals of the cart and its items are computed by the database, rather than with "Decimal" objects in Python.
+    queryset = Cart.objects.with_total_price().prefetch_related(
+        Prefetch("items", queryset=CartItem.objects.with_total_price().select_related("product")))
     serializer_class = CartSerializer
+    fast_serializer_class = FastCartSerializer
+    fast_actions = ("retrieve",)
 
 
-class CartItemViewset(ModelViewSet):
+class CartItemViewset(CartItemStorageMixin, ModelViewSet):
     # To prevent any "PUT" requests. Listing all allowed requests here.
     http_method_names = ["get", "post", "patch", "delete"]
 
     # To avoid hardcoded serializer. This dynamically returns a serializer class depending on the request method.
     def get_serializer_class(self):
+        if self.action == "batch":
+            return AddCartItemsSerializer
         if self.request.method == "POST":
             return AddCartItemSerializer
         elif self.request.method == "PATCH":
@@ -124,12 +239,36 @@ class CartItemViewset(ModelViewSet):
 
     # To get the cart id from the URL, since its not available in the request.
     def get_serializer_context(self):
-        return {"cart_id": self.kwargs["cart_pk"]}
+        # The backend the items are added with.
+        return {"cart_id": self.kwargs["cart_pk"], "cart_backend": get_cart_backend()}
 
     # Overwritting method and filtering by cart id, instead of returning a queryset. Queryset will return all cart items.
     def get_queryset(self):
         # ".select_related" is for eager loading. It loads relevant queries alongside "products", rather than doing extra seperate query loads afterwards.
-        return CartItem.objects.filter(cart_id=self.kwargs["cart_pk"]).select_related("product")
+        return CartItem.objects.with_total_price().filter(cart_id=self.kwargs["cart_pk"]).select_related("product")
+
+    # Changes of the cart can be retried with an "Idempotency-Key" header (store/idempotency.py), so a retried "add" doesn't add the quantity twice.
+    @idempotent
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
+
+    @idempotent
+    def partial_update(self, request, *args, **kwargs):
+        return super().partial_update(request, *args, **kwargs)
+
+    @idempotent
+    def destroy(self, request, *args, **kwargs):
+        return super().destroy(request, *args, **kwargs)
+
+    # Adds many items in one statement, from a body like '{"items": [{"product_id": 1, "quantity": 2}, ...]}'. Nothing is added if any product
+    # doesn't exist.
+    @action(detail=False, methods=["POST"])
+    @idempotent
+    def batch(self, request, cart_pk):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
 class CustomerViewSet(ModelViewSet):
@@ -138,10 +277,15 @@ class CustomerViewSet(ModelViewSet):
     # This view is only allowed with this permission. This attribute is set to a list of permission classes by not calling the ().
     # Only admin is allowed to retrieve, update, delete. A workaround using ModelViewSet, which allows all requests, intead of using several Mixins for creating, retrieving, updating and deleting.
     permission_classes = [IsAdminUser]
+    # The number of products in the history of a customer.
+    top_products_count = 5
 
     # Used for overriding the default set permission above, and customize them. Method is inherited from the viewset.
     # So i.e. authenticated users can retrieve customer objects, but only authenticated users, like an admin, can update/delete customer objects.
     def get_permissions(self):
+        # The history has a permission of its own, set on the action.
+        if self.action == "history":
+            return super().get_permissions()
         if self.request.method == "GET":
             # This returns a list of permission objects by calling the ().
             return [AllowAny()]
@@ -154,10 +298,10 @@ class CustomerViewSet(ModelViewSet):
     # Methods to be supported. Overriding permission for this particullar action only. So only authenticated users, like personal, may modify at the "customers" endpoint.
     @action(detail=False, methods=["GET", "PUT"], permission_classes=IsAuthenticated)
     def me(self, request):
-        # Getting a customer object by retrieving a customer with the user id. Since this is a tuple with 2 values, first a customer object and second a boolean of whether this object was created,
+        # Getting a customer object by retrieving a customer with the customer id of the user, which is read from the access token. Since this is a tuple with 2 values, first a customer object and second a boolean of whether this object was created,
         # the tuple needs to be unpacked immediately by wrapping () around, to get this customer object. Otherwise the endpoint will throw an AttributeError ('tuple' object has no attribute 'user_id').
         customer = Customer.objects.get(
-            user_id=request.user.id)
+            pk=Customer.objects.get_id_for(request.user))
         if request.method == "GET":
             # Give the customer object to this serializer.
             serializer = CustomerSerializer(customer)
@@ -169,13 +313,28 @@ class CustomerViewSet(ModelViewSet):
             return Response(serializer.data)
 
     # A custom action for viewing the history of a particular customer. Detail is set to True since this is for a particular customer. Additionally decorated with a custom permission class.
-    @action(detail=True, permission_classes=ViewCustomerHistoryPermission)
+    # The order count, spend, last order date and top products are read from the summary of the customer, which is kept up to date as orders are
+    # placed and paid, so it takes 2 queries however many orders the customer has.
+    @action(detail=True, permission_classes=[ViewCustomerHistoryPermission])
     def history(self, request, pk):  # pk is because this is for a particular customer
-        return Response("yes")
-
-
-class OrderViewSet(ModelViewSet):
+        # The router lets any pk through, which the lookups below can't take.
+        try:
+            pk = int(pk)
+        except ValueError:
+            raise Http404
+        summary = CustomerSummary.objects.filter(customer_id=pk).first()
+        if summary is None:
+            # Customers without orders may not have a summary yet.
+            summary = CustomerSummary(customer=get_object_or_404(Customer.objects.only("id"), pk=pk))
+        summary.top_products = CustomerProductSummary.objects.top_products(summary.customer_id, self.top_products_count)
+        return Response(CustomerHistorySerializer(summary).data)
+
+
+class OrderViewSet(FastSerializationMixin, ModelViewSet):
     # queryset = Order.objects.all()
+    fast_serializer_class = FastOrderSerializer
+    # Newest first, a page at a time.
+    pagination_class = OrderPagination
 
     http_method_names = ["get", "post", "patch", "delete",
                          "head", "options"]  # Restricting the http methods.
@@ -189,15 +348,31 @@ class OrderViewSet(ModelViewSet):
         return [IsAuthenticated()]  # Returning a list of objects.
 
     # Must be overwritten, since a different serializer must be created - the serializer has only "cart_id" field which is also the one returned, but an "Order" object is what we want returned, and not "cart_id".
+    # A checkout retried with the same "Idempotency-Key" header gets the order of the first attempt (store/idempotency.py).
+    @idempotent
     def create(self, request, *args, **kwargs):
-        serializer = CreateOrderSerializer(  # Getting the data and de-serializing it.
-            data=request.data,  # Giving the serializer the request data.
-            context={"user_id": self.request.user.id})  # Getting the user_id here from a context object, since request objects can't be accessed inside serializers,
-        # so it can't be retrieved from the "CreateOrderSerializer"'s overwritten save method. Giving the serializer the context object, so it access the user id.
-        serializer.is_valid(raise_exception=True)  # Validating the data.
-        order = serializer.save()  # Saving the changes.
+        # A cart kept in Redis is written to the database first, since the order is made from its "CartItem" rows. It's marked as being checked out
+        # before that, so the "persist_carts" task doesn't write it back once the checkout deleted it.
+        cart_backend = get_cart_backend()
+        cart_backend.start_checkout(request.data.get("cart_id"))
+        try:
+            cart_backend.persist(request.data.get("cart_id"), checkout=True)
+            serializer = CreateOrderSerializer(  # Getting the data and de-serializing it.
+                data=request.data,  # Giving the serializer the request data.
+                context={"user": self.request.user})  # Getting the user here from a context object, since request objects can't be accessed inside serializers,
+            # so it can't be retrieved from the "CreateOrderSerializer"'s overwritten save method. Giving the serializer the context object, so it can access the user.
+            serializer.is_valid(raise_exception=True)  # Validating the data.
+            order = serializer.save()  # Saving the changes.
+        except Exception:
+            cart_backend.cancel_checkout(request.data.get("cart_id"))
+            raise
+        # The checkout deleted the cart from the database, and it's removed from Redis as well once that's committed.
+        cart_id = serializer.validated_data["cart_id"]
+        transaction.on_commit(lambda: cart_backend.discard(cart_id))
         # Creating a new serializer, and resetting the above serializer. Giving this serializer the "order" object which was returned from the "save()" method above.
         # The save method was overwritten, customized, in the "CreateOrderSerializer" class, in the serializers module.
+        # The items of the new order with their products, in one query.
+        prefetch_related_objects([order], Prefetch("items", queryset=OrderItem.objects.select_related("product")))
         serializer = OrderSerializer(order)
         return Response(serializer.data)
 
@@ -210,17 +385,45 @@ class OrderViewSet(ModelViewSet):
         return OrderSerializer
 
     # Overriding the queryset method, so that only orders specific to the user only is shown. Admin can access everything.
+    # Reads load the items of the orders with their products in one prefetch query, rather than a query per order and per item. Only the columns of
+    # the fields asked for with "?fields=" and "?omit=" are loaded, and the items only when they're part of the response.
     def get_queryset(self):
+        queryset = self.filter_for_user(Order.objects.all())
+        if self.request.method not in SAFE_METHODS:
+            return queryset
+        fields = OrderSerializer.get_fields_for(self.request)
+        if "items" in fields:
+            queryset = queryset.prefetch_related(Prefetch("items", queryset=OrderItem.objects.select_related("product").only(
+                "id", "order_id", "unit_price", "quantity", "product__id", "product__title", "product__unit_price")))
+        # "placed_at" and "id" are always loaded, since the pagination orders by them.
+        return queryset.only("id", "placed_at", *OrderSerializer.get_columns(fields))
+
+    # Works for "Order" and "ArchivedOrder" querysets.
+    def filter_for_user(self, queryset):
         user = self.request.user  # For making code cleaner.
         if user.is_staff:  # Meaning admin.
-            return Order.objects.all()
+            return queryset
+        # The customer ID is read from the JWT, or else from the user ID, which is cached, so usually there's no query.
+        # Only orders for a specific customer.
+        return queryset.filter(customer_id=Customer.objects.get_id_for(user))
 
-        # Customer ID is not included in the JWT, so from user ID the customer ID is calculated. "only()" is used to retrieve the id field, since "get()" function will return a complete customer object.
-        customer_id = Customer.objects.only(
-            "id").get(user_id=user.id)
+    def get_archived_queryset(self):
+        return self.filter_for_user(ArchivedOrder.objects.prefetch_related(
+            Prefetch("items", queryset=ArchivedOrderItem.objects.select_related("product"))))
 
-        # Only orders for a specific customer.
-        return Order.objects.filter(customer_id=customer_id)
+    # Orders that were archived (store/archive.py) are read from the archive, so their links keep working.
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            return super().retrieve(request, *args, **kwargs)
+        except Http404:
+            order = generics.get_object_or_404(self.get_archived_queryset(), pk=kwargs["pk"])
+            return Response(ArchivedOrderSerializer(order).data)
+
+    # The archived orders, newest first, like the orders.
+    @action(detail=False)
+    def archived(self, request):
+        page = self.paginate_queryset(self.get_archived_queryset())
+        return self.get_paginated_response(ArchivedOrderSerializer(page, many=True).data)
 
 
 class ProductImageViewSet(ModelViewSet):
@@ -238,3 +441,29 @@ class ProductImageViewSet(ModelViewSet):
     def get_queryset(self):
         # Getting product_id from the URL (from self.kwargs of "name_of_url_parameter").
         return ProductImage.objects.filter(product_id=self.kwargs["product_pk"])
+
+
+# Reports over the daily sales rollups (store/rollups.py), which are read instead of the order items. Filtered with "?day__gte=" and "?day__lte=",
+# and by the other columns of the rollup.
+class SalesRollupViewSet(ListModelMixin, GenericViewSet):
+    permission_classes = [IsAdminUser]
+    filter_backends = [DjangoFilterBackend]
+    pagination_class = SalesPagination
+
+
+class ProductSalesViewSet(SalesRollupViewSet):
+    queryset = DailyProductSales.objects.all()
+    serializer_class = DailyProductSalesSerializer
+    filterset_fields = {"day": ["gte", "lte"], "product": ["exact"], "payment_status": ["exact"]}
+
+
+class CollectionSalesViewSet(SalesRollupViewSet):
+    queryset = DailyCollectionSales.objects.all()
+    serializer_class = DailyCollectionSalesSerializer
+    filterset_fields = {"day": ["gte", "lte"], "collection": ["exact"], "payment_status": ["exact"]}
+
+
+class SalesViewSet(SalesRollupViewSet):
+    queryset = DailySales.objects.all()
+    serializer_class = DailySalesSerializer
+    filterset_fields = {"day": ["gte", "lte"], "payment_status": ["exact"]}
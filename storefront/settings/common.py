@@ -156,7 +156,9 @@ REST_FRAMEWORK = {
     # Global custom defined setting. Will work for all endpoints if turned on.
     # 'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # Like "rest_framework_simplejwt.authentication.JWTAuthentication", with the customer id read from the token (core/authentication.py),
+        # and, with "STORE_JWT_STATELESS" on, the user as well.
+        'core.authentication.StatelessJWTAuthentication',
         # This is used as the authentication engine for generating JSon web tokens.
     ),
 }
@@ -186,6 +188,67 @@ SIMPLE_JWT = {
 }
 
 
+# Response cache of the catalog endpoints (products and collections). Cached responses are invalidated as soon as the catalog changes, through version
+# counters bumped from signals, so the timeout only decides how long unused entries are kept.
+STORE_RESPONSE_CACHE_ENABLED = True
+STORE_RESPONSE_CACHE_TIMEOUT = 10 * 60
+
+# Serves the product list, cart detail and order list from "values()" rows with precompiled field accessors (store/fast_serializers.py), instead of the
+# serializers. The output is the same. Compare both with "python manage.py benchmark_serializers".
+STORE_FAST_SERIALIZERS = False
+
+# Boundaries of the "unit_price" buckets in the facets of the product list ("?facets=true"). Clients can send their own with "?price_buckets=".
+STORE_FACET_PRICE_BUCKETS = [10, 25, 50, 100]
+
+# Keeps the catalog in memory in every worker process (store/snapshot.py), and serves product and collection reads from it. Changes are sent to the
+# other processes over Redis pub/sub, and the snapshot is also refreshed after "STORE_CATALOG_SNAPSHOT_MAX_AGE" seconds in case a message is missed.
+STORE_CATALOG_SNAPSHOT = False
+STORE_CATALOG_SNAPSHOT_MAX_AGE = 60
+# The whole catalog is read again this often (seconds), for changes that don't update "last_update" or commit long after it.
+STORE_CATALOG_SNAPSHOT_FULL_RELOAD = 10 * 60
+
+# Where carts are kept: "store.carts.DatabaseCartBackend" (the "Cart" and "CartItem" tables), or "store.carts.RedisCartBackend" (Redis hashes, which
+# expire "STORE_CART_TTL" seconds after their last change). Carts in Redis are written to the database at checkout, and by the "persist_carts" task,
+# "STORE_CART_PERSIST_BATCH_SIZE" carts at a time.
+STORE_CART_BACKEND = 'store.carts.DatabaseCartBackend'
+STORE_CART_TTL = 30 * 24 * 60 * 60
+STORE_CART_PERSIST_BATCH_SIZE = 500
+
+# Carts that were never checked out are deleted from the database by the "purge_abandoned_carts" task, "STORE_ABANDONED_CART_AGE" seconds after they
+# were created. Deleted "STORE_ABANDONED_CART_BATCH_SIZE" carts per transaction.
+STORE_ABANDONED_CART_AGE = 30 * 24 * 60 * 60
+STORE_ABANDONED_CART_BATCH_SIZE = 1000
+
+# Signals sent through the outbox (store/outbox.py), like "order_created", are relayed "STORE_OUTBOX_BATCH_SIZE" events at a time. An event whose
+# receivers keep failing is tried "STORE_OUTBOX_MAX_ATTEMPTS" times, and then kept in the table with its last error.
+STORE_OUTBOX_BATCH_SIZE = 100
+STORE_OUTBOX_MAX_ATTEMPTS = 10
+
+# The "update_sales_rollups" task rolls up orders "STORE_SALES_ROLLUP_DELAY" seconds after they were placed, so orders whose checkout transaction is
+# still open when the task runs aren't skipped.
+STORE_SALES_ROLLUP_DELAY = 5 * 60
+
+# Completed orders are moved to the archive tables by the "archive_orders" task "STORE_ORDER_ARCHIVE_AGE" seconds after they were placed, and are
+# read from there by "/store/orders/archived/". Archived "STORE_ORDER_ARCHIVE_BATCH_SIZE" orders per transaction.
+STORE_ORDER_ARCHIVE_AGE = 2 * 365 * 24 * 60 * 60
+STORE_ORDER_ARCHIVE_BATCH_SIZE = 1000
+
+# Responses to requests with an "Idempotency-Key" header (store/idempotency.py) are replayed to requests repeating the key for
+# "STORE_IDEMPOTENCY_TTL" seconds. Repeats of a request that's still running wait for it for up to "STORE_IDEMPOTENCY_LOCK_TIMEOUT" seconds.
+STORE_IDEMPOTENCY_TTL = 24 * 60 * 60
+STORE_IDEMPOTENCY_LOCK_TIMEOUT = 30
+
+# The access tokens carry the customer id and the staff flag of the user (core/authentication.py), which requests read instead of the database.
+# Turned off, the claims are ignored, and the customer id is read from the database (and cached) like before.
+STORE_JWT_CLAIMS = True
+
+# Turned on, requests are authenticated from the claims of their token alone, without reading the user (core/authentication.py). The full user is
+# only read when a view needs more than its id, staff flag and customer id, and cached for "STORE_JWT_USER_CACHE_TTL" seconds. A user made
+# inactive, or who lost their staff flag, keeps their access until their token expires ("ACCESS_TOKEN_LIFETIME"), so it's off by default.
+STORE_JWT_STATELESS = False
+STORE_JWT_USER_CACHE_TTL = 60
+
+
 CELERY_BEAT_SCHEDULE = {  # Define tasks within dictionary.
     'notify_customers': {
         # Specify task. Full path to the task function.
@@ -197,7 +260,32 @@ CELERY_BEAT_SCHEDULE = {  # Define tasks within dictionary.
         'args': ['Hello world!'],
         # If the task function takes any keyword arguments, they may be specified here.
         'kwargs': {}
-    }
+    },
+    # Write-behind of the carts kept in Redis. Does nothing with the database cart backend.
+    'persist_carts': {
+        'task': 'store.tasks.persist_carts',
+        'schedule': 60,  # Every minute.
+    },
+    # Deletes abandoned carts from the database.
+    'purge_abandoned_carts': {
+        'task': 'store.tasks.purge_abandoned_carts',
+        'schedule': 60 * 60,  # Every hour.
+    },
+    # Sends the outbox events that weren't sent right after their commit, and the ones to be tried again.
+    'relay_outbox': {
+        'task': 'store.tasks.relay_outbox',
+        'schedule': 30,  # Every 30 seconds.
+    },
+    # Adds the new orders to the daily sales rollups, for reports.
+    'update_sales_rollups': {
+        'task': 'store.tasks.update_sales_rollups',
+        'schedule': 5 * 60,  # Every 5 minutes.
+    },
+    # Moves old completed orders to the archive.
+    'archive_orders': {
+        'task': 'store.tasks.archive_orders',
+        'schedule': 24 * 60 * 60,  # Every day.
+    },
 }
 
 
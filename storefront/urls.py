@@ -19,6 +19,8 @@ from django.contrib import admin
 from django.urls import path, include
 import debug_toolbar
 
+from core.views import TokenObtainPairView
+
 admin.site.site_header = 'Storefront Admin'
 admin.site.index_title = 'Admin'
 
@@ -28,6 +30,8 @@ urlpatterns = [
     path('playground/', include('playground.urls')),
     # If the URL starts with "store", it should be handled by the "store.urls" module.
     path('store/', include('store.urls')),
+    # Logins get tokens with the customer id of the user (core/serializers.py). Before djoser, whose URLs have the same path.
+    path('auth/jwt/create/', TokenObtainPairView.as_view(), name='jwt-create'),
     # For authentication endpoints, all requests are delegated to djoser.urls.
     path('auth/', include('djoser.urls')),
     path('auth/', include('djoser.urls.jwt')),  # For JSon Web Tokens.